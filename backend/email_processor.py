@@ -1,116 +1,140 @@
 import os
+import csv
 import base64
-import json
-import re  # For regular expressions (used for text processing)
 import logging
-import subprocess  # For running external commands (like Node.js scripts)
-from pathlib import Path
-import pickle  # For loading the model and vectorizer
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from nltk.corpus import stopwords  # For stop words (common words to ignore in text analysis)
-from nltk.stem import WordNetLemmatizer  # For lemmatizing words
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np  # For vectorized batch scoring
+from gmail_client import (  # Shared, cached Gmail access
+    get_gmail_service, execute_request, get_messages, message_fields, header_value, walk_parts, decode_part_data
+)
+from model.text_normalizer import normalize_text, normalize_many  # Shared, cached text normalization
+from model.compact_model import load_model_artifacts, make_scorer  # Memory-mapped model export and NumPy scoring kernel
+from email_store import hash_body  # Body hashing for the scored-message store
+from gemini_pool import get_gemini_pool  # Long-lived Gemini workers
+from gemini_cache import get_gemini_cache, cache_key  # On-disk cache of Gemini results
 
 # Set up logging configuration to see debug/info messages in the terminal
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Load the frustration prediction model and TF-IDF vectorizer
+# (model/compact when exported, else model/model.pkl and model/tfidf.pkl; resolved relative to this file)
 # NOTE: In unit tests, these globals can be temporarily replaced with dummy objects.
-with open(os.path.join('model', 'model.pkl'), 'rb') as f:  # Open the model file in binary read mode
-    model = pickle.load(f)  # Load the model from the file using pickle
-with open(os.path.join('model', 'tfidf.pkl'), 'rb') as f:  # Open the TF-IDF vectorizer file in binary read mode
-    tfidf = pickle.load(f)  # Load the TF-IDF vectorizer from the file using pickle
-
-# Define the required Gmail API scope
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
-
-# ==================== Gmail API Setup ====================
-def get_gmail_service():
-    """
-    Authenticates with Gmail and returns a Gmail API service object.
-    This function handles the OAuth 2.0 flow to obtain credentials and build the Gmail service.
-    """
-    token_path = 'token.json'
-    creds = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES).run_local_server(port=8081)
-    if os.path.exists(token_path):
-        from google.oauth2.credentials import Credentials
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-    if not creds or not creds.valid:
-        from google.auth.transport.requests import Request
-        try:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                creds = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES).run_local_server(port=8080)
-        except Exception as e:
-            logger.error("Error obtaining credentials", exc_info=True)
-            raise
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
-    service = build('gmail', 'v1', credentials=creds)
-    return service
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+tfidf, model = load_model_artifacts(MODEL_DIR)
+
+# Gmail accepts up to 100 calls per batch request; 50 stays clear of per-user rate limits
+GMAIL_BATCH_SIZE = 50
+# Number of message IDs requested per list page (Gmail's maximum is 500)
+GMAIL_LIST_PAGE_SIZE = 500
+# Headers requested in the metadata phase of a fetch
+METADATA_HEADERS = ['From', 'Subject', 'Date']
+# Plain-text bodies are cut to this many bytes before decoding and scoring
+EMAIL_MAX_BODY_BYTES = int(os.environ.get('EMAIL_MAX_BODY_BYTES', str(256 * 1024)))
+# Messages whose Gmail sizeEstimate exceeds this are never downloaded (unset: no size limit)
+EMAIL_MAX_MESSAGE_BYTES = int(os.environ['EMAIL_MAX_MESSAGE_BYTES']) if os.environ.get('EMAIL_MAX_MESSAGE_BYTES') else None
+# Comma-separated sender fragments whose messages are never downloaded, e.g. "noreply@,newsletter@"
+EMAIL_SKIP_SENDERS = [s.strip().lower() for s in os.environ.get('EMAIL_SKIP_SENDERS', '').split(',') if s.strip()]
+# Label whose history is followed by the incremental sync
+SYNC_HISTORY_LABEL = 'INBOX'
+# Maximum number of emails whose Gemini request is in flight at once
+EMAIL_MAX_IN_FLIGHT = int(os.environ.get('EMAIL_MAX_IN_FLIGHT', '8'))
+# Character budget per Gemini summarization call, and how far chunk summaries may be reduced
+SUMMARY_CHUNK_CHARS = 10000
+SUMMARY_MAX_DEPTH = 3
+# Number of chunk summaries requested in parallel
+SUMMARY_MAX_PARALLEL = 4
+# Cache namespace for chunk summaries; bump when the prompt or model in gemini_email_summarize.js changes
+GEMINI_SUMMARY_CACHE_VERSION = 'summarize_emails:gemini-1.5-flash-8b:v1'
+# Cache namespace for Gemini frustration scores; bump when the prompt or model in gemini_predict.js changes
+GEMINI_PREDICT_CACHE_VERSION = 'predict:gemini-1.5-flash:v1'
 
 # ==================== Text Preprocessing ====================
 def preprocess_text(text):
     """
     Preprocesses input text by removing HTML tags, URLs, non-alphabet characters,
     converting to lowercase, tokenizing, lemmatizing, and removing stopwords.
+    Delegates to the shared normalizer in model/text_normalizer.py.
     """
-    # Remove HTML tags, URLs, and non-alphabet characters
-    text = re.sub(r'<.*?>|http\S+|[^a-zA-Z\s]', '', text)
-    tokens = text.lower().split()
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in stopwords.words('english')]
-    return ' '.join(tokens)
+    return normalize_text(text)
 
 # ==================== Custom Model Prediction ====================
-def predict_frustration_custom(text):
+def predict_frustration_custom_batch(texts):
     """
-    Predicts the probability that the text is frustrated using a custom model.
+    Predicts frustration probabilities for a batch of texts using the custom model.
+    Builds one TF-IDF matrix for the whole batch and returns a NumPy array of probabilities.
     """
+    texts = list(texts)
+    if not texts:
+        return np.empty(0, dtype=float)
     try:
-        cleaned_text = preprocess_text(text)
-        # Transform the cleaned text using the TF-IDF vectorizer
-        features = tfidf.transform([cleaned_text])
-        # Predict the probability of the text being frustrated
-        probability = model.predict_proba(features)[0][1]
-        logger.debug(f"Custom model prediction: {probability:.3f}")
-        return float(probability)
+        cleaned_texts = normalize_many(texts)
+        # Transform all cleaned texts in a single call to the TF-IDF vectorizer
+        features = tfidf.transform(cleaned_texts)
+        # Column 1 holds the probability of the text being frustrated
+        probabilities = np.asarray(model.predict_proba(features), dtype=float)[:, 1]
+        logger.debug(f"Custom model scored a batch of {len(texts)} texts")
+        return probabilities
     except Exception as e:
-        logger.error(f"Custom model error: {str(e)}")
-        return 0.5
+        logger.error(f"Custom model batch error: {str(e)}")
+        return np.full(len(texts), 0.5)
+
+
+_scorer_cache = {}
+
+
+def get_custom_scorer():
+    """
+    Returns the NumPy single-email scorer for the current model/tfidf globals, or None when the pair
+    is not supported (e.g. hashed features), in which case the batch path is used.
+    """
+    key = (id(tfidf), id(model))
+    if key not in _scorer_cache:
+        _scorer_cache.clear()
+        _scorer_cache[key] = make_scorer(tfidf, model)
+    return _scorer_cache[key]
+
+
+def predict_frustration_custom(text):
+    """
+    Predicts the probability that the text is frustrated using a custom model.
+    A single email is scored by the NumPy kernel (same probability as tfidf.transform + predict_proba).
+    """
+    scorer = get_custom_scorer()
+    if scorer is None:
+        probability = predict_frustration_custom_batch([text])[0]
+    else:
+        try:
+            probability = scorer.score(normalize_text(text))
+        except Exception as e:
+            logger.error(f"Custom model error: {str(e)}")
+            probability = 0.5
+    logger.debug(f"Custom model prediction: {probability:.3f}")
+    return float(probability)
 
 # ==================== Gemini Model Prediction ====================
 def predict_frustration_gemini(text):
     """
     Predicts the probability that the text is frustrated using the Gemini model.
-    This function calls a Node.js script (gemini_predict.js) and parses its JSON output.
+    The request is served by the long-lived Gemini worker pool (gemini_worker.js).
+    Scores are cached on disk by content hash, so the same body is only sent to Gemini once.
     """
     try:
-        script_path = Path(__file__).parent / 'gemini_predict.js'
-        if not script_path.exists():
-            logger.error(f"gemini_predict.js not found at {script_path}")
-            return 0.5
-
-        # Escape text for JSON safely
-        escaped_text = json.dumps(text)
-        result = subprocess.check_output(
-            ["node", str(script_path), escaped_text],
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            timeout=30
-        )
-        # Extract the JSON substring from the result using a regex
-        match = re.search(r'({.*})', result)
-        if match:
-            parsed = json.loads(match.group(1))
-            confidence = float(parsed.get("confidence", 0.5))
-            logger.debug(f"Gemini model prediction: {confidence:.3f}")
-            return confidence
-        else:
-            logger.error("No valid JSON found in Gemini response")
-            return 0.5
+        cache = get_gemini_cache()
+        key = cache_key(GEMINI_PREDICT_CACHE_VERSION, text)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.debug(f"Gemini model prediction (cached): {cached:.3f}")
+            return float(cached)
+        result = get_gemini_pool().request('predict', text, timeout=30)
+        confidence = float(result.get("confidence", 0.5))
+        # gemini_predict.js reports failures as a 0.5 confidence with an error; don't cache those
+        if 'error' not in result:
+            cache.set(key, confidence)
+        logger.debug(f"Gemini model prediction: {confidence:.3f}")
+        return confidence
     except Exception as e:
         logger.error(f"Gemini prediction error: {str(e)}")
         return 0.5
@@ -118,108 +142,529 @@ def predict_frustration_gemini(text):
 # ==================== Email Processing ====================
 def summarize_emails_with_gemini(text):
     """
-    Summarizes emails using the Gemini API via a Node.js script (gemini_email_summarize.js).
+    Summarizes emails using the Gemini API via the Gemini worker pool.
     """
     try:
-        script_path = Path(__file__).parent / 'gemini_email_summarize.js'
-        if not script_path.exists():
-            logger.error(f"gemini_email_summarize.js not found at {script_path}")
-            return "Summary generation failed - missing script"
-        escaped_text = json.dumps(text)
-        result = subprocess.check_output(
-            ["node", str(script_path), escaped_text],
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            timeout=60
-        )
-        try:
-            response = json.loads(result)
-            if 'error' in response:
-                logger.error(f"Gemini summary error: {response['error']}")
-                return f"Summary error: {response['error']}"
-            return response.get('summary', 'No summary generated')
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON response: {result}")
-            return "Summary error: Invalid API response"
+        response = get_gemini_pool().request('summarize_emails', text, timeout=60)
+        if 'error' in response:
+            logger.error(f"Gemini summary error: {response['error']}")
+            return f"Summary error: {response['error']}"
+        return response.get('summary', 'No summary generated')
     except Exception as e:
         logger.error(f"Error in summarize_emails_with_gemini: {str(e)}")
         return f"Summary error: {str(e)}"
 
 
-def summarize_frustration_reasons(emails):
+def chunk_texts(texts, budget=SUMMARY_CHUNK_CHARS):
+    """
+    Groups texts into newline-joined chunks of at most budget characters, keeping their order.
+    A single text longer than the budget is split across chunks.
+    """
+    chunks = []
+    current, size = [], 0
+    for text in texts:
+        for start in range(0, max(len(text), 1), budget):
+            piece = text[start:start + budget]
+            if current and size + 1 + len(piece) > budget:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            size += len(piece) + (1 if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def summarize_chunk(text):
+    """
+    Summarizes one chunk with Gemini, caching the summary by content hash so unchanged chunks are not resent.
+    """
+    cache = get_gemini_cache()
+    key = cache_key(GEMINI_SUMMARY_CACHE_VERSION, text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    summary = summarize_emails_with_gemini(text)
+    if not summary.startswith("Summary error"):
+        cache.set(key, summary)
+    return summary
+
+
+def summarize_hierarchically(texts, budget=SUMMARY_CHUNK_CHARS, depth=0):
+    """
+    Map-reduce summarization: texts are chunked by size budget, chunks are summarized in parallel,
+    and the chunk summaries are summarized again until everything fits in a single call.
+    """
+    chunks = chunk_texts(texts, budget)
+    if len(chunks) == 1:
+        return summarize_chunk(chunks[0])
+    if depth >= SUMMARY_MAX_DEPTH:
+        logger.warning(f"Summary still spans {len(chunks)} chunks after {depth} levels, truncating to {budget} characters.")
+        return summarize_chunk("\n".join(texts)[:budget])
+
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_PARALLEL) as executor:
+        summaries = list(executor.map(summarize_chunk, chunks))
+    logger.info(f"Summarized {len(chunks)} chunks at level {depth}")
+    # Reduce over the chunk summaries that succeeded; if none did, report the first error
+    succeeded = [summary for summary in summaries if not summary.startswith("Summary error")]
+    if not succeeded:
+        return summaries[0]
+    return summarize_hierarchically(succeeded, budget, depth + 1)
+
+
+def summarize_frustration_reasons(emails, budget=SUMMARY_CHUNK_CHARS):
     """
     Given a list of email dictionaries, generate a summary of the reasons for frustration.
+    Every frustrated email is covered: large inboxes are summarized chunk by chunk and then reduced.
     """
-    frustrated_emails = [email['body'] for email in emails if email['is_frustrated']]
+    # Emails arrive newest first; chunking oldest first means a new email only changes the last chunk,
+    # so the cached summaries of all the earlier chunks stay valid
+    frustrated_emails = [email['body'] for email in reversed(emails) if email['is_frustrated']]
     if not frustrated_emails:
         return "No frustrated emails found."
-    combined_text = "\n".join(frustrated_emails)
-    # Limit the text to avoid exceeding token limits
-    max_length = 10000
-    if len(combined_text) > max_length:
-        combined_text = combined_text[:max_length]
-        logger.warning(f"Truncated combined text to {max_length} characters.")
-    summary = summarize_emails_with_gemini(combined_text)
-    return summary
+    return summarize_hierarchically(frustrated_emails, budget)
 
 
-def fetch_and_classify_emails():
+def parse_email_message(msg_data, max_body_bytes=EMAIL_MAX_BODY_BYTES):
     """
-    Retrieves unread emails, classifies each as frustrated or not using both custom and Gemini predictions,
-    and then generates a summary for the frustrated emails.
-    Returns a tuple of (processed_emails, frustration_summary).
+    Extracts the sender, subject, date and plain-text body from a Gmail message resource.
+    The body is the first text/plain part found in the (possibly nested) multipart tree,
+    and only its first max_body_bytes bytes are decoded.
+    Returns a tuple of (from_email, subject, date, body).
     """
-    service = get_gmail_service()
-    results = service.users().messages().list(userId='me', q='is:unread', maxResults=4).execute()
-    messages = results.get('messages', [])
-    processed_emails = []
-
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-        headers = msg_data.get('payload', {}).get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-        from_email = next((h['value'] for h in headers if h['name'] == 'From'), '')
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        body = ''
-
-        # Check if the email has parts; if not, process the plain body.
-        if 'parts' in msg_data.get('payload', {}):
-            for part in msg_data['payload']['parts']:
-                if part['mimeType'] == 'text/plain':
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-        else:
-            body_data = msg_data['payload']['body'].get('data', '')
-            if body_data:
-                body = base64.urlsafe_b64decode(body_data).decode('utf-8')
+    payload = msg_data.get('payload', {})
+    headers = payload.get('headers', [])
+    subject = header_value(headers, 'Subject')
+    from_email = header_value(headers, 'From')
+    date = header_value(headers, 'Date')
+    body = ''
+
+    # Check if the email has parts; if not, process the plain body.
+    if payload.get('parts'):
+        part = next((p for p in walk_parts(payload)
+                     if p.get('mimeType') == 'text/plain' and p.get('body', {}).get('data')), None)
+    else:
+        part = payload
+    body_data = part.get('body', {}).get('data', '') if part else ''
+    if body_data:
+        raw, truncated = decode_part_data(body_data, max_body_bytes)
+        # A cut can split a multi-byte character; only then are undecodable bytes dropped
+        body = raw.decode('utf-8', errors='ignore' if truncated else 'strict')
+    return from_email, subject, date, body
+
+
+def should_download(metadata, skip_senders=EMAIL_SKIP_SENDERS, max_message_bytes=EMAIL_MAX_MESSAGE_BYTES):
+    """
+    Decides from a metadata-only message resource whether its body is worth downloading:
+    senders matching skip_senders and messages larger than max_message_bytes are left out.
+    """
+    sender = header_value(metadata.get('payload', {}).get('headers', []), 'From').lower()
+    if any(fragment in sender for fragment in skip_senders):
+        return False
+    if max_message_bytes is not None and metadata.get('sizeEstimate', 0) > max_message_bytes:
+        return False
+    return True
+
+
+def list_message_ids(service, query='is:unread', max_results=None):
+    """
+    Lists the IDs of messages matching the Gmail search query, following nextPageToken across all pages.
+    If max_results is given, stops once that many IDs have been collected.
+    """
+    message_ids = []
+    page_token = None
+    while max_results is None or len(message_ids) < max_results:
+        page_size = GMAIL_LIST_PAGE_SIZE
+        if max_results is not None:
+            page_size = min(page_size, max_results - len(message_ids))
+        params = {'userId': 'me', 'q': query, 'maxResults': page_size}
+        if page_token:
+            params['pageToken'] = page_token
+        results = execute_request(service.users().messages().list(**params))
+        message_ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    if max_results is not None:
+        message_ids = message_ids[:max_results]
+    return message_ids
 
-        score_custom = predict_frustration_custom(body)
-        score_gemini = predict_frustration_gemini(body)
-        final_score = (0.4 * score_custom) + (0.6 * score_gemini)
 
-        logger.info(f"Email ID {msg['id']} - Custom Score: {score_custom:.3f}, Gemini Score: {score_gemini:.3f}, Combined Score: {final_score:.3f}")
+def fetch_messages_batched(service, message_ids, batch_size=GMAIL_BATCH_SIZE, message_filter=should_download, failed=None):
+    """
+    Two-phase download in Gmail batch HTTP requests of up to batch_size calls: headers and sizes are fetched
+    first (format=metadata), and only the messages accepted by message_filter are then fetched in full
+    (without repeating their headers). Yields one list of message resources per batch, in the same order
+    as message_ids. Messages that fail to download are logged, skipped and appended to failed if given.
+    """
+    for start in range(0, len(message_ids), batch_size):
+        batch_ids = message_ids[start:start + batch_size]
+        metadata, errors = get_messages(service, batch_ids, format='metadata', metadataHeaders=METADATA_HEADERS)
+        wanted = [msg_id for msg_id in batch_ids
+                  if msg_id in metadata and (message_filter is None or message_filter(metadata[msg_id]))]
+        if len(wanted) < len(metadata):
+            logger.info(f"Skipped {len(metadata) - len(wanted)} emails after reading their metadata")
 
-        email_data = {
-            'id': msg['id'],
+        full = {}
+        if wanted:
+            full, full_errors = get_messages(service, wanted, format='full', fields=message_fields())
+            errors.update(full_errors)
+        for msg_id, exception in errors.items():
+            logger.error(f"Failed to fetch email {msg_id}: {str(exception)}")
+            if failed is not None:
+                failed.append(msg_id)
+        yield [
+            dict(metadata[msg_id], payload=dict(full[msg_id]['payload'], headers=metadata[msg_id]['payload'].get('headers', [])))
+            for msg_id in wanted if msg_id in full
+        ]
+
+
+def parse_messages(batch, failed=None):
+    """
+    Converts Gmail message resources into unscored email dictionaries.
+    A message that cannot be parsed is logged and skipped without affecting the others
+    (and its ID appended to failed if given).
+    """
+    emails = []
+    for msg_data in batch:
+        try:
+            from_email, subject, date, body = parse_email_message(msg_data)
+        except Exception as e:
+            logger.error(f"Failed to parse email {msg_data.get('id')}: {str(e)}")
+            if failed is not None:
+                failed.append(msg_data.get('id'))
+            continue
+        emails.append({
+            'id': msg_data['id'],
             'from': from_email,
             'subject': subject,
             'date': date,
-            'body': body,
-            'score_custom': float(score_custom),
-            'score_gemini': float(score_gemini),
-            'combined_score': float(final_score),
-            'is_frustrated': final_score > 0.5
-        }
-        processed_emails.append(email_data)
+            'internal_date': int(msg_data.get('internalDate', 0)),
+            'body': body
+        })
+    return emails
+
+
+def parse_cascade_band(value):
+    """
+    Parses a cascade band given as "lower,upper" (e.g. "0.1,0.9") into a (lower, upper) tuple.
+    Returns None for an empty value, which disables the cascade.
+    """
+    if not value:
+        return None
+    lower, upper = (float(bound) for bound in value.split(','))
+    if not 0.0 <= lower < upper <= 1.0:
+        raise ValueError(f"Invalid cascade band {value!r}: expected 0 <= lower < upper <= 1")
+    return lower, upper
 
+
+# Cascade mode: Gemini is only consulted when the custom score falls strictly inside this band.
+# Set EMAIL_CASCADE_BAND="lower,upper" to enable it; unset, every email gets the combined score.
+CASCADE_BAND = parse_cascade_band(os.environ.get('EMAIL_CASCADE_BAND'))
+
+
+def needs_gemini(score_custom, cascade_band):
+    """Returns True when the custom score is not confident enough to decide on its own."""
+    return cascade_band is None or cascade_band[0] < score_custom < cascade_band[1]
+
+
+def finish_email_scoring(email, score_custom, score_gemini, cascade_band):
+    """
+    Completes the scoring of one email given its custom score (and a previously known Gemini score, if any),
+    calling Gemini only when needed. A Gemini failure falls back to the neutral 0.5 score.
+    Adds the score fields to the email dictionary and returns it.
+    """
+    if needs_gemini(score_custom, cascade_band):
+        if score_gemini is None:
+            try:
+                score_gemini = predict_frustration_gemini(email['body'])
+            except Exception as e:
+                logger.error(f"Gemini scoring failed for email {email['id']}: {str(e)}")
+                score_gemini = 0.5
+        final_score = (0.4 * score_custom) + (0.6 * score_gemini)
+        decided_by = 'combined'
+        logger.info(f"Email ID {email['id']} - Custom Score: {score_custom:.3f}, Gemini Score: {score_gemini:.3f}, Combined Score: {final_score:.3f}")
+    else:
+        final_score = score_custom
+        decided_by = 'custom'
+        logger.info(f"Email ID {email['id']} - Custom Score: {score_custom:.3f} outside cascade band, Gemini skipped")
+
+    email.update({
+        'score_custom': float(score_custom),
+        'score_gemini': float(score_gemini) if score_gemini is not None else None,
+        'combined_score': float(final_score),
+        'is_frustrated': bool(final_score > 0.5),
+        'decided_by': decided_by
+    })
+    return email
+
+
+def submit_email_scoring(executor, emails, known_scores, cascade_band):
+    """
+    Scores the new bodies with the custom model in one vectorized call, then submits the Gemini stage
+    of every email to the executor. Returns the futures in the same order as emails.
+    """
+    unscored = [email for email in emails if hash_body(email['body']) not in known_scores]
+    custom_scores = predict_frustration_custom_batch([email['body'] for email in unscored])
+    scores = {email['id']: (score_custom, None) for email, score_custom in zip(unscored, custom_scores)}
+    return [
+        executor.submit(finish_email_scoring, email,
+                        *(scores.get(email['id']) or known_scores[hash_body(email['body'])]), cascade_band)
+        for email in emails
+    ]
+
+
+def classify_emails(emails, known_scores=None, cascade_band=CASCADE_BAND, max_in_flight=EMAIL_MAX_IN_FLIGHT):
+    """
+    Scores parsed email dictionaries with the custom and Gemini models, adding the score fields in place.
+    known_scores optionally maps body hashes to (score_custom, score_gemini) for bodies scored before,
+    which are reused instead of being sent to the models again.
+    With a cascade_band of (lower, upper), Gemini is skipped for emails whose custom score lies outside
+    the band and the custom score decides alone; 'decided_by' records which path was used.
+    Up to max_in_flight Gemini requests run concurrently. Returns the list of scored emails in order.
+    """
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = submit_email_scoring(executor, emails, known_scores or {}, cascade_band)
+        return [future.result() for future in futures]
+
+
+def iter_classified_emails(service, message_ids, batch_size=GMAIL_BATCH_SIZE, cascade_band=CASCADE_BAND,
+                           max_in_flight=EMAIL_MAX_IN_FLIGHT, known_scores_fn=None, failed=None):
+    """
+    Pipelined fetch-and-score: while up to max_in_flight Gemini requests for earlier emails are running,
+    the next Gmail batch is downloaded and scored by the custom model.
+    known_scores_fn, if given, is called with each batch of parsed emails and returns known scores by body hash.
+    IDs of messages that could not be downloaded or parsed are appended to failed if given.
+    Yields scored email dictionaries in the same order as message_ids, as soon as each one is ready.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for batch in fetch_messages_batched(service, message_ids, batch_size=batch_size, failed=failed):
+            emails = parse_messages(batch, failed=failed)
+            known_scores = known_scores_fn(emails) if known_scores_fn else {}
+            pending.extend(submit_email_scoring(executor, emails, known_scores, cascade_band))
+            # Hand back finished emails in order; only wait when too much work is queued
+            while pending and (pending[0].done() or len(pending) > max_in_flight + batch_size):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def fetch_and_classify_emails(query='is:unread', max_results=None, batch_size=GMAIL_BATCH_SIZE, cascade_band=CASCADE_BAND):
+    """
+    Retrieves emails matching the query (unread by default, optionally capped at max_results),
+    classifies each as frustrated or not using both custom and Gemini predictions
+    (or the custom model alone outside cascade_band), and then generates a summary for the frustrated emails.
+    Returns a tuple of (processed_emails, frustration_summary).
+    """
+    service = get_gmail_service()
+    message_ids = list_message_ids(service, query=query, max_results=max_results)
+    logger.info(f"Found {len(message_ids)} emails matching '{query}'")
+
+    processed_emails = list(iter_classified_emails(service, message_ids, batch_size=batch_size, cascade_band=cascade_band))
     summary = summarize_frustration_reasons(processed_emails)
     return processed_emails, summary
 
 
+# ==================== Incremental Sync ====================
+def list_history_message_ids(service, start_history_id, label_id=SYNC_HISTORY_LABEL):
+    """
+    Lists the IDs of messages added to the mailbox since start_history_id using the Gmail history API.
+    Raises googleapiclient's HttpError (404) when the history ID is too old to be used.
+    """
+    message_ids = []
+    page_token = None
+    while True:
+        params = {'userId': 'me', 'startHistoryId': start_history_id, 'historyTypes': ['messageAdded'], 'labelId': label_id}
+        if page_token:
+            params['pageToken'] = page_token
+        results = execute_request(service.users().history().list(**params))
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                if added['message']['id'] not in message_ids:
+                    message_ids.append(added['message']['id'])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return message_ids
+
+
+def sync_new_emails(store, query='is:unread', max_results=None, batch_size=GMAIL_BATCH_SIZE, cascade_band=CASCADE_BAND):
+    """
+    Incrementally syncs the mailbox into the scored-message store.
+    The messages matching query (newest first, capped at max_results) are listed on every sync and marked
+    as the store's active set, which is what the dashboard shows. Of those, only messages the store has not
+    seen are fetched and scored: the new ones come from the Gmail historyId delta when a cursor exists, or an
+    'after:' search when the history is unavailable, plus any that failed to download or parse last time.
+    Yields each newly scored email as soon as it is ready (and saved); the sync cursor advances once all are done.
+    """
+    service = get_gmail_service()
+    sync_started = int(time.time())
+    # Read the current historyId before listing so nothing added during this sync is missed next time
+    current_history_id = execute_request(service.users().getProfile(userId='me'))['historyId']
+
+    current_ids = list_message_ids(service, query=query, max_results=max_results)
+    store.set_active_ids(current_ids)
+
+    delta_ids = None
+    history_id = store.get_state('history_id')
+    if history_id:
+        try:
+            delta_ids = list_history_message_ids(service, history_id)
+        except Exception as e:
+            logger.warning(f"History sync from {history_id} failed, falling back to search: {str(e)}")
+    if delta_ids is None:
+        last_sync = store.get_state('last_sync')
+        delta_ids = list_message_ids(service, query=f"{query} after:{last_sync}") if last_sync else current_ids
+    retry_ids = [msg_id for msg_id in (store.get_state('retry_ids') or '').split(',') if msg_id]
+    # Only messages that match the query, in its order and within max_results
+    wanted = set(delta_ids) | set(retry_ids)
+    message_ids = [msg_id for msg_id in current_ids if msg_id in wanted]
+
+    known_ids = store.known_ids(message_ids)
+    new_ids = [msg_id for msg_id in message_ids if msg_id not in known_ids]
+    logger.info(f"Sync found {len(message_ids)} candidate emails, {len(new_ids)} not seen before")
+
+    failed = []
+    if new_ids:
+        new_emails = iter_classified_emails(
+            service, new_ids, batch_size=batch_size, cascade_band=cascade_band, failed=failed,
+            known_scores_fn=lambda emails: store.scores_by_hash(hash_body(email['body']) for email in emails)
+        )
+        for email in new_emails:
+            # Saved one by one so an interrupted stream keeps the work already done
+            store.save_emails([email])
+            yield email
+    if failed:
+        logger.warning(f"{len(failed)} emails could not be fetched and will be retried on the next sync")
+    # Messages that failed are retried next time, since the cursor moves past them
+    store.set_state('retry_ids', ','.join(failed))
+    store.set_state('history_id', current_history_id)
+    store.set_state('last_sync', sync_started)
+
+
+def summarize_stored_emails(store, max_results=None):
+    """
+    Returns a tuple of (stored_emails, frustration_summary) for the messages matching the sync query
+    (the store's active set), newest emails first.
+    The stored summary is reused while the set of frustrated emails is unchanged.
+    """
+    processed_emails = store.get_emails(limit=max_results, active_only=True)
+    summary_key = hash_body(','.join(email['id'] for email in processed_emails if email['is_frustrated']))
+    summary = store.get_state('summary')
+    if summary is None or store.get_state('summary_key') != summary_key:
+        summary = summarize_frustration_reasons(processed_emails)
+        if not summary.startswith("Summary error"):
+            store.set_state('summary', summary)
+            store.set_state('summary_key', summary_key)
+    return processed_emails, summary
+
+
+def latest_snapshot(store, max_results=None):
+    """
+    Reads the most recent results without contacting Gmail or Gemini: the emails that matched the query
+    at the last sync (newest first) and the summary saved by that sync. Returns a tuple of (emails, frustration_summary).
+    """
+    emails = store.get_emails(limit=max_results, active_only=True)
+    summary = store.get_state('summary')
+    if summary is None:
+        summary = "No frustrated emails found." if not any(email['is_frustrated'] for email in emails) else "Summary not generated yet."
+    return emails, summary
+
+
+def sync_and_classify_emails(store, query='is:unread', max_results=None, batch_size=GMAIL_BATCH_SIZE, cascade_band=CASCADE_BAND):
+    """
+    Incrementally syncs the mailbox into the scored-message store and returns the stored results.
+    Returns a tuple of (processed_emails, frustration_summary), newest emails first.
+    """
+    for _ in sync_new_emails(store, query=query, max_results=max_results, batch_size=batch_size, cascade_band=cascade_band):
+        pass
+    return summarize_stored_emails(store, max_results=max_results)
+
+
+def iter_sync_events(store, query='is:unread', max_results=None, batch_size=GMAIL_BATCH_SIZE, cascade_band=CASCADE_BAND):
+    """
+    Streaming variant of sync_and_classify_emails. Yields event dictionaries:
+      {'event': 'email', 'email': ...}          already-stored emails first, then each new email once scored
+      {'event': 'summary', 'frustration_summary': ..., 'total': n}   always last on success
+      {'event': 'error', 'error': ...}          if the sync fails part way through
+    """
+    try:
+        for email in store.get_emails(limit=max_results, active_only=True):
+            yield {'event': 'email', 'email': email}
+        for email in sync_new_emails(store, query=query, max_results=max_results, batch_size=batch_size, cascade_band=cascade_band):
+            yield {'event': 'email', 'email': email}
+        processed_emails, summary = summarize_stored_emails(store, max_results=max_results)
+        yield {'event': 'summary', 'frustration_summary': summary, 'total': len(processed_emails)}
+    except Exception as e:
+        logger.error(f"Error streaming emails: {str(e)}")
+        yield {'event': 'error', 'error': str(e)}
+
+
+# ==================== Cascade Evaluation ====================
+def evaluate_cascade(csv_path, cascade_band, limit=None):
+    """
+    Offline evaluation of a cascade band over a labeled CSV (columns 'text' and 'label', e.g. model/emails.csv).
+    Every row is scored by both models so the cascade can be compared with always-combined scoring.
+    Returns a report with the share of emails sent to Gemini, agreement with the combined decision,
+    accuracy of both strategies against the labels, and measured/estimated latencies.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('text') and row.get('label') not in (None, '')]
+    if limit is not None:
+        rows = rows[:limit]
+    if not rows:
+        raise ValueError(f"No labeled rows found in {csv_path}")
+    texts = [row['text'] for row in rows]
+    labels = np.array([int(float(row['label'])) for row in rows])
+
+    started = time.perf_counter()
+    custom_scores = predict_frustration_custom_batch(texts)
+    custom_seconds = time.perf_counter() - started
+
+    gemini_scores = np.empty(len(texts))
+    gemini_latencies = np.empty(len(texts))
+    for i, text in enumerate(texts):
+        started = time.perf_counter()
+        gemini_scores[i] = predict_frustration_gemini(text)
+        gemini_latencies[i] = time.perf_counter() - started
+
+    combined_decisions = (0.4 * custom_scores + 0.6 * gemini_scores) > 0.5
+    in_band = np.array([needs_gemini(score, cascade_band) for score in custom_scores])
+    cascade_decisions = np.where(in_band, combined_decisions, custom_scores > 0.5)
+
+    custom_per_email = custom_seconds / len(texts)
+    mean_gemini_latency = float(gemini_latencies.mean())
+    return {
+        'rows': len(texts),
+        'cascade_band': list(cascade_band) if cascade_band else None,
+        'gemini_calls': int(in_band.sum()),
+        'gemini_call_rate': float(in_band.mean()),
+        'agreement_with_combined': float((cascade_decisions == combined_decisions).mean()),
+        'accuracy_combined': float((combined_decisions == labels).mean()),
+        'accuracy_cascade': float((cascade_decisions == labels).mean()),
+        'mean_gemini_latency_seconds': mean_gemini_latency,
+        'custom_latency_per_email_seconds': custom_per_email,
+        'combined_latency_per_email_seconds': custom_per_email + mean_gemini_latency,
+        'cascade_latency_per_email_seconds': custom_per_email + float(gemini_latencies[in_band].sum()) / len(texts)
+    }
+
+
 # ==================== Unit Tests ====================
 import unittest
+import tempfile
+import threading
 from unittest.mock import patch, MagicMock
+from email_store import EmailStore
+from gemini_pool import GeminiWorkerPool, FAKE_GEMINI_WORKER_COMMAND
+from gemini_cache import GeminiCache
 
 class TestEmailClassifier(unittest.TestCase):
+    def setUp(self):
+        # Keep Gemini results out of the on-disk cache; tests that inspect the cache patch their own
+        cache_patch = patch('__main__.get_gemini_cache', return_value=GeminiCache(':memory:'))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
     def test_preprocess_text(self):
         """
         Test that HTML tags, URLs, non-alphabetic characters are removed,
@@ -261,29 +706,91 @@ class TestEmailClassifier(unittest.TestCase):
             model = original_model
             tfidf = original_tfidf
 
-    @patch('subprocess.check_output')
-    def test_predict_frustration_gemini(self, mock_check_output):
+    def test_predict_frustration_custom_kernel_matches_batch(self):
         """
-        Test Gemini prediction by patching subprocess.check_output to return a dummy JSON string.
+        Test that the single-email NumPy kernel agrees with the vectorized sklearn-style batch path.
         """
-        # Simulate node script output containing JSON data.
-        dummy_output = '{"confidence": 0.8}'
-        mock_check_output.return_value = dummy_output
-        # Also, patch Path.exists to always return True for the script.
-        with patch.object(Path, "exists", return_value=True):
-            result = predict_frustration_gemini("Dummy text")
-            self.assertAlmostEqual(result, 0.8)
+        self.assertIsNotNone(get_custom_scorer())
+        texts = ["I have been waiting for weeks and nobody answers!", "Thanks, the delivery was quick.", ""]
+        with patch('__main__.normalize_text', side_effect=lambda t: t.lower()), \
+                patch('__main__.normalize_many', side_effect=lambda ts: [t.lower() for t in ts]):
+            expected = predict_frustration_custom_batch(texts)
+            for text, probability in zip(texts, expected):
+                self.assertAlmostEqual(predict_frustration_custom(text), probability, delta=1e-9)
 
-    @patch('subprocess.check_output')
-    def test_summarize_emails_with_gemini(self, mock_check_output):
+    def test_predict_frustration_custom_batch(self):
         """
-        Test email summarization using Gemini by patching subprocess.check_output.
+        Test that batch scoring transforms the whole batch at once and returns a NumPy vector.
         """
-        dummy_summary = {"summary": "Test summary generated."}
-        mock_check_output.return_value = json.dumps(dummy_summary)
-        with patch.object(Path, "exists", return_value=True):
-            summary = summarize_emails_with_gemini("Some long text")
-            self.assertEqual(summary, "Test summary generated.")
+        class DummyModel:
+            def predict_proba(self, features):
+                return [[1 - 0.1 * i, 0.1 * i] for i in range(len(features))]
+        class DummyTfidf:
+            def __init__(self):
+                self.calls = 0
+            def transform(self, texts):
+                self.calls += 1
+                return texts
+
+        global model, tfidf
+        original_model = model
+        original_tfidf = tfidf
+        try:
+            model = DummyModel()
+            tfidf = DummyTfidf()
+            result = predict_frustration_custom_batch(["first", "second", "third"])
+            self.assertIsInstance(result, np.ndarray)
+            np.testing.assert_allclose(result, [0.0, 0.1, 0.2])
+            self.assertEqual(tfidf.calls, 1)
+            self.assertEqual(len(predict_frustration_custom_batch([])), 0)
+        finally:
+            model = original_model
+            tfidf = original_tfidf
+
+    def test_predict_frustration_gemini(self):
+        """
+        Test Gemini prediction against the offline fake worker, with repeated bodies served from the cache.
+        """
+        pool = GeminiWorkerPool(size=1, command=FAKE_GEMINI_WORKER_COMMAND)
+        cache = GeminiCache(':memory:')
+        try:
+            with patch('__main__.get_gemini_pool', return_value=pool), patch('__main__.get_gemini_cache', return_value=cache):
+                result = predict_frustration_gemini("Dummy text")
+                self.assertAlmostEqual(result, 0.8)
+                with patch.object(pool, 'request') as mock_request:
+                    self.assertAlmostEqual(predict_frustration_gemini("Dummy   text\n"), 0.8)
+                    mock_request.assert_not_called()
+                self.assertEqual(cache.stats()['hits'], 1)
+                self.assertEqual(cache.stats()['misses'], 1)
+        finally:
+            pool.close()
+            cache.close()
+
+    def test_predict_frustration_gemini_worker_failure(self):
+        """
+        Test that a failing worker falls back to the neutral 0.5 score, which is not cached.
+        """
+        pool = GeminiWorkerPool(size=1, command=FAKE_GEMINI_WORKER_COMMAND)
+        cache = GeminiCache(':memory:')
+        try:
+            with patch('__main__.get_gemini_pool', return_value=pool), patch('__main__.get_gemini_cache', return_value=cache):
+                self.assertEqual(predict_frustration_gemini("__crash__"), 0.5)
+                self.assertEqual(cache.stats()['entries'], 0)
+        finally:
+            pool.close()
+            cache.close()
+
+    def test_summarize_emails_with_gemini(self):
+        """
+        Test email summarization using Gemini against the offline fake worker.
+        """
+        pool = GeminiWorkerPool(size=1, command=FAKE_GEMINI_WORKER_COMMAND)
+        try:
+            with patch('__main__.get_gemini_pool', return_value=pool):
+                summary = summarize_emails_with_gemini("Some long text")
+                self.assertEqual(summary, "Fake summary of 14 characters")
+        finally:
+            pool.close()
 
     def test_summarize_frustration_reasons(self):
         """
@@ -299,20 +806,74 @@ class TestEmailClassifier(unittest.TestCase):
             summary = summarize_frustration_reasons(emails)
             self.assertEqual(summary, "Fake summary")
 
+    def test_chunk_texts(self):
+        """
+        Test that chunks respect the budget, keep order and split oversized texts.
+        """
+        chunks = chunk_texts(["aaaa", "bbbb", "cccc", "dddddddddddd"], budget=9)
+        self.assertEqual(chunks, ["aaaa\nbbbb", "cccc", "ddddddddd", "ddd"])
+        self.assertTrue(all(len(chunk) <= 9 for chunk in chunks))
+
+    def test_summarize_hierarchically_covers_everything_and_caches_chunks(self):
+        """
+        Test that every email reaches a map call, chunk summaries are reduced, and unchanged chunks hit the cache.
+        """
+        emails = [{'body': f"Complaint number {i} " + "x" * 30, 'is_frustrated': True} for i in range(12)]
+        seen = []
+
+        def fake_summarize(text):
+            seen.append(text)
+            return f"S{len(seen)}"
+
+        cache = GeminiCache(':memory:')
+        with patch('__main__.summarize_emails_with_gemini', side_effect=fake_summarize), \
+                patch('__main__.get_gemini_cache', return_value=cache), \
+                patch('__main__.SUMMARY_CHUNK_CHARS', 120):
+            summary = summarize_hierarchically([e['body'] for e in emails], budget=120)
+            mapped = ''.join(seen)
+            for i in range(12):
+                self.assertIn(f"Complaint number {i} ", mapped)
+            first_calls = len(seen)
+            self.assertGreater(first_calls, 2)
+            self.assertEqual(summary, f"S{first_calls}")
+
+            # Same inbox again: every chunk and the reduction come from the cache
+            self.assertEqual(summarize_hierarchically([e['body'] for e in emails], budget=120), summary)
+            self.assertEqual(len(seen), first_calls)
+        cache.close()
+
+    def test_new_email_only_resummarizes_the_last_chunk(self):
+        """
+        Test that a newly arrived frustrated email (first in the newest-first list) leaves earlier chunks cached.
+        """
+        emails = [{'body': f"Complaint number {i} " + "x" * 30, 'is_frustrated': True} for i in range(12, 0, -1)]
+        seen = []
+
+        def fake_summarize(text):
+            seen.append(text)
+            return f"S{len(seen)}"
+
+        cache = GeminiCache(':memory:')
+        with patch('__main__.summarize_emails_with_gemini', side_effect=fake_summarize), \
+                patch('__main__.get_gemini_cache', return_value=cache):
+            summarize_frustration_reasons(emails, budget=120)
+            first_calls = len(seen)
+            self.assertGreater(first_calls, 2)
+            new_email = {'body': "Complaint number 13 " + "x" * 30, 'is_frustrated': True}
+            summarize_frustration_reasons([new_email] + emails, budget=120)
+            remapped = [text for text in seen[first_calls:] if "Complaint number" in text]
+            self.assertEqual(len(remapped), 1)
+            self.assertIn("Complaint number 13 ", remapped[0])
+        cache.close()
+
     @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
     @patch('__main__.predict_frustration_gemini', return_value=0.6)
-    @patch('__main__.predict_frustration_custom', return_value=0.6)
+    @patch('__main__.predict_frustration_custom_batch', return_value=np.array([0.6]))
     @patch('__main__.get_gmail_service')
     def test_fetch_and_classify_emails(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
         """
         Test fetching and classifying emails by simulating the Gmail API responses.
         """
-        # Create a fake Gmail service with chained method calls.
-        fake_service = MagicMock()
-        # Fake list result with one message
-        fake_list_result = {'messages': [{'id': '1'}]}
-        fake_service.users.return_value.messages.return_value.list.return_value.execute.return_value = fake_list_result
-
         # Create fake email message data.
         fake_message_data = {
             'id': '1',
@@ -326,9 +887,8 @@ class TestEmailClassifier(unittest.TestCase):
                 'body': {'data': base64.urlsafe_b64encode("Test email body".encode('utf-8')).decode('utf-8')}
             }
         }
-        fake_service.users.return_value.messages.return_value.get.return_value.execute.return_value = fake_message_data
-
-        mock_get_service.return_value = fake_service
+        # Fake list result with one message
+        mock_get_service.return_value = make_fake_gmail_service([{'messages': [{'id': '1'}]}], {'1': fake_message_data})
 
         processed_emails, summary = fetch_and_classify_emails()
         # Check that one email is processed and that the classification is as expected.
@@ -336,15 +896,392 @@ class TestEmailClassifier(unittest.TestCase):
         self.assertTrue(processed_emails[0]['is_frustrated'])
         self.assertEqual(summary, "Fake summary")
 
+    def test_list_message_ids_follows_pages(self):
+        """
+        Test that listing follows nextPageToken until the last page and honours the cap.
+        """
+        pages = [
+            {'messages': [{'id': '1'}, {'id': '2'}], 'nextPageToken': 'page2'},
+            {'messages': [{'id': '3'}], 'nextPageToken': 'page3'},
+            {'messages': [{'id': '4'}]},
+        ]
+        service = make_fake_gmail_service(pages, {})
+        self.assertEqual(list_message_ids(service, query='is:unread'), ['1', '2', '3', '4'])
+        list_calls = service.users.return_value.messages.return_value.list.call_args_list
+        self.assertEqual([c.kwargs.get('pageToken') for c in list_calls], [None, 'page2', 'page3'])
+
+        service = make_fake_gmail_service(pages, {})
+        self.assertEqual(list_message_ids(service, query='from:me', max_results=3), ['1', '2', '3'])
+        list_calls = service.users.return_value.messages.return_value.list.call_args_list
+        self.assertEqual(len(list_calls), 2)
+        self.assertEqual(list_calls[0].kwargs['q'], 'from:me')
+        self.assertEqual(list_calls[1].kwargs['maxResults'], 1)
+
+    def test_fetch_messages_batched(self):
+        """
+        Test that messages are grouped into batch requests, returned in order, and failures are skipped.
+        """
+        messages = {str(i): make_fake_message(str(i), f"Body {i}") for i in range(1, 6) if i != 4}
+        service = make_fake_gmail_service([], messages)
+        batches = list(fetch_messages_batched(service, ['1', '2', '3', '4', '5'], batch_size=2))
+        # One metadata batch and one full batch per group of two
+        self.assertEqual(service.new_batch_http_request.call_count, 6)
+        self.assertEqual([[m['id'] for m in batch] for batch in batches], [['1', '2'], ['3'], ['5']])
+        self.assertEqual(batches[0][0]['payload']['headers'], [{'name': 'Subject', 'value': 'Subject 1'}])
+
+    def test_fetch_messages_batched_skips_filtered_messages_before_download(self):
+        """
+        Test that senders and sizes are checked on metadata, so filtered messages are never fetched in full.
+        """
+        messages = {msg_id: make_fake_message(msg_id, f"Body {msg_id}") for msg_id in ['1', '2', '3']}
+        messages['2']['payload']['headers'].append({'name': 'From', 'value': 'News <noreply@example.com>'})
+        messages['3']['sizeEstimate'] = 10 * 1024 * 1024
+        service = make_fake_gmail_service([], messages)
+        message_filter = lambda metadata: should_download(metadata, skip_senders=['noreply@'], max_message_bytes=1024 * 1024)
+        batches = list(fetch_messages_batched(service, ['1', '2', '3'], message_filter=message_filter))
+        self.assertEqual([[m['id'] for m in batch] for batch in batches], [['1']])
+        formats = [c.kwargs.get('format') for c in service.users.return_value.messages.return_value.get.call_args_list]
+        self.assertEqual(formats, ['metadata', 'metadata', 'metadata', 'full'])
+
+    def test_parse_email_message_nested_parts_with_byte_cap(self):
+        """
+        Test that the text/plain part is found inside nested multiparts and decoded only up to the byte cap.
+        """
+        encode = lambda text: base64.urlsafe_b64encode(text.encode('utf-8')).decode('utf-8')
+        msg_data = {'payload': {
+            'mimeType': 'multipart/mixed',
+            'headers': [{'name': 'From', 'value': 'a@example.com'}, {'name': 'Subject', 'value': 'Hi'}],
+            'parts': [
+                {'mimeType': 'multipart/alternative', 'parts': [
+                    {'mimeType': 'text/plain', 'body': {'data': encode("Where is my refund?")}},
+                    {'mimeType': 'text/html', 'body': {'data': encode("<p>Where is my refund?</p>")}},
+                ]},
+                {'mimeType': 'image/png', 'filename': 'logo.png', 'body': {'attachmentId': 'img'}},
+            ]
+        }}
+        self.assertEqual(parse_email_message(msg_data), ('a@example.com', 'Hi', '', "Where is my refund?"))
+        self.assertEqual(parse_email_message(msg_data, max_body_bytes=8)[3], "Where is")
+
+    @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
+    @patch('__main__.predict_frustration_gemini', return_value=0.6)
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.6))
+    @patch('__main__.get_gmail_service')
+    def test_sync_and_classify_emails_is_incremental(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
+        """
+        Test that the first sync lists by query and later syncs only fetch and score unseen messages.
+        """
+        messages = {msg_id: make_fake_message(msg_id, f"Body {msg_id}", internal_date=i) for i, msg_id in enumerate(['1', '2', '3'])}
+        store = EmailStore(':memory:')
+
+        service = make_fake_gmail_service([{'messages': [{'id': '2'}, {'id': '1'}]}], messages, history_id='100')
+        mock_get_service.return_value = service
+        emails, summary = sync_and_classify_emails(store)
+        self.assertEqual([e['id'] for e in emails], ['2', '1'])
+        self.assertEqual(summary, "Fake summary")
+        self.assertEqual(store.get_state('history_id'), '100')
+        self.assertEqual(mock_gemini.call_count, 2)
+
+        history = [{'history': [{'messagesAdded': [{'message': {'id': '3'}}, {'message': {'id': '2'}}]}]}]
+        listing = [{'messages': [{'id': '3'}, {'id': '2'}, {'id': '1'}]}]
+        service = make_fake_gmail_service(listing, messages, history_id='200', history_pages=history)
+        mock_get_service.return_value = service
+        emails, _ = sync_and_classify_emails(store)
+        self.assertEqual([e['id'] for e in emails], ['3', '2', '1'])
+        history_call = service.users.return_value.history.return_value.list.call_args
+        self.assertEqual(history_call.kwargs['startHistoryId'], '100')
+        # Only the new message is fetched: once for metadata, once in full
+        self.assertEqual(service.users.return_value.messages.return_value.get.call_count, 2)
+        self.assertEqual(mock_gemini.call_count, 3)
+        self.assertEqual(store.get_state('history_id'), '200')
+        # The frustrated set changed, so the summary was regenerated once more
+        self.assertEqual(mock_summarize.call_count, 2)
+
+        # Nothing new: no fetches, no scoring and the stored summary is reused
+        service = make_fake_gmail_service(listing, messages, history_id='300', history_pages=[{'history': []}])
+        mock_get_service.return_value = service
+        emails, summary = sync_and_classify_emails(store)
+        self.assertEqual(len(emails), 3)
+        self.assertEqual(summary, "Fake summary")
+        self.assertEqual(mock_gemini.call_count, 3)
+        self.assertEqual(mock_summarize.call_count, 2)
+        store.close()
+
+    @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
+    @patch('__main__.predict_frustration_gemini', return_value=0.9)
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.9))
+    @patch('__main__.get_gmail_service')
+    def test_iter_sync_events_streams_emails_then_summary(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
+        """
+        Test that stored emails stream first, new emails follow as they are scored, and the summary comes last.
+        """
+        messages = {msg_id: make_fake_message(msg_id, f"Body {msg_id}", internal_date=i) for i, msg_id in enumerate(['1', '2'])}
+        store = EmailStore(':memory:')
+        mock_get_service.return_value = make_fake_gmail_service([{'messages': [{'id': '1'}]}], messages, history_id='10')
+        sync_and_classify_emails(store)
+
+        history = [{'history': [{'messagesAdded': [{'message': {'id': '2'}}]}]}]
+        listing = [{'messages': [{'id': '2'}, {'id': '1'}]}]
+        mock_get_service.return_value = make_fake_gmail_service(listing, messages, history_id='20', history_pages=history)
+        events = iter_sync_events(store)
+        first = next(events)
+        # The stored email is available before Gmail has even been contacted for the new one
+        self.assertEqual(first['email']['id'], '1')
+        self.assertEqual(mock_gemini.call_count, 1)
+        rest = list(events)
+        self.assertEqual([(e['event'], e.get('email', {}).get('id')) for e in rest], [('email', '2'), ('summary', None)])
+        self.assertEqual(rest[-1]['frustration_summary'], "Fake summary")
+        self.assertEqual(rest[-1]['total'], 2)
+        self.assertEqual(store.get_state('history_id'), '20')
+
+        mock_get_service.side_effect = Exception("Gmail unavailable")
+        self.assertEqual(list(iter_sync_events(store))[-1], {'event': 'error', 'error': "Gmail unavailable"})
+        store.close()
+
+    def test_latest_snapshot_reads_store_only(self):
+        """
+        Test that the snapshot comes straight from the store, with the summary saved by the last sync.
+        """
+        store = EmailStore(':memory:')
+        self.assertEqual(latest_snapshot(store), ([], "No frustrated emails found."))
+        email = {'id': '1', 'from': '', 'subject': '', 'date': '', 'internal_date': 1, 'body': 'Body',
+                 'score_custom': 0.9, 'score_gemini': 0.9, 'combined_score': 0.9, 'is_frustrated': True}
+        store.save_emails([email])
+        self.assertEqual(latest_snapshot(store)[1], "Summary not generated yet.")
+        store.set_state('summary', "Late deliveries")
+        emails, summary = latest_snapshot(store)
+        self.assertEqual(([e['id'] for e in emails], summary), (['1'], "Late deliveries"))
+        store.close()
+
+    @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
+    @patch('__main__.predict_frustration_gemini', return_value=0.2)
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.2))
+    @patch('__main__.get_gmail_service')
+    def test_sync_falls_back_to_after_cursor(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
+        """
+        Test that an unusable history ID falls back to an 'after:' search from the last sync time.
+        """
+        store = EmailStore(':memory:')
+        store.set_state('history_id', '50')
+        store.set_state('last_sync', 1700000000)
+        listing = [{'messages': [{'id': '1'}]}, {'messages': [{'id': '1'}]}]
+        service = make_fake_gmail_service(listing, {'1': make_fake_message('1', "Body")}, history_id='60')
+        service.users.return_value.history.return_value.list.return_value.execute.side_effect = Exception("404 history expired")
+        mock_get_service.return_value = service
+        emails, summary = sync_and_classify_emails(store)
+        self.assertEqual([e['id'] for e in emails], ['1'])
+        self.assertEqual(summary, "No frustrated emails found.")
+        list_call = service.users.return_value.messages.return_value.list.call_args
+        self.assertEqual(list_call.kwargs['q'], 'is:unread after:1700000000')
+        self.assertEqual(store.get_state('history_id'), '60')
+        store.close()
+
+    @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
+    @patch('__main__.predict_frustration_gemini', return_value=0.2)
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.2))
+    @patch('__main__.get_gmail_service')
+    def test_sync_history_applies_query_and_cap(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
+        """
+        Test that history additions outside the query or max_results are skipped and stale emails drop out.
+        """
+        messages = {msg_id: make_fake_message(msg_id, f"Body {msg_id}", internal_date=i) for i, msg_id in enumerate(['1', '2', '3', '4'])}
+        store = EmailStore(':memory:')
+        mock_get_service.return_value = make_fake_gmail_service([{'messages': [{'id': '2'}, {'id': '1'}]}], messages)
+        sync_and_classify_emails(store, max_results=2)
+
+        # '4' was added but already read, '1' has been read since and '3' is new and unread
+        history = [{'history': [{'messagesAdded': [{'message': {'id': '4'}}, {'message': {'id': '3'}}]}]}]
+        listing = [{'messages': [{'id': '3'}, {'id': '2'}]}]
+        service = make_fake_gmail_service(listing, messages, history_id='2', history_pages=history)
+        mock_get_service.return_value = service
+        emails, _ = sync_and_classify_emails(store, max_results=2)
+        self.assertEqual([e['id'] for e in emails], ['3', '2'])
+        self.assertEqual(service.users.return_value.messages.return_value.list.call_args.kwargs['maxResults'], 2)
+        self.assertEqual(service.users.return_value.messages.return_value.get.call_count, 2)
+        self.assertEqual(latest_snapshot(store)[0], emails)
+        store.close()
+
+    @patch('__main__.summarize_emails_with_gemini', return_value="Fake summary")
+    @patch('__main__.predict_frustration_gemini', return_value=0.2)
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.2))
+    @patch('__main__.get_gmail_service')
+    def test_sync_retries_failed_messages(self, mock_get_service, mock_custom, mock_gemini, mock_summarize):
+        """
+        Test that messages which failed to download are retried on the next sync although the cursor advanced.
+        """
+        store = EmailStore(':memory:')
+        messages = {'1': make_fake_message('1', "Body 1")}
+        listing = [{'messages': [{'id': '2'}, {'id': '1'}]}]
+        mock_get_service.return_value = make_fake_gmail_service(listing, messages, history_id='10')
+        emails, _ = sync_and_classify_emails(store)
+        self.assertEqual([e['id'] for e in emails], ['1'])
+        self.assertEqual(store.get_state('retry_ids'), '2')
+        self.assertEqual(store.get_state('history_id'), '10')
+
+        messages['2'] = make_fake_message('2', "Body 2", internal_date=1)
+        mock_get_service.return_value = make_fake_gmail_service(listing, messages, history_id='20', history_pages=[{'history': []}])
+        emails, _ = sync_and_classify_emails(store)
+        self.assertEqual([e['id'] for e in emails], ['2', '1'])
+        self.assertEqual(store.get_state('retry_ids'), '')
+        store.close()
+
+    @patch('__main__.predict_frustration_gemini', return_value=0.9)
+    @patch('__main__.predict_frustration_custom_batch', return_value=np.array([0.05, 0.5, 0.95]))
+    @patch('__main__.get_gmail_service')
+    def test_cascade_skips_gemini_outside_band(self, mock_get_service, mock_custom, mock_gemini):
+        """
+        Test that only emails inside the cascade band are sent to Gemini and the deciding path is recorded.
+        """
+        messages = {msg_id: make_fake_message(msg_id, f"Body {msg_id}") for msg_id in ['1', '2', '3']}
+        mock_get_service.return_value = make_fake_gmail_service([{'messages': [{'id': '1'}, {'id': '2'}, {'id': '3'}]}], messages)
+        with patch('__main__.summarize_emails_with_gemini', return_value="Fake summary"):
+            emails, _ = fetch_and_classify_emails(cascade_band=(0.1, 0.9))
+        self.assertEqual(mock_gemini.call_count, 1)
+        self.assertEqual([e['decided_by'] for e in emails], ['custom', 'combined', 'custom'])
+        self.assertEqual([e['is_frustrated'] for e in emails], [False, True, True])
+        self.assertIsNone(emails[0]['score_gemini'])
+        self.assertAlmostEqual(emails[1]['combined_score'], 0.4 * 0.5 + 0.6 * 0.9)
+        self.assertEqual(emails[2]['combined_score'], 0.95)
+
+    @patch('__main__.predict_frustration_custom_batch', side_effect=lambda texts: np.full(len(list(texts)), 0.5))
+    def test_pipeline_bounded_ordered_and_isolated(self, mock_custom):
+        """
+        Test that Gemini calls overlap up to max_in_flight, results keep Gmail order,
+        and a failing email falls back to 0.5 without stalling the others.
+        """
+        lock = threading.Lock()
+        in_flight = {'now': 0, 'max': 0}
+
+        def slow_gemini(body):
+            with lock:
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            try:
+                index = int(body.split()[-1])
+                time.sleep(0.05 * (index % 3))
+                if index == 4:
+                    raise RuntimeError("Gemini exploded")
+                return 1.0
+            finally:
+                with lock:
+                    in_flight['now'] -= 1
+
+        ids = [str(i) for i in range(10)]
+        service = make_fake_gmail_service([], {msg_id: make_fake_message(msg_id, f"Body {msg_id}") for msg_id in ids})
+        with patch('__main__.predict_frustration_gemini', side_effect=slow_gemini):
+            emails = list(iter_classified_emails(service, ids, batch_size=3, max_in_flight=3))
+        self.assertEqual([e['id'] for e in emails], ids)
+        self.assertLessEqual(in_flight['max'], 3)
+        self.assertGreater(in_flight['max'], 1)
+        self.assertEqual(emails[4]['score_gemini'], 0.5)
+        self.assertTrue(all(e['score_gemini'] == 1.0 for e in emails if e['id'] != '4'))
+
+    def test_parse_cascade_band(self):
+        """
+        Test parsing of the EMAIL_CASCADE_BAND setting.
+        """
+        self.assertIsNone(parse_cascade_band(''))
+        self.assertEqual(parse_cascade_band('0.1,0.9'), (0.1, 0.9))
+        with self.assertRaises(ValueError):
+            parse_cascade_band('0.9,0.1')
+
+    @patch('__main__.predict_frustration_gemini', side_effect=[0.9, 0.9, 0.1, 0.1])
+    @patch('__main__.predict_frustration_custom_batch', return_value=np.array([0.02, 0.6, 0.4, 0.98]))
+    def test_evaluate_cascade(self, mock_custom, mock_gemini):
+        """
+        Test the offline cascade report on a small labeled CSV.
+        """
+        csv_path = os.path.join(tempfile.mkdtemp(), 'emails.csv')
+        with open(csv_path, 'w', newline='') as f:
+            f.write('text,label\n"a",0\n"b",1\n"c",0\n"d",1\n')
+        report = evaluate_cascade(csv_path, (0.1, 0.9))
+        self.assertEqual(report['rows'], 4)
+        self.assertEqual(report['gemini_calls'], 2)
+        self.assertEqual(report['gemini_call_rate'], 0.5)
+        # Combined decisions: [T, T, F, F]; cascade decisions: [F, T, F, T]
+        self.assertEqual(report['agreement_with_combined'], 0.5)
+        self.assertEqual(report['accuracy_combined'], 0.5)
+        self.assertEqual(report['accuracy_cascade'], 1.0)
+
+
+def make_fake_message(msg_id, body, internal_date=0):
+    """Builds a minimal Gmail message resource with a plain-text body."""
+    return {
+        'id': msg_id,
+        'internalDate': str(internal_date),
+        'payload': {
+            'headers': [{'name': 'Subject', 'value': f'Subject {msg_id}'}],
+            'body': {'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('utf-8')}
+        }
+    }
+
+
+class FakeBatchHttpRequest:
+    """Stand-in for googleapiclient's BatchHttpRequest that runs the queued requests in order."""
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                response = request.execute()
+            except Exception as e:
+                self.callback(request_id, None, e)
+                continue
+            self.callback(request_id, response, None)
+
+
+def make_fake_gmail_service(list_pages, messages, history_id='1', history_pages=()):
+    """
+    Builds a MagicMock Gmail service that serves the given list and history pages in order,
+    message resources by ID, and the profile historyId, with batch HTTP support.
+    """
+    service = MagicMock()
+    service.users.return_value.messages.return_value.list.return_value.execute.side_effect = list(list_pages)
+    service.users.return_value.history.return_value.list.return_value.execute.side_effect = list(history_pages)
+    service.users.return_value.getProfile.return_value.execute.return_value = {'historyId': history_id}
+
+    def get_message(userId, id, format='full', **kwargs):
+        request = MagicMock()
+        if id in messages and format == 'metadata':
+            message = messages[id]
+            request.execute.return_value = {
+                'id': id, 'internalDate': message.get('internalDate', '0'), 'sizeEstimate': message.get('sizeEstimate', 0),
+                'payload': {'headers': message['payload'].get('headers', [])}
+            }
+        elif id in messages:
+            request.execute.return_value = messages[id]
+        else:
+            request.execute.side_effect = Exception(f"Message {id} not found")
+        return request
+
+    service.users.return_value.messages.return_value.get.side_effect = get_message
+    service.new_batch_http_request.side_effect = FakeBatchHttpRequest
+    return service
+
 
 # ==================== Main Execution ====================
 if __name__ == '__main__':
     import sys
+    import json
     # If "test" is passed as a command-line argument, run unit tests.
     if len(sys.argv) > 1 and sys.argv[1] == "test":
         # Remove the test argument before running unittest
         sys.argv.pop(1)
         unittest.main()
+    elif len(sys.argv) > 1 and sys.argv[1] == "evaluate-cascade":
+        # Example: python email_processor.py evaluate-cascade --band 0.1,0.9 --limit 200
+        import argparse
+        parser = argparse.ArgumentParser(description="Report the agreement/latency trade-off of a cascade band.")
+        parser.add_argument('--band', required=True, help='lower,upper custom-score band sent to Gemini')
+        parser.add_argument('--csv', default=os.path.join('model', 'emails.csv'), help='labeled CSV with text,label columns')
+        parser.add_argument('--limit', type=int, default=None, help='only evaluate the first N rows')
+        args = parser.parse_args(sys.argv[2:])
+        report = evaluate_cascade(args.csv, parse_cascade_band(args.band), limit=args.limit)
+        print(json.dumps(report, indent=2))
     else:
         try:
             emails, summary = fetch_and_classify_emails()
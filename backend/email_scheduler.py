@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+import logging
+import threading
+import unittest
+from unittest.mock import patch
+
+from email_processor import sync_and_classify_emails, iter_sync_events, latest_snapshot
+from email_store import EmailStore, get_email_store
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds between background mailbox syncs; 0 disables the background loop (override with EMAIL_SYNC_INTERVAL)
+EMAIL_SYNC_INTERVAL = int(os.environ.get('EMAIL_SYNC_INTERVAL', '300'))
+
+
+class EmailScheduler:
+    """
+    Runs the mailbox sync-and-score job on an interval in a background thread so HTTP requests only read
+    the stored snapshot. At most one run happens at a time: a run requested while another is in progress
+    is not queued behind it (single flight).
+    """
+
+    def __init__(self, store, interval_seconds=EMAIL_SYNC_INTERVAL):
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self._run_lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {
+            'running': False,
+            'runs': 0,
+            'last_started_at': None,
+            'last_finished_at': None,
+            'last_duration_seconds': None,
+            'last_error': None,
+            'last_email_count': None,
+            'next_run_at': None,
+        }
+
+    # ---- job ----
+
+    def _job(self):
+        """One sync: fetch and score new mail, refresh the summary, return the number of stored emails."""
+        emails, _ = sync_and_classify_emails(self.store)
+        return len(emails)
+
+    def _started(self):
+        with self._status_lock:
+            self._status.update(running=True, last_started_at=time.time())
+        return time.perf_counter()
+
+    def _finished(self, started, email_count=None, error=None):
+        with self._status_lock:
+            self._status.update(
+                running=False,
+                runs=self._status['runs'] + 1,
+                last_finished_at=time.time(),
+                last_duration_seconds=round(time.perf_counter() - started, 3),
+                last_error=error,
+                last_email_count=email_count
+            )
+
+    def run_once(self, wait=False):
+        """
+        Run the job now unless a run is already in progress. With wait=True, a caller that finds a run
+        in progress blocks until it finishes instead of returning immediately.
+        Returns True if this call performed the run.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            if wait:
+                with self._run_lock:
+                    pass
+            return False
+        try:
+            started = self._started()
+            try:
+                email_count = self._job()
+            except Exception as e:
+                logger.error(f"Scheduled email sync failed: {str(e)}")
+                self._finished(started, error=str(e))
+            else:
+                logger.info(f"Scheduled email sync finished with {email_count} stored emails")
+                self._finished(started, email_count=email_count)
+            return True
+        finally:
+            self._run_lock.release()
+
+    def iter_events(self, max_results=None):
+        """
+        Streaming counterpart of run_once: yields iter_sync_events() for a live run when none is in progress,
+        otherwise the stored snapshot as the same email/summary events.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            emails, summary = latest_snapshot(self.store, max_results=max_results)
+            for email in emails:
+                yield {'event': 'email', 'email': email}
+            yield {'event': 'summary', 'frustration_summary': summary, 'total': len(emails)}
+            return
+        started = self._started()
+        error, email_count, completed = None, None, False
+        try:
+            for event in iter_sync_events(self.store, max_results=max_results):
+                if event['event'] == 'error':
+                    error = event['error']
+                elif event['event'] == 'summary':
+                    email_count = event['total']
+                yield event
+            completed = True
+        finally:
+            # Also reached on GeneratorExit when the client disconnects part way through the stream
+            if not completed and error is None:
+                error = "Interrupted before the sync finished"
+                logger.warning("Streamed email sync was interrupted")
+            self._finished(started, email_count=email_count, error=error)
+            self._run_lock.release()
+
+    # ---- background loop ----
+
+    def start(self):
+        """Start the background loop (no-op when the interval is 0 or it is already running)."""
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='email-scheduler', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            with self._status_lock:
+                self._status['next_run_at'] = time.time() + self.interval_seconds
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+        with self._status_lock:
+            self._status['next_run_at'] = None
+
+    def trigger(self):
+        """
+        Request a run now ("refresh now"). Wakes the background loop, or starts a one-off run
+        when there is no loop. Returns False if a run is already in progress.
+        """
+        if self._run_lock.locked():
+            return False
+        if self._thread and self._thread.is_alive():
+            self._wake.set()
+        else:
+            threading.Thread(target=self.run_once, name='email-refresh', daemon=True).start()
+        return True
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def status(self):
+        """Return the state of the current or last run and when the next one is due."""
+        with self._status_lock:
+            status = dict(self._status)
+        status['interval_seconds'] = self.interval_seconds
+        status['background'] = bool(self._thread and self._thread.is_alive())
+        status['last_sync'] = self.store.get_state('last_sync')
+        return status
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_email_scheduler():
+    """Return the process-wide EmailScheduler over the default email store (not started)."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = EmailScheduler(get_email_store())
+        return _default_scheduler
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class SlowScheduler(EmailScheduler):
+    """Scheduler whose job waits for a release event and counts its runs."""
+
+    def __init__(self, interval_seconds=0, fail=False):
+        super().__init__(EmailStore(':memory:'), interval_seconds=interval_seconds)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+        self.fail = fail
+
+    def _job(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("Gmail unavailable")
+        return 3
+
+
+class TestEmailScheduler(unittest.TestCase):
+
+    def test_run_once_records_status(self):
+        scheduler = SlowScheduler()
+        scheduler.release.set()
+        self.assertTrue(scheduler.run_once())
+        status = scheduler.status()
+        self.assertEqual(status['runs'], 1)
+        self.assertEqual(status['last_email_count'], 3)
+        self.assertIsNone(status['last_error'])
+        self.assertFalse(status['running'])
+
+    def test_failed_run_records_error(self):
+        scheduler = SlowScheduler(fail=True)
+        scheduler.release.set()
+        scheduler.run_once()
+        self.assertEqual(scheduler.status()['last_error'], "Gmail unavailable")
+
+    def test_single_flight(self):
+        scheduler = SlowScheduler()
+        first = threading.Thread(target=scheduler.run_once)
+        first.start()
+        scheduler.started.wait(5)
+        self.assertTrue(scheduler.status()['running'])
+        self.assertFalse(scheduler.run_once())
+        self.assertFalse(scheduler.trigger())
+        # A waiting caller returns once the in-progress run is done, without running again
+        waiter = threading.Thread(target=scheduler.run_once, kwargs={'wait': True})
+        waiter.start()
+        scheduler.release.set()
+        first.join(5)
+        waiter.join(5)
+        self.assertEqual(scheduler.calls, 1)
+
+    @patch('__main__.iter_sync_events')
+    def test_interrupted_stream_records_run(self, mock_events):
+        mock_events.return_value = iter([{'event': 'email', 'email': {'id': '1'}}, {'event': 'summary', 'total': 1}])
+        scheduler = SlowScheduler()
+        events = scheduler.iter_events()
+        next(events)
+        self.assertTrue(scheduler.status()['running'])
+        # The client disconnects after the first event
+        events.close()
+        status = scheduler.status()
+        self.assertFalse(status['running'])
+        self.assertEqual(status['runs'], 1)
+        self.assertEqual(status['last_error'], "Interrupted before the sync finished")
+        scheduler.release.set()
+        self.assertTrue(scheduler.run_once())
+
+    def test_background_loop_and_trigger(self):
+        scheduler = SlowScheduler(interval_seconds=60)
+        scheduler.release.set()
+        scheduler.start()
+        try:
+            deadline = time.time() + 5
+            while scheduler.status()['runs'] < 1 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(scheduler.status()['background'])
+            self.assertIsNotNone(scheduler.status()['next_run_at'])
+            # "Refresh now" wakes the loop instead of waiting out the interval
+            self.assertTrue(scheduler.trigger())
+            while scheduler.status()['runs'] < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(scheduler.status()['runs'], 2)
+        finally:
+            scheduler.stop()
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
+    else:
+        # Separate-process mode: keep the store up to date without the web server
+        logging.basicConfig(level=logging.INFO)
+        scheduler = EmailScheduler(get_email_store(), interval_seconds=max(EMAIL_SYNC_INTERVAL, 1))
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,234 @@
+import os
+import sys
+import hashlib
+import logging
+import sqlite3
+import threading
+import unittest
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Location of the scored-message database (override with EMAIL_STORE_PATH)
+DEFAULT_STORE_PATH = os.environ.get(
+    'EMAIL_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email_store.sqlite3')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    sender TEXT,
+    subject TEXT,
+    date TEXT,
+    internal_date INTEGER,
+    body TEXT,
+    body_hash TEXT,
+    score_custom REAL,
+    score_gemini REAL,
+    combined_score REAL,
+    is_frustrated INTEGER,
+    decided_by TEXT,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS messages_body_hash ON messages (body_hash);
+CREATE INDEX IF NOT EXISTS messages_internal_date ON messages (internal_date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def hash_body(body):
+    """Return the SHA-256 hex digest of an email body."""
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class EmailStore:
+    """
+    SQLite-backed store of scored Gmail messages and the mailbox sync cursor.
+    A single connection is shared between threads and guarded by a lock.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _select_in(self, sql, values):
+        """Run a SELECT with an IN (...) clause over values, chunked to respect SQLite's parameter limit."""
+        values = list(values)
+        rows = []
+        with self._lock:
+            for start in range(0, len(values), _QUERY_CHUNK):
+                chunk = values[start:start + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(self._conn.execute(sql.format(placeholders), chunk).fetchall())
+        return rows
+
+    def known_ids(self, message_ids):
+        """Return the subset of message_ids that are already stored."""
+        rows = self._select_in("SELECT id FROM messages WHERE id IN ({})", message_ids)
+        return {row['id'] for row in rows}
+
+    def scores_by_hash(self, body_hashes):
+        """Return a dict mapping body hash -> (score_custom, score_gemini) for bodies already scored."""
+        rows = self._select_in(
+            "SELECT body_hash, score_custom, score_gemini FROM messages WHERE body_hash IN ({})", body_hashes
+        )
+        return {row['body_hash']: (row['score_custom'], row['score_gemini']) for row in rows}
+
+    def save_emails(self, emails):
+        """Insert or replace scored email dictionaries (as produced by email_processor)."""
+        records = [
+            (
+                email['id'], email['from'], email['subject'], email['date'], email.get('internal_date', 0),
+                email['body'], hash_body(email['body']), email['score_custom'], email['score_gemini'],
+                email['combined_score'], int(email['is_frustrated']), email.get('decided_by')
+            )
+            for email in emails
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (id, sender, subject, date, internal_date, body, body_hash, "
+                "score_custom, score_gemini, combined_score, is_frustrated, decided_by) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+
+    def set_active_ids(self, message_ids):
+        """
+        Mark exactly message_ids as active: the messages currently matching the sync query.
+        Inactive rows (read or deleted since) keep their scores but are left out of get_emails(active_only=True).
+        """
+        message_ids = list(message_ids)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE messages SET active = 0")
+            for start in range(0, len(message_ids), _QUERY_CHUNK):
+                chunk = message_ids[start:start + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                self._conn.execute(f"UPDATE messages SET active = 1 WHERE id IN ({placeholders})", chunk)
+
+    def get_emails(self, limit=None, active_only=False):
+        """
+        Return stored emails, newest first, in the same dictionary shape email_processor produces.
+        With active_only, only the messages marked active by the last sync are returned.
+        """
+        sql = "SELECT * FROM messages"
+        if active_only:
+            sql += " WHERE active = 1"
+        sql += " ORDER BY internal_date DESC, id DESC"
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                'id': row['id'],
+                'from': row['sender'],
+                'subject': row['subject'],
+                'date': row['date'],
+                'internal_date': row['internal_date'],
+                'body': row['body'],
+                'score_custom': row['score_custom'],
+                'score_gemini': row['score_gemini'],
+                'combined_score': row['combined_score'],
+                'is_frustrated': bool(row['is_frustrated']),
+                'decided_by': row['decided_by']
+            }
+            for row in rows
+        ]
+
+    def get_state(self, key, default=None):
+        """Return a value from the sync_state table."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key, value):
+        """Store a value in the sync_state table."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_email_store():
+    """Return the process-wide EmailStore, opening it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = EmailStore(DEFAULT_STORE_PATH)
+        return _default_store
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestEmailStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = EmailStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def make_email(self, msg_id, body, internal_date, score=0.7):
+        return {
+            'id': msg_id, 'from': 'sender@example.com', 'subject': 'Subject', 'date': 'Mon',
+            'internal_date': internal_date, 'body': body, 'score_custom': score, 'score_gemini': score,
+            'combined_score': score, 'is_frustrated': score > 0.5
+        }
+
+    def test_save_and_get_emails(self):
+        self.store.save_emails([self.make_email('a', 'old', 1), self.make_email('b', 'new', 2, score=0.2)])
+        emails = self.store.get_emails()
+        self.assertEqual([e['id'] for e in emails], ['b', 'a'])
+        self.assertFalse(emails[0]['is_frustrated'])
+        self.assertTrue(emails[1]['is_frustrated'])
+        self.assertEqual(len(self.store.get_emails(limit=1)), 1)
+
+    def test_known_ids_and_scores_by_hash(self):
+        self.store.save_emails([self.make_email('a', 'same body', 1, score=0.9)])
+        self.assertEqual(self.store.known_ids(['a', 'b']), {'a'})
+        scores = self.store.scores_by_hash([hash_body('same body'), hash_body('other')])
+        self.assertEqual(scores, {hash_body('same body'): (0.9, 0.9)})
+
+    def test_set_active_ids(self):
+        self.store.save_emails([self.make_email('a', 'old', 1), self.make_email('b', 'new', 2)])
+        self.store.set_active_ids(['a'])
+        self.assertEqual([e['id'] for e in self.store.get_emails(active_only=True)], ['a'])
+        self.assertEqual(len(self.store.get_emails()), 2)
+        # Newly saved messages start out active
+        self.store.save_emails([self.make_email('c', 'newest', 3)])
+        self.assertEqual([e['id'] for e in self.store.get_emails(active_only=True)], ['c', 'a'])
+
+    def test_sync_state(self):
+        self.assertIsNone(self.store.get_state('history_id'))
+        self.store.set_state('history_id', 1234)
+        self.assertEqual(self.store.get_state('history_id'), '1234')
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
@@ -0,0 +1,57 @@
+"""
+Offline stand-in for gemini_worker.js that speaks the same newline-delimited JSON protocol.
+Used by the unit tests; can also be selected with GEMINI_WORKER_CMD for local runs without an API key.
+
+Special inputs:
+  "__crash__"         exit immediately without answering
+  "__sleep__:<secs>"  wait before answering (requests are answered concurrently)
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+# Frustration confidence returned for every 'predict' request
+FAKE_CONFIDENCE = float(os.environ.get('FAKE_GEMINI_CONFIDENCE', '0.8'))
+
+_write_lock = threading.Lock()
+
+
+def respond(message):
+    with _write_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+def run_task(task, text):
+    if text.startswith("__sleep__:"):
+        time.sleep(float(text.split(":", 1)[1]))
+    if task == 'predict':
+        return {'confidence': FAKE_CONFIDENCE}
+    if task in ('summarize_emails', 'summarize_video'):
+        return {'summary': f"Fake summary of {len(text)} characters"}
+    if task == 'chat':
+        return {'reply': f"Fake reply to: {text}"}
+    raise ValueError(f"Unknown task: {task}")
+
+
+def handle(request):
+    try:
+        respond({'id': request.get('id'), 'result': run_task(request.get('task'), request.get('text', ""))})
+    except Exception as e:
+        respond({'id': request.get('id'), 'error': str(e)})
+
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if request.get('text') == "__crash__":
+            os._exit(1)
+        threading.Thread(target=handle, args=(request,), daemon=True).start()
+
+
+if __name__ == '__main__':
+    main()
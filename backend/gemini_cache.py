@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unittest
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Location and limits of the on-disk cache (override with the matching environment variables)
+DEFAULT_CACHE_PATH = os.environ.get(
+    'GEMINI_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gemini_cache.sqlite3')
+)
+DEFAULT_TTL_SECONDS = int(os.environ.get('GEMINI_CACHE_TTL', str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('GEMINI_CACHE_MAX_ENTRIES', '50000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gemini_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    created_at REAL,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS gemini_cache_last_access ON gemini_cache (last_access);
+"""
+
+
+def cache_key(namespace, text):
+    """
+    Content-addressed key for a Gemini result: a hash of the namespace (prompt/model version)
+    and the body with whitespace normalized, so re-fetched or re-wrapped copies of a text share a key.
+    """
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(f"{namespace}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+class GeminiCache:
+    """
+    SQLite-backed cache of JSON-serializable Gemini results with a TTL and
+    least-recently-used eviction once max_entries is exceeded.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created_at FROM gemini_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM gemini_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE gemini_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store a JSON-serializable value, evicting the least recently used entries over the size limit."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO gemini_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM gemini_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM gemini_cache WHERE key IN "
+                    "(SELECT key FROM gemini_cache ORDER BY last_access ASC LIMIT ?)",
+                    (excess,)
+                )
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM gemini_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_gemini_cache():
+    """Return the process-wide Gemini result cache, opening it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = GeminiCache(DEFAULT_CACHE_PATH)
+        return _default_cache
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestGeminiCache(unittest.TestCase):
+
+    def test_cache_key_normalizes_whitespace(self):
+        self.assertEqual(cache_key('v1', "Hello  there\n friend "), cache_key('v1', "Hello there friend"))
+        self.assertNotEqual(cache_key('v1', "Hello"), cache_key('v2', "Hello"))
+
+    def test_hits_and_misses(self):
+        cache = GeminiCache(':memory:')
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 0.75)
+        self.assertEqual(cache.get('a'), 0.75)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1})
+        cache.close()
+
+    def test_ttl_expiry(self):
+        cache = GeminiCache(':memory:', ttl_seconds=0)
+        cache.set('a', 0.75)
+        time.sleep(0.01)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['entries'], 0)
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = GeminiCache(':memory:', max_entries=2)
+        cache.set('a', 1)
+        time.sleep(0.01)
+        cache.set('b', 2)
+        time.sleep(0.01)
+        cache.get('a')  # 'a' is now more recently used than 'b'
+        time.sleep(0.01)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        cache.close()
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
@@ -34,4 +34,8 @@ async function main() {
     .catch(error => console.error(JSON.stringify({ error: error.message })));
 }
 
-main();
\ No newline at end of file
+if (require.main === module) {
+  main();
+}
+
+module.exports = { generateEmailSummary };
\ No newline at end of file
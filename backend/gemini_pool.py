@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import shlex
+import atexit
+import logging
+import itertools
+import threading
+import subprocess
+import unittest
+import concurrent.futures
+from pathlib import Path
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of long-lived worker processes (override with GEMINI_POOL_SIZE)
+GEMINI_POOL_SIZE = int(os.environ.get('GEMINI_POOL_SIZE', '2'))
+
+# Default worker: the Node.js Gemini worker speaking newline-delimited JSON on stdin/stdout
+GEMINI_WORKER_COMMAND = ['node', str(Path(__file__).parent / 'gemini_worker.js')]
+
+# Offline worker with the same protocol, used by tests (or set GEMINI_WORKER_CMD to run it)
+FAKE_GEMINI_WORKER_COMMAND = [sys.executable, str(Path(__file__).parent / 'fake_gemini_worker.py')]
+
+
+class GeminiWorkerError(Exception):
+    """Raised when a Gemini worker request fails or the worker exits."""
+
+
+class GeminiTimeoutError(GeminiWorkerError):
+    """Raised when a Gemini worker request does not answer within its timeout."""
+
+
+class GeminiWorker:
+    """
+    One long-lived worker process. Requests are written as JSON lines to its stdin and
+    responses are matched back to their request by ID on a reader thread.
+    """
+
+    def __init__(self, command, cwd=None):
+        try:
+            self.process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=cwd,
+                text=True,
+                encoding='utf-8',
+                bufsize=1
+            )
+        except OSError as e:
+            raise GeminiWorkerError(f"Could not start Gemini worker {command}: {e}") from e
+        self._pending = {}
+        self._exited = False
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self):
+        return not self._exited and self.process.poll() is None
+
+    def submit(self, request_id, task, text):
+        """Send a request to the worker and return a Future for its result."""
+        future = concurrent.futures.Future()
+        line = json.dumps({'id': request_id, 'task': task, 'text': text}) + "\n"
+        with self._lock:
+            if not self.alive:
+                raise GeminiWorkerError("Gemini worker is not running")
+            self._pending[request_id] = future
+            try:
+                self.process.stdin.write(line)
+                self.process.stdin.flush()
+            except (OSError, ValueError) as e:
+                self._pending.pop(request_id, None)
+                raise GeminiWorkerError(f"Could not send request to Gemini worker: {e}") from e
+        return future
+
+    def cancel(self, request_id):
+        """Forget a pending request (e.g. after a timeout); a late response is ignored."""
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _read_responses(self):
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring non-JSON output from Gemini worker: {line.strip()}")
+                continue
+            with self._lock:
+                future = self._pending.pop(message.get('id'), None)
+            if future is None:
+                continue
+            if 'error' in message:
+                future.set_exception(GeminiWorkerError(message['error']))
+            else:
+                future.set_result(message.get('result', {}))
+
+        # stdout closed: the worker exited, so fail everything still waiting on it
+        with self._lock:
+            self._exited = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(GeminiWorkerError("Gemini worker exited unexpectedly"))
+
+    def stop(self, timeout=5):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self._reader.join(timeout=timeout)
+        self.process.stdout.close()
+
+
+class GeminiWorkerPool:
+    """
+    Pool of long-lived Gemini workers. Requests are spread round-robin over the workers,
+    each with its own timeout, and a worker that has crashed is restarted on next use.
+    """
+
+    def __init__(self, size=GEMINI_POOL_SIZE, command=None, cwd=None):
+        self.size = max(1, size)
+        self.command = command or GEMINI_WORKER_COMMAND
+        self.cwd = cwd or str(Path(__file__).parent)
+        self._workers = [None] * self.size
+        self._lock = threading.Lock()
+        self._cursor = itertools.count()
+        self._request_ids = itertools.count(1)
+
+    def _get_worker(self):
+        with self._lock:
+            index = next(self._cursor) % self.size
+            worker = self._workers[index]
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    logger.warning(f"Gemini worker {index} exited with code {worker.process.returncode}, restarting")
+                worker = self._workers[index] = GeminiWorker(self.command, cwd=self.cwd)
+            return worker
+
+    def request(self, task, text, timeout=30):
+        """
+        Run a task ('predict', 'summarize_emails', 'summarize_video' or 'chat') on a worker.
+        Returns the worker's result dictionary; raises GeminiWorkerError or GeminiTimeoutError.
+        """
+        worker = self._get_worker()
+        request_id = str(next(self._request_ids))
+        future = worker.submit(request_id, task, text)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            worker.cancel(request_id)
+            raise GeminiTimeoutError(f"Gemini {task} request timed out after {timeout}s")
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, [None] * self.size
+        for worker in workers:
+            if worker is not None:
+                worker.stop()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_gemini_pool():
+    """Return the process-wide Gemini worker pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            command = os.environ.get('GEMINI_WORKER_CMD')
+            _default_pool = GeminiWorkerPool(command=shlex.split(command) if command else None)
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestGeminiWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = GeminiWorkerPool(size=2, command=FAKE_GEMINI_WORKER_COMMAND)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_tasks_round_trip(self):
+        self.assertEqual(self.pool.request('predict', "I am frustrated"), {'confidence': 0.8})
+        self.assertEqual(self.pool.request('summarize_emails', "abcd")['summary'], "Fake summary of 4 characters")
+        self.assertEqual(self.pool.request('summarize_video', "ab")['summary'], "Fake summary of 2 characters")
+        self.assertEqual(self.pool.request('chat', "hello"), {'reply': "Fake reply to: hello"})
+
+    def test_worker_error_is_raised(self):
+        with self.assertRaises(GeminiWorkerError):
+            self.pool.request('unknown', "text")
+
+    def test_concurrent_requests_matched_by_id(self):
+        pool = GeminiWorkerPool(size=1, command=FAKE_GEMINI_WORKER_COMMAND)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                slow = executor.submit(pool.request, 'chat', "__sleep__:0.5")
+                fast = executor.submit(pool.request, 'chat', "quick")
+                self.assertEqual(fast.result()['reply'], "Fake reply to: quick")
+                self.assertFalse(slow.done())
+                self.assertEqual(slow.result()['reply'], "Fake reply to: __sleep__:0.5")
+        finally:
+            pool.close()
+
+    def test_timeout(self):
+        with self.assertRaises(GeminiTimeoutError):
+            self.pool.request('chat', "__sleep__:2", timeout=0.2)
+
+    def test_restart_after_crash(self):
+        pool = GeminiWorkerPool(size=1, command=FAKE_GEMINI_WORKER_COMMAND)
+        try:
+            with self.assertRaises(GeminiWorkerError):
+                pool.request('chat', "__crash__")
+            self.assertEqual(pool.request('chat', "again")['reply'], "Fake reply to: again")
+        finally:
+            pool.close()
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
@@ -44,8 +44,12 @@ const {
     }
   }
   
-  // Get text from command line arguments
-  const inputText = process.argv[2] ? JSON.parse(process.argv[2]) : "";
-  generateSummary(inputText)
-    .then(result => console.log(JSON.stringify(result)))
-    .catch(error => console.error(JSON.stringify({ error: error.message })));
\ No newline at end of file
+  if (require.main === module) {
+    // Get text from command line arguments
+    const inputText = process.argv[2] ? JSON.parse(process.argv[2]) : "";
+    generateSummary(inputText)
+      .then(result => console.log(JSON.stringify(result)))
+      .catch(error => console.error(JSON.stringify({ error: error.message })));
+  }
+
+  module.exports = { generateSummary };
\ No newline at end of file
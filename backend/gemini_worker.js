@@ -0,0 +1,54 @@
+// Long-lived Gemini worker used by gemini_pool.py.
+// Reads newline-delimited JSON requests on stdin and writes one JSON line per response on stdout:
+//   request:  {"id": "1", "task": "predict" | "summarize_emails" | "summarize_video" | "chat", "text": "..."}
+//   response: {"id": "1", "result": {...}}  or  {"id": "1", "error": "..."}
+// Requests are handled concurrently, so responses may arrive out of order.
+require('dotenv').config();
+const readline = require('readline');
+
+// stdout carries the protocol, so send the task modules' logging to stderr
+console.log = (...args) => console.error(...args);
+
+const { analyzeFrustration } = require('./gemini_predict');
+const { generateEmailSummary } = require('./gemini_email_summarize');
+const { generateSummary } = require('./gemini_summarize');
+const { getChatbotResponse } = require('./gemini_chatbot');
+
+const tasks = {
+  predict: (text) => analyzeFrustration(text),
+  summarize_emails: (text) => generateEmailSummary(text),
+  summarize_video: (text) => generateSummary(text),
+  chat: async (text) => ({ reply: (await getChatbotResponse(text)).trim() }),
+};
+
+function respond(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+async function handleRequest(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (error) {
+    respond({ id: null, error: `Invalid request: ${error.message}` });
+    return;
+  }
+  const task = tasks[request.task];
+  if (!task) {
+    respond({ id: request.id, error: `Unknown task: ${request.task}` });
+    return;
+  }
+  try {
+    respond({ id: request.id, result: await task(request.text || "") });
+  } catch (error) {
+    respond({ id: request.id, error: error.message });
+  }
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on('line', (line) => {
+  if (line.trim()) {
+    handleRequest(line);
+  }
+});
+rl.on('close', () => process.exit(0));
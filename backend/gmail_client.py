@@ -0,0 +1,370 @@
+import os
+import sys
+import time
+import base64
+import random
+import logging
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Gmail API scope shared by the email and invoice modules
+SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+
+# OAuth files (override with GMAIL_TOKEN_PATH / GMAIL_CREDENTIALS_PATH)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TOKEN_PATH = os.environ.get('GMAIL_TOKEN_PATH', os.path.join(BASE_DIR, 'token.json'))
+CREDENTIALS_PATH = os.environ.get('GMAIL_CREDENTIALS_PATH', os.path.join(BASE_DIR, 'credentials.json'))
+
+# Port of the local server used by the one-time consent flow
+OAUTH_PORT = 8080
+
+# Retries (with exponential backoff) for rate-limited and server-error responses
+GMAIL_NUM_RETRIES = int(os.environ.get('GMAIL_NUM_RETRIES', '5'))
+GMAIL_BACKOFF_SECONDS = 1.0
+GMAIL_BACKOFF_MAX_SECONDS = 32.0
+
+# Socket timeout of each HTTP connection
+GMAIL_HTTP_TIMEOUT = 60
+
+# HTTP statuses worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Deepest multipart nesting requested by message_fields (mixed > alternative > related > ... )
+MESSAGE_PART_DEPTH = 6
+
+
+class GmailAuthError(Exception):
+    """Raised when no usable Gmail token exists and the interactive consent flow is not allowed."""
+
+
+def load_credentials(token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH, scopes=SCOPES, interactive=False):
+    """
+    Loads OAuth credentials from token_path, refreshing (and re-saving) them when expired.
+    The browser consent flow only runs when no usable token exists and interactive is True;
+    otherwise GmailAuthError is raised, so a request handler never blocks on it.
+    """
+    creds = None
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path, scopes)
+    if creds and creds.valid:
+        return creds
+    if creds and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+    elif interactive:
+        if not os.path.exists(credentials_path):
+            raise GmailAuthError(f"{credentials_path} not found. Please add it to the backend folder.")
+        creds = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes).run_local_server(port=OAUTH_PORT)
+    else:
+        raise GmailAuthError(f"No valid Gmail token at {token_path}. Run 'python gmail_client.py auth' once to create it.")
+    with open(token_path, 'w') as token:
+        token.write(creds.to_json())
+    return creds
+
+
+class GmailClient:
+    """
+    Process-wide Gmail access: credentials are loaded once and shared, and each thread keeps its own
+    service object (httplib2 connections are not thread-safe) so its HTTP connection is reused across calls.
+    """
+
+    def __init__(self, token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH, scopes=SCOPES, interactive=False):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        self.interactive = interactive
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def credentials(self):
+        """Return the shared credentials, loading them on first use (tokens refresh automatically on expiry)."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = load_credentials(self.token_path, self.credentials_path, self.scopes, self.interactive)
+            return self._creds
+
+    def service(self):
+        """Return this thread's Gmail API service, building it on first use."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials(), http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+            service = self._local.service = build('gmail', 'v1', http=http, cache_discovery=False)
+        return service
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_gmail_client():
+    """Return the process-wide GmailClient, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = GmailClient(interactive=os.environ.get('GMAIL_INTERACTIVE_AUTH') == '1')
+        return _default_client
+
+
+def get_gmail_service():
+    """Return a cached Gmail API service object for the calling thread."""
+    return get_gmail_client().service()
+
+
+def is_retryable(error):
+    """True for rate limiting (429 or a 403 rate-limit reason) and transient server errors."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    return status == 403 and b'ateLimitExceeded' in (error.content or b'')
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter for the given (zero-based) retry attempt."""
+    return min(GMAIL_BACKOFF_SECONDS * 2 ** attempt, GMAIL_BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
+
+
+def execute_request(request, num_retries=GMAIL_NUM_RETRIES):
+    """Execute a single Gmail API request, retrying 429/5xx responses with exponential backoff."""
+    return request.execute(num_retries=num_retries)
+
+
+def execute_batch(service, request_builders, num_retries=GMAIL_NUM_RETRIES):
+    """
+    Runs Gmail calls as one batch HTTP request, re-sending only the calls that were rate limited or
+    hit a server error, with exponential backoff between attempts.
+    request_builders maps a request ID to a zero-argument function building the call (rebuilt on retry).
+    Returns a tuple of (responses, errors), both dictionaries keyed by request ID.
+    """
+    responses, errors = {}, {}
+    remaining = list(request_builders)
+    for attempt in range(num_retries + 1):
+        retry = []
+        can_retry = attempt < num_retries
+
+        def handle_response(request_id, response, exception):
+            if exception is None:
+                responses[request_id] = response
+                errors.pop(request_id, None)
+            else:
+                errors[request_id] = exception
+                if can_retry and is_retryable(exception):
+                    retry.append(request_id)
+
+        batch = service.new_batch_http_request(callback=handle_response)
+        for request_id in remaining:
+            batch.add(request_builders[request_id](), request_id=request_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            # The whole batch failed (e.g. a 5xx on the batch endpoint itself)
+            unanswered = [request_id for request_id in remaining if request_id not in responses]
+            errors.update((request_id, e) for request_id in unanswered)
+            retry = unanswered if can_retry and is_retryable(e) else []
+        if not retry:
+            break
+        delay = backoff_delay(attempt)
+        logger.warning(f"Retrying {len(retry)} Gmail batch calls in {delay:.1f}s")
+        time.sleep(delay)
+        remaining = retry
+    return responses, errors
+
+
+def message_fields(depth=MESSAGE_PART_DEPTH, include_data=True):
+    """
+    Partial-response field mask for a full message without headers: the MIME tree down to depth levels,
+    with each part's body data, or only its size and attachmentId when include_data is False.
+    """
+    body = 'body' if include_data else 'body(size,attachmentId)'
+    part = f'partId,mimeType,filename,{body}'
+    for _ in range(depth):
+        part = f'partId,mimeType,filename,{body},parts({part})'
+    return f'id,payload({part})'
+
+
+def get_messages(service, message_ids, **params):
+    """
+    Fetches messages.get for every ID in one retried batch request; params are passed through
+    (e.g. format='metadata' or fields=message_fields()). Returns a tuple of (responses, errors) keyed by ID.
+    """
+    return execute_batch(service, {
+        msg_id: (lambda msg_id=msg_id: service.users().messages().get(userId='me', id=msg_id, **params))
+        for msg_id in message_ids
+    })
+
+
+def header_value(headers, name, default=''):
+    """Return the value of the first header called name (case-insensitive)."""
+    name = name.lower()
+    return next((h['value'] for h in headers if h['name'].lower() == name), default)
+
+
+def walk_parts(payload):
+    """Yield a message payload and all of its nested MIME parts, depth first in document order."""
+    yield payload
+    for part in payload.get('parts') or []:
+        yield from walk_parts(part)
+
+
+def decode_part_data(data, max_bytes=None):
+    """
+    Decode base64url part data. With max_bytes, only the prefix needed for that many bytes is decoded.
+    Returns a tuple of (bytes, truncated).
+    """
+    truncated = False
+    if max_bytes is not None and len(data) > -(-max_bytes // 3) * 4:
+        data = data[:-(-max_bytes // 3) * 4]
+        truncated = True
+    decoded = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    if max_bytes is not None and len(decoded) > max_bytes:
+        decoded, truncated = decoded[:max_bytes], True
+    return decoded, truncated
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+def make_http_error(status, content=b'error'):
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FlakyBatch:
+    """Fake BatchHttpRequest whose calls are plain functions that return a response or raise."""
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.calls = []
+
+    def add(self, request, request_id=None):
+        self.calls.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.calls:
+            try:
+                self.callback(request_id, request(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class TestGmailClient(unittest.TestCase):
+
+    def setUp(self):
+        self.token_path = os.path.join(tempfile.mkdtemp(), 'token.json')
+
+    def test_valid_token_is_used_without_consent_flow(self):
+        creds = MagicMock(valid=True)
+        with open(self.token_path, 'w') as f:
+            f.write('{}')
+        with patch('__main__.Credentials.from_authorized_user_file', return_value=creds), \
+                patch('__main__.InstalledAppFlow') as mock_flow:
+            self.assertIs(load_credentials(self.token_path), creds)
+        mock_flow.from_client_secrets_file.assert_not_called()
+
+    def test_expired_token_is_refreshed_and_saved(self):
+        creds = MagicMock(valid=False, expired=True, refresh_token='r')
+        creds.to_json.return_value = '{"refreshed": true}'
+        with open(self.token_path, 'w') as f:
+            f.write('{}')
+        with patch('__main__.Credentials.from_authorized_user_file', return_value=creds):
+            self.assertIs(load_credentials(self.token_path), creds)
+        creds.refresh.assert_called_once()
+        with open(self.token_path) as f:
+            self.assertEqual(f.read(), '{"refreshed": true}')
+
+    def test_missing_token_does_not_block(self):
+        with patch('__main__.InstalledAppFlow') as mock_flow:
+            with self.assertRaises(GmailAuthError):
+                load_credentials(self.token_path)
+        mock_flow.from_client_secrets_file.assert_not_called()
+
+    def test_service_built_once_per_thread(self):
+        client = GmailClient(self.token_path)
+        with patch('__main__.load_credentials', return_value=MagicMock()) as mock_load, \
+                patch('__main__.build', side_effect=lambda *args, **kwargs: object()) as mock_build:
+            first = client.service()
+            self.assertIs(client.service(), first)
+            other = []
+            thread = threading.Thread(target=lambda: other.append(client.service()))
+            thread.start()
+            thread.join()
+        self.assertIsNot(other[0], first)
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(mock_load.call_count, 1)
+
+    @patch('__main__.time.sleep')
+    def test_execute_batch_retries_only_retryable_failures(self, mock_sleep):
+        attempts = {'ok': 0, 'limited': 0, 'missing': 0}
+
+        def builder(request_id, failures):
+            def call():
+                attempts[request_id] += 1
+                if attempts[request_id] <= len(failures):
+                    raise failures[attempts[request_id] - 1]
+                return {'id': request_id}
+            return lambda: call
+
+        service = MagicMock()
+        service.new_batch_http_request.side_effect = FlakyBatch
+        responses, errors = execute_batch(service, {
+            'ok': builder('ok', []),
+            'limited': builder('limited', [make_http_error(429), make_http_error(503)]),
+            'missing': builder('missing', [make_http_error(404)] * 10),
+        }, num_retries=3)
+        self.assertEqual(responses, {'ok': {'id': 'ok'}, 'limited': {'id': 'limited'}})
+        self.assertEqual(list(errors), ['missing'])
+        self.assertEqual(attempts, {'ok': 1, 'limited': 3, 'missing': 1})
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_walk_parts_finds_nested_parts_in_order(self):
+        payload = {'mimeType': 'multipart/mixed', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                {'mimeType': 'text/plain', 'body': {}}, {'mimeType': 'text/html', 'body': {}}]},
+            {'mimeType': 'application/pdf', 'filename': 'a.pdf', 'body': {}}]}
+        self.assertEqual([p['mimeType'] for p in walk_parts(payload)],
+                         ['multipart/mixed', 'multipart/alternative', 'text/plain', 'text/html', 'application/pdf'])
+
+    def test_decode_part_data_byte_cap(self):
+        data = base64.urlsafe_b64encode(b'abcdefghij').decode().rstrip('=')
+        self.assertEqual(decode_part_data(data), (b'abcdefghij', False))
+        self.assertEqual(decode_part_data(data, max_bytes=4), (b'abcd', True))
+        self.assertEqual(decode_part_data(data, max_bytes=10), (b'abcdefghij', False))
+
+    def test_message_fields(self):
+        self.assertEqual(message_fields(depth=1, include_data=False),
+                         'id,payload(partId,mimeType,filename,body(size,attachmentId),'
+                         'parts(partId,mimeType,filename,body(size,attachmentId)))')
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(make_http_error(429)))
+        self.assertTrue(is_retryable(make_http_error(500)))
+        self.assertTrue(is_retryable(make_http_error(403, b'{"reason": "userRateLimitExceeded"}')))
+        self.assertFalse(is_retryable(make_http_error(403, b'{"reason": "forbidden"}')))
+        self.assertFalse(is_retryable(make_http_error(404)))
+        self.assertFalse(is_retryable(ValueError("bad")))
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'auth':
+        # One-time browser consent; afterwards the server only loads and refreshes token.json
+        load_credentials(interactive=True)
+        print(f"Saved Gmail token to {TOKEN_PATH}")
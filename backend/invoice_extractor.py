@@ -12,17 +12,17 @@ from werkzeug.utils import secure_filename
 import pandas as pd
 import PyPDF2
 
-# Google API imports
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+# Shared, cached Gmail access
+from gmail_client import (
+    get_gmail_service, execute_request, get_messages, message_fields, header_value, walk_parts, decode_part_data
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Gmail API scope
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+# PDF attachments larger than this are not downloaded
+INVOICE_MAX_PDF_BYTES = int(os.environ.get('INVOICE_MAX_PDF_BYTES', str(20 * 1024 * 1024)))
 
 # Global cache for storing PDFs fetched from emails
 pdf_cache = {
@@ -34,32 +34,6 @@ pdf_cache = {
 # Gmail & PDF Processing Functions
 ######################################
 
-def get_gmail_service():
-    """
-    Authenticates with Gmail and returns a Gmail API service object.
-    Uses token.json if available; otherwise, prompts for user consent.
-    """
-    token_path = 'token.json'
-    # Prompt for authentication (this will open a local server for OAuth)
-    creds = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES).run_local_server(port=8081)
-    if os.path.exists(token_path):
-        from google.oauth2.credentials import Credentials
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-    if not creds or not creds.valid:
-        try:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                creds = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES).run_local_server(port=8080)
-        except FileNotFoundError as fnf_error:
-            logger.error("credentials.json file not found. Please add it to the working folder.")
-            raise RuntimeError("credentials.json file not found.") from fnf_error
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
-    service = build('gmail', 'v1', credentials=creds)
-    return service
-
-
 # Extracting columns from a PDF file
 def get_pdf_columns_for_file(pdf_path):
     """
@@ -164,48 +138,72 @@ def extract_selected_columns_from_cache(output_excel_path, selected_columns, ind
         filtered_df = combined_df[filtered_columns]
         filtered_df.to_excel(output_excel_path, index=False)
         
+def is_pdf_part(part):
+    """True for a MIME part holding a PDF attachment."""
+    filename = part.get('filename') or ''
+    return filename.lower().endswith('.pdf') or part.get('mimeType') == 'application/pdf'
+
+
+def download_part(service, message_id, part):
+    """Returns the decoded bytes of an attachment part, fetching its data only when it is not inline."""
+    data = part.get('body', {}).get('data')
+    att_id = part.get('body', {}).get('attachmentId')
+    if not data and att_id:
+        attachment = execute_request(service.users().messages().attachments().get(
+            userId='me', messageId=message_id, id=att_id
+        ))
+        data = attachment.get('data')
+    if not data:
+        return None
+    file_bytes, _ = decode_part_data(data)
+    return file_bytes
+
+
 #Fetching PDFs from Gmail
 def fetch_and_cache_pdfs():
     """
     Fetches PDFs from Gmail (emails with 'invoice' in the subject and PDF attachments)
     and stores them in the global pdf_cache. Clears any previously cached data.
+    Subjects come from a metadata-only fetch and are listed for every matching message, even one whose
+    structure fetch then fails; the full fetch only returns each message's MIME structure,
+    and only PDF parts up to INVOICE_MAX_PDF_BYTES (found at any nesting depth) are downloaded.
     """
     # Clear previous cache
     pdf_cache['pdfs'].clear()
     pdf_cache['subjects'].clear()
 
     service = get_gmail_service()
-    results = service.users().messages().list(
+    results = execute_request(service.users().messages().list(
         userId='me', q="subject:invoice has:attachment", maxResults=10
-    ).execute()
-    messages = results.get('messages', [])
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-        subject_line = "(No Subject)"
-        headers = msg_data.get('payload', {}).get('headers', [])
-        for header in headers:
-            if header['name'].lower() == 'subject':
-                subject_line = header['value']
-                break
-        parts = msg_data.get('payload', {}).get('parts', [])
-        for part in parts:
-            filename = part.get('filename')
-            if filename and filename.lower().endswith('.pdf'):
-                att_id = part['body'].get('attachmentId')
-                if att_id:
-                    attachment = service.users().messages().attachments().get(
-                        userId='me', messageId=msg['id'], id=att_id
-                    ).execute()
-                    file_data = attachment.get('data')
-                    if file_data:
-                        file_data = file_data.replace('-', '+').replace('_', '/')
-                        file_bytes = base64.b64decode(file_data)
-                        pdf_cache['pdfs'].append({
-                            'filename': filename,
-                            'content': file_bytes,
-                            'subject': subject_line
-                        })
+    ))
+    message_ids = [msg['id'] for msg in results.get('messages', [])]
+    metadata, _ = get_messages(service, message_ids, format='metadata', metadataHeaders=['Subject'])
+    structures, errors = get_messages(service, list(metadata), format='full', fields=message_fields(include_data=False))
+    for msg_id, exception in errors.items():
+        logger.error(f"Failed to fetch invoice email {msg_id}: {str(exception)}")
+
+    for msg_id in message_ids:
+        if msg_id not in metadata:
+            continue
+        subject_line = header_value(metadata[msg_id].get('payload', {}).get('headers', []), 'Subject') or "(No Subject)"
         pdf_cache['subjects'].append(subject_line)
+        if msg_id not in structures:
+            continue
+        for part in walk_parts(structures[msg_id].get('payload', {})):
+            if not is_pdf_part(part):
+                continue
+            filename = part.get('filename') or 'attachment.pdf'
+            size = part.get('body', {}).get('size', 0)
+            if size > INVOICE_MAX_PDF_BYTES:
+                logger.warning(f"Skipping {filename} ({size} bytes): larger than {INVOICE_MAX_PDF_BYTES} bytes")
+                continue
+            file_bytes = download_part(service, msg_id, part)
+            if file_bytes:
+                pdf_cache['pdfs'].append({
+                    'filename': filename,
+                    'content': file_bytes,
+                    'subject': subject_line
+                })
 
 #gettings columns from the first page of the cached PDF
 def get_pdf_columns_from_cache(index=0):
@@ -449,6 +447,50 @@ class InvoiceExtractorAPITestCase(unittest.TestCase):
         # Close the response to release any open file handles
         response.close()
 
+    @patch('__main__.get_gmail_service')
+    def test_fetch_and_cache_pdfs_downloads_only_nested_pdfs(self, mock_get_service):
+        # The PDF sits inside a nested multipart; oversized PDFs and other attachments are never downloaded
+        structure = {'payload': {'mimeType': 'multipart/mixed', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [{'mimeType': 'text/plain', 'body': {'size': 10}}]},
+            {'mimeType': 'multipart/mixed', 'parts': [
+                {'mimeType': 'application/pdf', 'filename': 'invoice.pdf', 'body': {'size': 100, 'attachmentId': 'a1'}},
+                {'mimeType': 'application/pdf', 'filename': 'huge.pdf',
+                 'body': {'size': INVOICE_MAX_PDF_BYTES + 1, 'attachmentId': 'a2'}},
+            ]},
+            {'mimeType': 'image/png', 'filename': 'logo.png', 'body': {'size': 50, 'attachmentId': 'a3'}},
+        ]}}
+
+        def fake_get_messages(service, message_ids, format, **kwargs):
+            if format == 'metadata':
+                return {'m1': {'payload': {'headers': [{'name': 'Subject', 'value': 'Invoice 42'}]}}}, {}
+            return {'m1': structure}, {}
+
+        messages = mock_get_service.return_value.users.return_value.messages.return_value
+        messages.list.return_value.execute.return_value = {'messages': [{'id': 'm1'}]}
+        attachments = messages.attachments.return_value
+        attachments.get.return_value.execute.return_value = {
+            'data': base64.urlsafe_b64encode(b'%PDF-1.4 invoice').decode('utf-8')
+        }
+        with patch('__main__.get_messages', side_effect=fake_get_messages):
+            fetch_and_cache_pdfs()
+        self.assertEqual(pdf_cache['pdfs'], [{'filename': 'invoice.pdf', 'content': b'%PDF-1.4 invoice', 'subject': 'Invoice 42'}])
+        self.assertEqual(pdf_cache['subjects'], ['Invoice 42'])
+        attachments.get.assert_called_once_with(userId='me', messageId='m1', id='a1')
+
+    @patch('__main__.get_gmail_service')
+    def test_fetch_and_cache_pdfs_lists_subject_when_structure_fetch_fails(self, mock_get_service):
+        def fake_get_messages(service, message_ids, format, **kwargs):
+            if format == 'metadata':
+                return {'m1': {'payload': {'headers': [{'name': 'Subject', 'value': 'Invoice 7'}]}}}, {}
+            return {}, {'m1': Exception("503 backend error")}
+
+        messages = mock_get_service.return_value.users.return_value.messages.return_value
+        messages.list.return_value.execute.return_value = {'messages': [{'id': 'm1'}]}
+        with patch('__main__.get_messages', side_effect=fake_get_messages):
+            fetch_and_cache_pdfs()
+        self.assertEqual(pdf_cache['pdfs'], [])
+        self.assertEqual(pdf_cache['subjects'], ['Invoice 7'])
+
 ######################################
 # Run App or Unit Tests
 ######################################
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import unittest
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Hot-Path Benchmark
+# ---------------------------
+# Measures the custom-model stages of email classification on model/emails.csv, optionally expanded
+# with synthetic texts (10k-1M rows):
+#   preprocess_text              shared normalizer (HTML/URL cleanup, stopwords, lemmatization)
+#   tfidf_transform              vectorizer.transform on preprocessed text
+#   predict_proba                model.predict_proba on transformed features
+#   predict_frustration_custom   the full per-email path used by email_processor
+# Each stage reports batch throughput (texts/sec over the whole set) and per-call p50/p95/p99 latency
+# (over a sample of single-text calls). Results are written as JSON and can be compared between runs:
+#   python benchmark.py --size 100000 --output bench.json
+#   python benchmark.py --size 100000 --compare bench.json
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+DEFAULT_CSV = os.path.join(BASE_DIR, 'emails.csv')
+DEFAULT_LATENCY_SAMPLES = 2000
+# A stage regresses when its throughput drops, or its p95 latency grows, by more than this fraction
+DEFAULT_TOLERANCE = 0.10
+
+STAGES = ['preprocess_text', 'tfidf_transform', 'predict_proba', 'predict_frustration_custom']
+
+
+def load_texts(csv_path=DEFAULT_CSV):
+    df = pd.read_csv(csv_path).dropna(subset=['text'])
+    return [str(text) for text in df['text']]
+
+
+def expand_texts(texts, size, seed=42):
+    """
+    Return exactly size texts: the originals first, then synthetic ones made by joining two random
+    originals and shuffling their words, so the vocabulary and length distribution stay realistic.
+    """
+    rng = random.Random(seed)
+    expanded = list(texts[:size])
+    while len(expanded) < size:
+        words = (rng.choice(texts) + ' ' + rng.choice(texts)).split()
+        rng.shuffle(words)
+        expanded.append(' '.join(words[:rng.randint(max(1, len(words) // 2), len(words))]))
+    return expanded
+
+
+def summarize_latencies(seconds):
+    """p50/p95/p99 of per-call latencies, in microseconds."""
+    micros = np.asarray(seconds) * 1e6
+    p50, p95, p99 = np.percentile(micros, [50, 95, 99])
+    return {'p50_us': round(float(p50), 2), 'p95_us': round(float(p95), 2), 'p99_us': round(float(p99), 2)}
+
+
+def time_calls(function, inputs):
+    """Call function on each input and return the per-call wall times in seconds."""
+    timings = np.empty(len(inputs))
+    clock = time.perf_counter
+    for i, item in enumerate(inputs):
+        started = clock()
+        function(item)
+        timings[i] = clock() - started
+    return timings
+
+
+def time_batch(function, inputs):
+    """Return (result, texts_per_sec) for one call over the whole input."""
+    started = time.perf_counter()
+    result = function(inputs)
+    elapsed = time.perf_counter() - started
+    count = inputs.shape[0] if hasattr(inputs, 'shape') else len(inputs)
+    return result, round(count / max(elapsed, 1e-9), 1)
+
+
+def run_benchmark(texts, latency_samples=DEFAULT_LATENCY_SAMPLES, seed=42):
+    """Benchmark every stage on texts and return the results dictionary."""
+    import email_processor
+    normalize_text, normalize_many = email_processor.normalize_text, email_processor.normalize_many
+    # Per-prediction debug logging would dominate the measured latency
+    email_processor.logger.setLevel(logging.WARNING)
+    vectorizer, model = email_processor.tfidf, email_processor.model
+
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(texts)), min(latency_samples, len(texts)))
+    sample_texts = [texts[i] for i in sample]
+
+    stages = {}
+    cleaned, throughput = time_batch(normalize_many, texts)
+    stages['preprocess_text'] = dict(texts_per_sec=throughput, **summarize_latencies(time_calls(normalize_text, sample_texts)))
+
+    features, throughput = time_batch(vectorizer.transform, cleaned)
+    sample_cleaned = [cleaned[i] for i in sample]
+    stages['tfidf_transform'] = dict(
+        texts_per_sec=throughput,
+        **summarize_latencies(time_calls(lambda text: vectorizer.transform([text]), sample_cleaned))
+    )
+
+    _, throughput = time_batch(model.predict_proba, features)
+    sample_rows = [features[i] for i in sample]
+    stages['predict_proba'] = dict(texts_per_sec=throughput, **summarize_latencies(time_calls(model.predict_proba, sample_rows)))
+
+    _, throughput = time_batch(email_processor.predict_frustration_custom_batch, texts)
+    stages['predict_frustration_custom'] = dict(
+        texts_per_sec=throughput,
+        **summarize_latencies(time_calls(email_processor.predict_frustration_custom, sample_texts))
+    )
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'texts': len(texts),
+            'latency_samples': len(sample),
+            'seed': seed,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'vectorizer': type(vectorizer).__name__,
+            'model': type(model).__name__,
+            'single_email_kernel': email_processor.get_custom_scorer() is not None,
+        },
+        'stages': stages,
+    }
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare two benchmark results stage by stage. Returns a list of rows
+    (stage, metric, baseline, current, change, regressed) for texts_per_sec and p95_us.
+    """
+    rows = []
+    for stage in STAGES:
+        before, after = baseline['stages'].get(stage), current['stages'].get(stage)
+        if not before or not after:
+            continue
+        for metric, higher_is_better in (('texts_per_sec', True), ('p95_us', False)):
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((stage, metric, before[metric], after[metric], change, regressed))
+    return rows
+
+
+def print_results(results):
+    print(f"{results['meta']['texts']} texts ({results['meta']['latency_samples']} latency samples)")
+    print(f"{'stage':<28}{'texts/sec':>14}{'p50 us':>12}{'p95 us':>12}{'p99 us':>12}")
+    for stage in STAGES:
+        r = results['stages'][stage]
+        print(f"{stage:<28}{r['texts_per_sec']:>14,.0f}{r['p50_us']:>12.1f}{r['p95_us']:>12.1f}{r['p99_us']:>12.1f}")
+
+
+def print_comparison(rows):
+    print(f"{'stage':<28}{'metric':<15}{'baseline':>16}{'current':>16}{'change':>10}")
+    for stage, metric, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{stage:<28}{metric:<15}{before:>16,.1f}{after:>16,.1f}{change:>+10.1%}{flag}")
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_expand_texts_is_deterministic(self):
+        texts = ["one two three", "four five", "six"]
+        expanded = expand_texts(texts, 50, seed=1)
+        self.assertEqual(len(expanded), 50)
+        self.assertEqual(expanded[:3], texts)
+        self.assertEqual(expanded, expand_texts(texts, 50, seed=1))
+        self.assertEqual(expand_texts(texts, 2), texts[:2])
+
+    def test_summarize_latencies(self):
+        summary = summarize_latencies(np.arange(1, 101) * 1e-6)
+        self.assertAlmostEqual(summary['p50_us'], 50.5)
+        self.assertAlmostEqual(summary['p99_us'], 99.01)
+
+    def test_compare_results_flags_regressions(self):
+        stage = lambda tps, p95: {'texts_per_sec': tps, 'p50_us': 1, 'p95_us': p95, 'p99_us': 1}
+        baseline = {'stages': {'preprocess_text': stage(1000, 10), 'predict_proba': stage(1000, 10)}}
+        current = {'stages': {'preprocess_text': stage(850, 10.5), 'predict_proba': stage(1200, 8)}}
+        regressed = {(row[0], row[1]) for row in compare_results(baseline, current) if row[5]}
+        self.assertEqual(regressed, {('preprocess_text', 'texts_per_sec')})
+
+    def test_run_benchmark_reports_every_stage(self):
+        results = run_benchmark(expand_texts(load_texts(), 300), latency_samples=20)
+        self.assertEqual(set(results['stages']), set(STAGES))
+        for metrics in results['stages'].values():
+            self.assertGreater(metrics['texts_per_sec'], 0)
+            self.assertLessEqual(metrics['p50_us'], metrics['p99_us'])
+        json.dumps(results)
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if 'test' in sys.argv:
+        sys.argv.remove('test')
+        unittest.main()
+    else:
+        parser = argparse.ArgumentParser(description="Benchmark the email classification hot path")
+        parser.add_argument('--csv', default=DEFAULT_CSV, help="Source texts (column 'text')")
+        parser.add_argument('--size', type=int, default=None, help="Expand to this many texts (e.g. 10000 to 1000000)")
+        parser.add_argument('--latency-samples', type=int, default=DEFAULT_LATENCY_SAMPLES, help="Single-text calls timed per stage")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default=None, help="Write the results to this JSON file")
+        parser.add_argument('--compare', default=None, help="Baseline JSON to compare against; exits 1 on a regression")
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+        args = parser.parse_args()
+
+        texts = load_texts(args.csv)
+        texts = expand_texts(texts, args.size or len(texts), seed=args.seed)
+        results = run_benchmark(texts, latency_samples=args.latency_samples, seed=args.seed)
+        print_results(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.compare:
+            with open(args.compare) as f:
+                rows = compare_results(json.load(f), results, tolerance=args.tolerance)
+            print_comparison(rows)
+            if any(row[5] for row in rows):
+                sys.exit(1)
@@ -0,0 +1,406 @@
+import os
+import re
+import sys
+import json
+import pickle
+import logging
+import tempfile
+import unittest
+import numpy as np
+from scipy import sparse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Compact Model Artifacts
+# ---------------------------
+# A versioned, memory-mappable export of the vectorizer + linear model pair:
+#   manifest.json  format name/version, vectorizer settings, intercept and the array files below
+#   vocab.npy      sorted vocabulary (fixed-width unicode), looked up with np.searchsorted
+#   idf.npy        IDF weight of each vocabulary term, in vocab.npy order
+#   coef.npy       model coefficient of each feature, in vocab.npy order (hashing: feature index order)
+# The arrays are opened with mmap_mode='r', so server workers share the pages instead of each
+# unpickling a vocabulary dict. The loaded objects expose the same transform / predict_proba calls
+# as the TfidfVectorizer / LogisticRegression pickles they replace.
+
+FORMAT_NAME = 'axiom-frustration-model'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+COMPACT_DIR_NAME = 'compact'
+
+# Analyzer settings the compact vectorizer reproduces; anything else is rejected at export time
+SUPPORTED_ANALYZER = {'analyzer': 'word', 'tokenizer': None, 'preprocessor': None, 'stop_words': None,
+                      'strip_accents': None, 'binary': False}
+
+
+class CompactFormatError(ValueError):
+    """Raised for an artifact directory that is not a supported compact model export."""
+
+
+def _check_supported(vectorizer):
+    params = vectorizer.get_params()
+    for name, expected in SUPPORTED_ANALYZER.items():
+        if params.get(name) != expected:
+            raise CompactFormatError(f"Cannot export a vectorizer with {name}={params.get(name)!r}")
+
+
+def export_compact(vectorizer, model, out_dir):
+    """
+    Write a fitted TfidfVectorizer (or HashingVectorizer) and binary linear model (LogisticRegression,
+    SGDClassifier with log_loss) to out_dir in the compact format. Returns the manifest path.
+    """
+    _check_supported(vectorizer)
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    if coef.shape[0] != 1:
+        raise CompactFormatError("Only binary classifiers can be exported")
+    coef = coef[0]
+    params = vectorizer.get_params()
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'vectorizer': {
+            'lowercase': params['lowercase'],
+            'token_pattern': params['token_pattern'],
+            'ngram_range': list(params['ngram_range']),
+            'norm': params['norm'],
+        },
+        'intercept': float(np.asarray(model.intercept_, dtype=np.float64)[0]),
+        'classes': [int(c) for c in model.classes_],
+        'files': {},
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {}
+    if hasattr(vectorizer, 'vocabulary_'):
+        terms = np.array(sorted(vectorizer.vocabulary_))
+        columns = np.array([vectorizer.vocabulary_[term] for term in terms])
+        manifest['vectorizer'].update(
+            kind='tfidf',
+            use_idf=params['use_idf'],
+            sublinear_tf=params['sublinear_tf'],
+            n_features=len(terms)
+        )
+        arrays['vocab'] = terms
+        arrays['idf'] = np.asarray(vectorizer.idf_, dtype=np.float64)[columns] if params['use_idf'] else np.ones(len(terms))
+        arrays['coef'] = coef[columns]
+    else:
+        manifest['vectorizer'].update(
+            kind='hashing',
+            n_features=params['n_features'],
+            alternate_sign=params['alternate_sign']
+        )
+        arrays['coef'] = coef
+    for name, array in arrays.items():
+        filename = f'{name}.npy'
+        np.save(os.path.join(out_dir, filename), array)
+        manifest['files'][name] = {'file': filename, 'shape': list(array.shape), 'dtype': array.dtype.str}
+    # The manifest is written last, so a directory with a manifest always has complete arrays
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+class CompactVectorizer:
+    """Rebuilds the TF-IDF (or hashed) feature matrix from the compact arrays; analyzer matches sklearn's word analyzer."""
+
+    def __init__(self, settings, vocab=None, idf=None):
+        self.settings = settings
+        self.kind = settings['kind']
+        self.n_features = settings['n_features']
+        self.lowercase = settings['lowercase']
+        self.token_re = re.compile(settings['token_pattern'])
+        self.min_n, self.max_n = settings['ngram_range']
+        self.norm = settings['norm']
+        self.vocab = vocab
+        self.idf = idf
+        self.sublinear_tf = settings.get('sublinear_tf', False)
+        self._hasher = None
+        if self.kind == 'hashing':
+            from sklearn.feature_extraction.text import HashingVectorizer
+            # Stateless: rebuilding it from its settings costs nothing
+            self._hasher = HashingVectorizer(
+                n_features=self.n_features, ngram_range=tuple(settings['ngram_range']), norm=self.norm,
+                alternate_sign=settings['alternate_sign'], lowercase=self.lowercase, token_pattern=settings['token_pattern']
+            )
+
+    def analyze(self, text):
+        """Word n-grams of a document, as produced by sklearn's default word analyzer."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        if self.max_n == 1:
+            return tokens
+        ngrams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            ngrams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+    def lookup(self, terms):
+        """Return the column of each term found in the vocabulary (np.searchsorted on the sorted array)."""
+        if not terms:
+            return np.empty(0, dtype=np.intp)
+        terms = np.array(terms)
+        positions = np.searchsorted(self.vocab, terms)
+        positions[positions == len(self.vocab)] = 0
+        return positions[self.vocab[positions] == terms]
+
+    def transform(self, texts):
+        if self._hasher is not None:
+            return self._hasher.transform(texts)
+        # Analyze every text, then look all n-grams up with one searchsorted call
+        grams = [self.analyze(text) for text in texts]
+        rows = np.repeat(np.arange(len(grams)), [len(g) for g in grams])
+        terms = np.array([term for g in grams for term in g]) if len(rows) else np.empty(0, dtype=self.vocab.dtype)
+        positions = np.searchsorted(self.vocab, terms)
+        positions[positions == len(self.vocab)] = 0
+        found = self.vocab[positions] == terms if len(terms) else np.zeros(0, dtype=bool)
+        # Duplicate (row, column) pairs are summed into term counts by the COO -> CSR conversion
+        matrix = sparse.coo_matrix(
+            (np.ones(int(found.sum())), (rows[found], positions[found])), shape=(len(grams), self.n_features)
+        ).tocsr()
+        matrix.sum_duplicates()
+        if self.sublinear_tf:
+            matrix.data = np.log(matrix.data) + 1
+        matrix.data *= self.idf[matrix.indices]
+        if self.norm == 'l2':
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            matrix = sparse.diags(1.0 / norms) @ matrix
+        elif self.norm == 'l1':
+            norms = np.asarray(abs(matrix).sum(axis=1)).ravel()
+            norms[norms == 0] = 1.0
+            matrix = sparse.diags(1.0 / norms) @ matrix
+        return matrix.tocsr()
+
+
+class CompactLinearModel:
+    """Binary logistic model over the compact coefficients, with sklearn's predict_proba/predict interface."""
+
+    def __init__(self, coef, intercept, classes):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = np.array(classes)
+
+    def decision_function(self, X):
+        return np.asarray(X @ self.coef).ravel() + self.intercept
+
+    def predict_proba(self, X):
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+class FrustrationScorer:
+    """
+    Single-email scoring kernel in plain NumPy: word n-grams are looked up in the sorted vocabulary,
+    weighted by IDF, L2-normalized and dotted with the logistic coefficients of the matched columns only.
+    Gives the same probability as vectorizer.transform + model.predict_proba (to ~1e-15) without
+    building a sparse matrix or going through sklearn's input validation.
+    """
+
+    def __init__(self, analyzer, vocab, idf, coef, intercept, sublinear_tf=False, norm='l2'):
+        self.analyzer = analyzer
+        self.vocab = vocab
+        self.idf = idf
+        self.coef = coef
+        self.intercept = float(intercept)
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+
+    def decision(self, cleaned_text):
+        columns = self.analyzer.lookup(self.analyzer.analyze(cleaned_text))
+        if not len(columns):
+            return self.intercept
+        columns, counts = np.unique(columns, return_counts=True)
+        weights = counts.astype(np.float64)
+        if self.sublinear_tf:
+            weights = np.log(weights) + 1
+        weights *= self.idf[columns]
+        if self.norm == 'l2':
+            weights /= np.sqrt(weights @ weights)
+        elif self.norm == 'l1':
+            weights /= np.abs(weights).sum()
+        return float(weights @ self.coef[columns]) + self.intercept
+
+    def score(self, cleaned_text):
+        """Probability of the positive (frustrated) class for one preprocessed text."""
+        return 1.0 / (1.0 + np.exp(-self.decision(cleaned_text)))
+
+
+def make_scorer(vectorizer, model):
+    """
+    Build a FrustrationScorer for a vectorizer/model pair: a compact TF-IDF export or a fitted sklearn
+    TfidfVectorizer with a binary linear model. Returns None for anything else (e.g. hashed features),
+    in which case callers keep using transform + predict_proba.
+    """
+    if isinstance(vectorizer, CompactVectorizer) and isinstance(model, CompactLinearModel):
+        if vectorizer.kind != 'tfidf':
+            return None
+        return FrustrationScorer(vectorizer, vectorizer.vocab, vectorizer.idf, model.coef, model.intercept,
+                                 sublinear_tf=vectorizer.sublinear_tf, norm=vectorizer.norm)
+    vocabulary = getattr(vectorizer, 'vocabulary_', None)
+    coef = getattr(model, 'coef_', None)
+    if vocabulary is None or coef is None or np.shape(coef)[0] != 1 or not hasattr(vectorizer, 'idf_'):
+        return None
+    try:
+        _check_supported(vectorizer)
+    except CompactFormatError:
+        return None
+    params = vectorizer.get_params()
+    terms = np.array(sorted(vocabulary))
+    columns = np.array([vocabulary[term] for term in terms])
+    analyzer = CompactVectorizer({
+        'kind': 'tfidf', 'n_features': len(terms), 'lowercase': params['lowercase'],
+        'token_pattern': params['token_pattern'], 'ngram_range': list(params['ngram_range']), 'norm': params['norm']
+    }, vocab=terms)
+    return FrustrationScorer(analyzer, terms, np.asarray(vectorizer.idf_, dtype=np.float64)[columns],
+                             np.asarray(coef, dtype=np.float64)[0][columns], np.asarray(model.intercept_)[0],
+                             sublinear_tf=params['sublinear_tf'], norm=params['norm'])
+
+
+def load_compact(model_dir, mmap=True):
+    """Load a compact export from model_dir; returns (vectorizer, model)."""
+    with open(os.path.join(model_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version') != FORMAT_VERSION:
+        raise CompactFormatError(
+            f"Unsupported model artifact {manifest.get('format')} v{manifest.get('version')} in {model_dir}"
+        )
+    arrays = {
+        name: np.load(os.path.join(model_dir, spec['file']), mmap_mode='r' if mmap else None, allow_pickle=False)
+        for name, spec in manifest['files'].items()
+    }
+    vectorizer = CompactVectorizer(manifest['vectorizer'], vocab=arrays.get('vocab'), idf=arrays.get('idf'))
+    model = CompactLinearModel(arrays['coef'], manifest['intercept'], manifest['classes'])
+    return vectorizer, model
+
+
+def load_model_artifacts(model_dir):
+    """
+    Load the frustration model from model_dir (the directory holding model.pkl and tfidf.pkl):
+    the compact export in model_dir/compact when present and not older than the pickles, otherwise the pickles.
+    Returns (vectorizer, model). Paths are resolved against model_dir, never the working directory.
+    """
+    vectorizer_path = os.path.join(model_dir, 'tfidf.pkl')
+    model_path = os.path.join(model_dir, 'model.pkl')
+    manifest_path = os.path.join(model_dir, COMPACT_DIR_NAME, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        pickle_mtimes = [os.path.getmtime(path) for path in (vectorizer_path, model_path) if os.path.exists(path)]
+        if pickle_mtimes and os.path.getmtime(manifest_path) < max(pickle_mtimes):
+            logger.warning(f"Ignoring stale compact model in {os.path.dirname(manifest_path)}: the pickles are newer")
+        else:
+            return load_compact(os.path.dirname(manifest_path))
+    with open(vectorizer_path, 'rb') as f:
+        vectorizer = pickle.load(f)
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    return vectorizer, model
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestCompactModel(unittest.TestCase):
+
+    def setUp(self):
+        csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emails.csv')
+        import pandas as pd
+        df = pd.read_csv(csv_path).dropna()
+        self.texts = list(df['text'])
+        self.labels = df['label'].astype(int).to_numpy()
+        self.out_dir = tempfile.mkdtemp()
+
+    def assert_round_trip(self, vectorizer, model):
+        model.fit(vectorizer.transform(self.texts), self.labels)
+        export_compact(vectorizer, model, self.out_dir)
+        compact_vectorizer, compact_model = load_compact(self.out_dir)
+        samples = self.texts[:200] + ["", "zzz unseen words only", "Refund refund REFUND!!"]
+        expected = vectorizer.transform(samples)
+        actual = compact_vectorizer.transform(samples)
+        np.testing.assert_allclose(actual.toarray(), expected.toarray(), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(compact_model.predict_proba(actual), model.predict_proba(expected), rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(compact_model.predict(actual), model.predict(expected))
+
+    def test_tfidf_logistic_round_trip(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        self.assert_round_trip(TfidfVectorizer(max_features=1000, ngram_range=(1, 2)).fit(self.texts),
+                               LogisticRegression(C=100, class_weight='balanced', max_iter=1000))
+
+    def test_hashing_sgd_round_trip(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+        self.assert_round_trip(HashingVectorizer(n_features=2 ** 12, ngram_range=(1, 2), alternate_sign=False),
+                               SGDClassifier(loss='log_loss', random_state=42))
+
+    def test_arrays_are_memory_mapped(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        vectorizer = TfidfVectorizer().fit(self.texts)
+        model = LogisticRegression().fit(vectorizer.transform(self.texts), self.labels)
+        export_compact(vectorizer, model, self.out_dir)
+        compact_vectorizer, compact_model = load_compact(self.out_dir)
+        self.assertIsInstance(compact_vectorizer.vocab, np.memmap)
+        self.assertIsInstance(compact_model.coef, np.memmap)
+        self.assertTrue(np.all(compact_vectorizer.vocab[:-1] <= compact_vectorizer.vocab[1:]))
+
+    def test_scorer_matches_sklearn(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 2)).fit(self.texts)
+        model = LogisticRegression(C=100, class_weight='balanced', max_iter=1000).fit(vectorizer.transform(self.texts), self.labels)
+        export_compact(vectorizer, model, self.out_dir)
+        samples = self.texts[:300] + ["", "qqq xyzzy", "late late late refund"]
+        expected = model.predict_proba(vectorizer.transform(samples))[:, 1]
+        for scorer in (make_scorer(vectorizer, model), make_scorer(*load_compact(self.out_dir))):
+            actual = np.array([scorer.score(text) for text in samples])
+            np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+
+    def test_make_scorer_unsupported(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+        vectorizer = HashingVectorizer(n_features=2 ** 10)
+        model = SGDClassifier(loss='log_loss').fit(vectorizer.transform(self.texts), self.labels)
+        self.assertIsNone(make_scorer(vectorizer, model))
+        self.assertIsNone(make_scorer(object(), object()))
+
+    def test_load_model_artifacts_skips_stale_export(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        vectorizer = TfidfVectorizer().fit(self.texts)
+        model = LogisticRegression().fit(vectorizer.transform(self.texts), self.labels)
+        export_compact(vectorizer, model, os.path.join(self.out_dir, COMPACT_DIR_NAME))
+        for name, obj in (('tfidf.pkl', vectorizer), ('model.pkl', model)):
+            with open(os.path.join(self.out_dir, name), 'wb') as f:
+                pickle.dump(obj, f)
+        manifest_path = os.path.join(self.out_dir, COMPACT_DIR_NAME, MANIFEST_NAME)
+        pickled_at = os.path.getmtime(os.path.join(self.out_dir, 'model.pkl'))
+        # Retrained without exporting: the pickles are loaded instead of the older compact model
+        os.utime(manifest_path, (pickled_at - 10, pickled_at - 10))
+        with self.assertLogs(logger, level='WARNING'):
+            self.assertIsInstance(load_model_artifacts(self.out_dir)[0], TfidfVectorizer)
+        # Exported after the pickles were written: the compact model is current
+        os.utime(manifest_path, (pickled_at + 10, pickled_at + 10))
+        self.assertIsInstance(load_model_artifacts(self.out_dir)[0], CompactVectorizer)
+
+    def test_rejects_unknown_version(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, MANIFEST_NAME), 'w') as f:
+            json.dump({'format': FORMAT_NAME, 'version': FORMAT_VERSION + 1}, f)
+        with self.assertRaises(CompactFormatError):
+            load_compact(self.out_dir)
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if 'test' in sys.argv:
+        sys.argv.remove('test')
+        unittest.main()
@@ -1,14 +1,14 @@
 import os
 import json
 import subprocess
-import pickle
 import re
+import numpy as np
 import sys
 import unittest
 import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
 from dotenv import load_dotenv
+from text_normalizer import normalize_text, normalize_many
+from compact_model import load_model_artifacts, make_scorer
 
 # Load environment variables from the .env file 
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -22,15 +22,12 @@ nltk.download('wordnet', quiet=True)
 
 class FrustrationPredictor:
     def __init__(self):
-        """Load the trained model and vectorizer from disk."""
-        current_dir = os.path.dirname(__file__)
-        self.model_path = os.path.join(current_dir, 'model.pkl')
-        self.vectorizer_path = os.path.join(current_dir, 'tfidf.pkl')
+        """Load the trained model and vectorizer from disk (the compact export when present, else the pickles)."""
+        self.model_dir = os.path.dirname(os.path.abspath(__file__))
         try:
-            with open(self.model_path, 'rb') as f:
-                self.model = pickle.load(f)
-            with open(self.vectorizer_path, 'rb') as f:
-                self.tfidf = pickle.load(f)
+            self.tfidf, self.model = load_model_artifacts(self.model_dir)
+            # NumPy kernel for one email at a time; None for models it does not support
+            self.scorer = make_scorer(self.tfidf, self.model)
         except Exception as e:
             print(f"Error loading model files: {str(e)}")
             raise
@@ -41,23 +38,40 @@ class FrustrationPredictor:
         Remove HTML tags, URLs, and special characters from the text.
         Then tokenize, lowercase, remove stopwords, and lemmatize.
         """
-        text = re.sub(r'<.*?>|http\S+|[^a-zA-Z\s]', '', str(text))
-        tokens = text.lower().split()
-        lemmatizer = WordNetLemmatizer()
-        tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in stopwords.words('english')]
-        return ' '.join(tokens)
+        return normalize_text(str(text))
 
-    def predict_frustration_custom(self, text):
-        """Predicts frustration level using the custom trained model."""
+    @staticmethod
+    def preprocess_many(texts):
+        """Preprocess a batch of texts with the shared normalizer, preserving order."""
+        return normalize_many([str(text) for text in texts])
+
+    def predict_frustration_custom_batch(self, texts):
+        """Predicts frustration levels for a batch of texts with one vectorized model call."""
+        texts = list(texts)
+        if not texts:
+            return np.empty(0, dtype=float)
         try:
-            cleaned_text = FrustrationPredictor.preprocess_text(text)
-            features = self.tfidf.transform([cleaned_text])
-            probability = self.model.predict_proba(features)[0][1]
-            print(f"[Custom Model] Prediction: {probability:.3f}")
-            return float(probability)
+            cleaned_texts = FrustrationPredictor.preprocess_many(texts)
+            features = self.tfidf.transform(cleaned_texts)
+            probabilities = np.asarray(self.model.predict_proba(features), dtype=float)[:, 1]
+            print(f"[Custom Model] Scored batch of {len(texts)} texts")
+            return probabilities
         except Exception as e:
             print(f"[Custom Model] Error: {str(e)}")
-            return 0.5
+            return np.full(len(texts), 0.5)
+
+    def predict_frustration_custom(self, text):
+        """Predicts frustration level using the custom trained model."""
+        if self.scorer is None:
+            probability = self.predict_frustration_custom_batch([text])[0]
+        else:
+            try:
+                probability = self.scorer.score(FrustrationPredictor.preprocess_text(text))
+            except Exception as e:
+                print(f"[Custom Model] Error: {str(e)}")
+                probability = 0.5
+        print(f"[Custom Model] Prediction: {probability:.3f}")
+        return float(probability)
 
     def predict_frustration_gemini(self, text):
         """Predicts frustration level using the Gemini API via a Node.js script."""
@@ -161,6 +175,15 @@ class TestFrustrationPredictor(unittest.TestCase):
             self.assertGreaterEqual(result, 0.0)
             self.assertLessEqual(result, 1.0)
 
+    def test_predict_frustration_custom_batch(self):
+        if self.predictor:
+            texts = ["I am frustrated", "Thank you, everything works", "Still waiting for a reply"]
+            result = self.predictor.predict_frustration_custom_batch(texts)
+            self.assertIsInstance(result, np.ndarray)
+            self.assertEqual(result.shape, (3,))
+            for text, probability in zip(texts, result):
+                self.assertAlmostEqual(probability, self.predictor.predict_frustration_custom(text))
+
     def test_predict_frustration_gemini(self):
         if self.predictor:
             result = self.predictor.predict_frustration_gemini("I am frustrated")
@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from unittest.mock import patch
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+# ---------------------------
+# Shared Text Normalization
+# ---------------------------
+# Single implementation of the cleaning used to train model.pkl/tfidf.pkl and to
+# score emails at runtime. The output must stay token-identical to the original
+# per-call implementation, otherwise the saved vectorizer vocabulary no longer matches.
+
+# Remove HTML tags, URLs, and non-letter characters
+CLEANUP_PATTERN = re.compile(r'<.*?>|http\S+|[^a-zA-Z\s]')
+
+# Upper bound on distinct tokens kept in the lemma cache
+LEMMA_CACHE_SIZE = 100000
+
+# Rows handed to a worker process at a time by normalize_parallel
+NORMALIZE_CHUNK_SIZE = 5000
+
+_lemmatizer = WordNetLemmatizer()
+
+
+@lru_cache(maxsize=None)
+def stopword_table():
+    """Return the English stopwords as a frozenset (loaded once, on first use)."""
+    return frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    """Lemmatize a single token, memoizing the result."""
+    return _lemmatizer.lemmatize(word)
+
+
+def normalize_text(text):
+    """Remove HTML tags, URLs, and special characters; then tokenize, lowercase, remove stopwords, and lemmatize."""
+    stop = stopword_table()
+    tokens = CLEANUP_PATTERN.sub('', text).lower().split()
+    return ' '.join([lemmatize(word) for word in tokens if word not in stop])
+
+
+def normalize_many(texts):
+    """Normalize an iterable of texts, returning a list in the same order."""
+    stop = stopword_table()
+    sub = CLEANUP_PATTERN.sub
+    lemma = lemmatize
+    return [
+        ' '.join([lemma(word) for word in sub('', text).lower().split() if word not in stop])
+        for text in texts
+    ]
+
+
+def resolve_n_jobs(n_jobs):
+    """Turn an n_jobs setting into a worker count: None/1 means in-process, -1 (or any negative) means all cores."""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def _load_worker():
+    # Load the stopwords and WordNet once per worker instead of on the first row of every chunk
+    stopword_table()
+    lemmatize('warmup')
+
+
+def normalize_parallel(texts, n_jobs=None, chunk_size=NORMALIZE_CHUNK_SIZE):
+    """
+    Normalize texts on a pool of n_jobs processes, chunk_size rows per task.
+    The output is in input order and identical to normalize_many, whatever the worker count.
+    """
+    texts = list(texts)
+    workers = resolve_n_jobs(n_jobs)
+    if workers == 1 or len(texts) <= chunk_size:
+        return normalize_many(texts)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_load_worker) as executor:
+        # map() yields chunk results in submission order, so the output order is deterministic
+        return [cleaned for chunk in executor.map(normalize_many, chunks) for cleaned in chunk]
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class TestTextNormalizer(unittest.TestCase):
+
+    def test_normalize_text(self):
+        sample_text = "<p>This is a Test! Visit http://example.com</p>"
+        self.assertEqual(normalize_text(sample_text), 'test visit')
+
+    def test_normalize_many_matches_normalize_text(self):
+        texts = [
+            "<p>This is a test email! Check out http://example.com. Running tests?</p>",
+            "Still waiting for a response after 3 days. This is ridiculous.",
+            "",
+        ]
+        self.assertEqual(normalize_many(texts), [normalize_text(t) for t in texts])
+
+    def test_matches_uncached_implementation(self):
+        # Reference implementation: the original per-call version used before this module existed.
+        def reference(text):
+            text = re.sub(r'<.*?>|http\S+|[^a-zA-Z\s]', '', text)
+            tokens = text.lower().split()
+            lemmatizer = WordNetLemmatizer()
+            return ' '.join([lemmatizer.lemmatize(word) for word in tokens if word not in stopwords.words('english')])
+
+        texts = [
+            "I am extremely frustrated with your service. This is unacceptable!",
+            "Thank you for your help. Everything works perfectly.",
+            "Geese and mice were running <b>wildly</b> at https://example.com/x?y=1 ...",
+        ]
+        self.assertEqual(normalize_many(texts), [reference(t) for t in texts])
+
+    def test_normalize_parallel_matches_normalize_many(self):
+        texts = [f"Email {i}: the invoices were <b>late</b> again, see http://x.io/{i}" for i in range(50)]
+        texts[7] = "Thanks, all good!"
+        self.assertEqual(normalize_parallel(texts, n_jobs=2, chunk_size=8), normalize_many(texts))
+        self.assertEqual(normalize_parallel(texts, n_jobs=1), normalize_many(texts))
+
+    def test_resolve_n_jobs(self):
+        self.assertEqual(resolve_n_jobs(None), 1)
+        self.assertEqual(resolve_n_jobs(3), 3)
+        self.assertEqual(resolve_n_jobs(-1), os.cpu_count() or 1)
+
+    def test_lemma_cache_reused(self):
+        lemmatize.cache_clear()
+        with patch.object(_lemmatizer, 'lemmatize', side_effect=lambda w: w) as mock_lemmatize:
+            normalize_many(["complaint complaint complaint", "complaint"])
+        self.assertEqual(mock_lemmatize.call_count, 1)
+        lemmatize.cache_clear()
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if 'test' in sys.argv:
+        sys.argv.remove('test')
+        unittest.main()
@@ -1,15 +1,24 @@
 import os
-import re
+import json
+import time
+import hashlib
 import pickle
 import sys
+import argparse
+import tempfile
 import unittest
+from unittest.mock import patch
+import joblib
+import numpy as np
 import pandas as pd
 import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from scipy import sparse
+from text_normalizer import normalize_text, normalize_parallel, resolve_n_jobs, NORMALIZE_CHUNK_SIZE, CLEANUP_PATTERN
+from compact_model import export_compact, COMPACT_DIR_NAME
+from sklearn.experimental import enable_halving_search_cv  # registers HalvingGridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 
 # ---------------------------
@@ -33,16 +42,17 @@ def clean_data(df):
 
 def preprocess_text(text):
     """Remove HTML tags, URLs, and special characters; then tokenize, lowercase, remove stopwords, and lemmatize."""
-    # Remove HTML tags, URLs, and non-letter characters
-    text = re.sub(r'<.*?>|http\S+|[^a-zA-Z\s]', '', text)
-    tokens = text.lower().split()
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in stopwords.words('english')]
-    return ' '.join(tokens)
-
-def apply_preprocessing(df):
-    """Apply text preprocessing and remove rows with empty cleaned text."""
-    df['cleaned_text'] = df['text'].apply(preprocess_text)
+    return normalize_text(text)
+
+def apply_preprocessing(df, n_jobs=None, chunk_size=NORMALIZE_CHUNK_SIZE):
+    """
+    Apply text preprocessing and remove rows with empty cleaned text.
+    With n_jobs > 1 (or -1 for all cores) rows are cleaned in chunks on a process pool; row order is preserved.
+    """
+    started = time.perf_counter()
+    df['cleaned_text'] = normalize_parallel(df['text'], n_jobs=n_jobs, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - started
+    print(f"Preprocessed {len(df)} rows in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/sec)")
     df = df[df['cleaned_text'].str.strip() != '']
     return df
 
@@ -60,18 +70,80 @@ def vectorize_text(X_train, X_val, max_features=1000, ngram_range=(1,2)):
     X_val_tfidf = tfidf.transform(X_val)
     return tfidf, X_train_tfidf, X_val_tfidf
 
-def train_model(X_train_tfidf, y_train):
-    """Perform hyperparameter tuning using GridSearchCV and return the best model."""
+# Parameter grid searched by the 'halving' mode: successive halving discards weak candidates on a
+# subsample, so a much wider grid costs about as much as the 5-candidate exhaustive grid
+HALVING_PARAM_GRID = {
+    'C': [float(c) for c in np.logspace(-3, 3, 13)],
+    'class_weight': ['balanced', None],
+}
+SEARCH_MODES = ('grid', 'halving')
+
+def share_sparse_matrix(matrix, folder):
+    """
+    Dump matrix to folder and load it back memory-mapped. Worker processes then receive a reference to
+    the file rather than a pickled copy of the data, whatever its size.
+    """
+    path = os.path.join(folder, 'X_train.joblib')
+    joblib.dump(matrix, path)
+    return joblib.load(path, mmap_mode='r')
+
+def candidate_timings(search):
+    """Per-candidate results from a fitted search: mean fit/score seconds and CV score, best first."""
+    results = search.cv_results_
+    candidates = []
+    for i, params in enumerate(results['params']):
+        candidate = {
+            'params': params,
+            'mean_fit_time': float(results['mean_fit_time'][i]),
+            'mean_score_time': float(results['mean_score_time'][i]),
+            'mean_test_score': float(results['mean_test_score'][i]),
+            'rank': int(results['rank_test_score'][i]),
+        }
+        if 'n_resources' in results:
+            candidate['iter'] = int(results['iter'][i])
+            candidate['n_resources'] = int(results['n_resources'][i])
+        candidates.append(candidate)
+    return sorted(candidates, key=lambda c: (c['rank'], -c.get('iter', 0)))
+
+def print_candidate_timings(candidates, limit=10):
+    for c in candidates[:limit]:
+        resources = f" iter {c['iter']} ({c['n_resources']} rows)" if 'iter' in c else ''
+        print(f"  #{c['rank']:<3} f1 {c['mean_test_score']:.4f}  fit {c['mean_fit_time']:.3f}s  "
+              f"score {c['mean_score_time']:.3f}s{resources}  {c['params']}")
+
+def train_model(X_train_tfidf, y_train, search='grid', n_jobs=None, param_grid=None):
+    """
+    Perform hyperparameter tuning and return (best_model, best_params, candidates).
+    search='grid' runs GridSearchCV over the original C grid; search='halving' runs HalvingGridSearchCV over
+    HALVING_PARAM_GRID. Folds run on n_jobs processes (-1: all cores) that share a memory-mapped copy of the
+    training matrix. The best estimator is refit on the full training set by the search itself.
+    candidates holds the per-candidate timings (see candidate_timings).
+    """
     model = LogisticRegression(class_weight='balanced', max_iter=1000)
-    param_grid = {
-        'C': [0.01, 0.1, 1, 10, 100],
-        'penalty': ['l2'],
-        'solver': ['lbfgs']
-    }
-    grid_search = GridSearchCV(model, param_grid, cv=5, scoring='f1')
-    grid_search.fit(X_train_tfidf, y_train)
+    if search not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {search!r}, expected one of {SEARCH_MODES}")
+    if search == 'halving':
+        grid_search = HalvingGridSearchCV(model, param_grid or HALVING_PARAM_GRID, cv=5, scoring='f1',
+                                          n_jobs=n_jobs, random_state=42)
+    else:
+        param_grid = param_grid or {
+            'C': [0.01, 0.1, 1, 10, 100],
+            'solver': ['lbfgs']
+        }
+        grid_search = GridSearchCV(model, param_grid, cv=5, scoring='f1', n_jobs=n_jobs)
+
+    started = time.perf_counter()
+    if resolve_n_jobs(n_jobs) > 1:
+        with tempfile.TemporaryDirectory(prefix='train_search_') as folder:
+            grid_search.fit(share_sparse_matrix(X_train_tfidf, folder), y_train)
+    else:
+        grid_search.fit(X_train_tfidf, y_train)
+    elapsed = time.perf_counter() - started
+    candidates = candidate_timings(grid_search)
+    print(f"{search} search: {len(candidates)} candidate runs in {elapsed:.2f}s (refit {grid_search.refit_time_:.3f}s)")
+    print_candidate_timings(candidates)
     best_model = grid_search.best_estimator_
-    return best_model, grid_search.best_params_
+    return best_model, grid_search.best_params_, candidates
 
 def evaluate_model(model, X_val_tfidf, y_val):
     """Evaluate the model and return a dictionary with performance metrics."""
@@ -87,26 +159,279 @@ def evaluate_model(model, X_val_tfidf, y_val):
     return metrics
 
 def save_artifacts(model, tfidf, model_path, vectorizer_path):
-    """Save the trained model and TF-IDF vectorizer using pickle."""
+    """
+    Save the trained model and TF-IDF vectorizer using pickle, then refresh the compact export next to them
+    (model_path's directory / compact) so the loader never serves an older model than the pickles.
+    """
     with open(model_path, 'wb') as f:
         pickle.dump(model, f)
     with open(vectorizer_path, 'wb') as f:
         pickle.dump(tfidf, f)
+    export_compact_artifacts(model, tfidf, os.path.join(os.path.dirname(os.path.abspath(model_path)), COMPACT_DIR_NAME))
 
-def train_model_pipeline(csv_file, model_path, vectorizer_path):
-    """Run the full training pipeline."""
-    download_nltk_resources()
-    df = load_dataset(csv_file)
-    df = clean_data(df)
-    df = apply_preprocessing(df)
-    X_train, X_val, y_train, y_val = split_data(df)
-    tfidf, X_train_tfidf, X_val_tfidf = vectorize_text(X_train, X_val)
-    best_model, best_params = train_model(X_train_tfidf, y_train)
-    best_model.fit(X_train_tfidf, y_train)
+def export_compact_artifacts(model, vectorizer, out_dir):
+    """Write the memory-mappable compact export (see compact_model.py) that the server loads in place of the pickles."""
+    manifest_path = export_compact(vectorizer, model, out_dir)
+    print(f"Exported compact model to {out_dir}")
+    return manifest_path
+
+# ---------------------------
+# Feature Cache
+# ---------------------------
+# Cleaning and vectorizing the dataset dominate a training run and do not depend on the classifier, so both
+# stages are cached on disk as .npz files, keyed by a hash of the CSV contents plus the parameters that shape them:
+#   preprocessed-<key>.npz   cleaned text (UTF-8 bytes + offsets), labels and row index after apply_preprocessing
+#   features-<key>.npz       train/validation TF-IDF matrices (CSR parts), labels, and the fitted vocabulary/idf
+# Changing the CSV, the cleanup pattern, the split or the vectorizer settings gives a new key; changing only
+# the classifier or its grid reuses the cached features and goes straight to fitting.
+
+FEATURE_CACHE_DIR = os.environ.get(
+    'TRAIN_FEATURE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_cache')
+)
+# Bump when the cached layout, or what a cached stage contains, changes
+FEATURE_CACHE_VERSION = 1
+
+def dataset_hash(csv_file, block_size=1 << 20):
+    """SHA-256 of the CSV file contents."""
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def feature_cache_key(*parts):
+    """Short stable key for a sequence of JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:24]
+
+def preprocessing_cache_key(data_hash):
+    return feature_cache_key('preprocessed', FEATURE_CACHE_VERSION, data_hash, CLEANUP_PATTERN.pattern)
+
+def vectorizer_cache_key(preprocessed_key, test_size, random_state, max_features, ngram_range):
+    return feature_cache_key('features', FEATURE_CACHE_VERSION, preprocessed_key, test_size, random_state,
+                             max_features, list(ngram_range))
+
+def encode_texts(texts):
+    """Pack strings into a UTF-8 byte buffer plus offsets, so the .npz never needs pickled object arrays."""
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def decode_texts(buffer, offsets):
+    data = buffer.tobytes()
+    return [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+def save_npz_atomic(path, **arrays):
+    """Write arrays to path via a temporary file, so an interrupted run never leaves a truncated cache entry."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+def save_preprocessed(df, path):
+    buffer, offsets = encode_texts(df['cleaned_text'])
+    save_npz_atomic(
+        path, cleaned_text=buffer, cleaned_offsets=offsets,
+        label=df['label'].to_numpy(dtype=np.int64), index=df.index.to_numpy(dtype=np.int64)
+    )
+
+def load_preprocessed(path):
+    with np.load(path, allow_pickle=False) as data:
+        return pd.DataFrame(
+            {'cleaned_text': decode_texts(data['cleaned_text'], data['cleaned_offsets']), 'label': data['label']},
+            index=data['index']
+        )
+
+def save_features(path, tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val):
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+    arrays = {
+        'vocabulary': np.array(terms, dtype=str),
+        'idf': tfidf.idf_,
+        'y_train': np.asarray(y_train, dtype=np.int64),
+        'y_val': np.asarray(y_val, dtype=np.int64),
+    }
+    for name, matrix in (('train', X_train_tfidf), ('val', X_val_tfidf)):
+        matrix = matrix.tocsr()
+        arrays.update({
+            f'{name}_data': matrix.data, f'{name}_indices': matrix.indices,
+            f'{name}_indptr': matrix.indptr, f'{name}_shape': np.array(matrix.shape)
+        })
+    save_npz_atomic(path, **arrays)
+
+def load_features(path, max_features=1000, ngram_range=(1,2)):
+    """Inverse of save_features: returns (tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val) with a ready-to-use vectorizer."""
+    with np.load(path, allow_pickle=False) as data:
+        matrices = [
+            sparse.csr_matrix((data[f'{name}_data'], data[f'{name}_indices'], data[f'{name}_indptr']),
+                              shape=tuple(data[f'{name}_shape']))
+            for name in ('train', 'val')
+        ]
+        tfidf = TfidfVectorizer(max_features=max_features, ngram_range=ngram_range)
+        tfidf.vocabulary_ = {str(term): i for i, term in enumerate(data['vocabulary'])}
+        tfidf.idf_ = data['idf']
+        return (tfidf, *matrices, data['y_train'], data['y_val'])
+
+def read_cache_entry(path, loader, *args):
+    """Load a cache entry, or return None when it is missing or unreadable (it is then rebuilt)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return loader(path, *args)
+    except Exception as e:
+        print(f"Ignoring unreadable feature cache entry {path}: {e}")
+        return None
+
+def prepare_features(csv_file, n_jobs=None, cache_dir=FEATURE_CACHE_DIR, test_size=0.2, random_state=42,
+                     max_features=1000, ngram_range=(1,2)):
+    """
+    Load, clean, split and vectorize the CSV; returns (tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val).
+    With cache_dir, each stage is read from the feature cache when its key matches and written there otherwise;
+    cache_dir=None always recomputes.
+    """
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        preprocessed_key = preprocessing_cache_key(dataset_hash(csv_file))
+        features_key = vectorizer_cache_key(preprocessed_key, test_size, random_state, max_features, ngram_range)
+        preprocessed_path = os.path.join(cache_dir, f'preprocessed-{preprocessed_key}.npz')
+        features_path = os.path.join(cache_dir, f'features-{features_key}.npz')
+        cached = read_cache_entry(features_path, load_features, max_features, ngram_range)
+        if cached is not None:
+            print(f"Loaded cached features from {features_path}")
+            return cached
+        df = read_cache_entry(preprocessed_path, load_preprocessed)
+        if df is not None:
+            print(f"Loaded cached preprocessed text from {preprocessed_path}")
+    else:
+        df = None
+
+    if df is None:
+        download_nltk_resources()
+        df = apply_preprocessing(clean_data(load_dataset(csv_file)), n_jobs=n_jobs)
+        if cache_dir:
+            save_preprocessed(df, preprocessed_path)
+    X_train, X_val, y_train, y_val = split_data(df, test_size=test_size, random_state=random_state)
+    tfidf, X_train_tfidf, X_val_tfidf = vectorize_text(X_train, X_val, max_features=max_features, ngram_range=ngram_range)
+    if cache_dir:
+        save_features(features_path, tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val)
+    return tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val
+
+def train_model_pipeline(csv_file, model_path, vectorizer_path, n_jobs=None, feature_cache_dir=FEATURE_CACHE_DIR, search='grid'):
+    """
+    Run the full training pipeline. Cleaned text and TF-IDF features come from the feature cache when it is current;
+    n_jobs applies to both preprocessing and the hyperparameter search.
+    """
+    tfidf, X_train_tfidf, X_val_tfidf, y_train, y_val = prepare_features(csv_file, n_jobs=n_jobs, cache_dir=feature_cache_dir)
+    best_model, best_params, _ = train_model(X_train_tfidf, y_train, search=search, n_jobs=n_jobs)
     metrics = evaluate_model(best_model, X_val_tfidf, y_val)
     save_artifacts(best_model, tfidf, model_path, vectorizer_path)
     return best_model, tfidf, metrics, best_params
 
+# ---------------------------
+# Streaming (Out-of-Core) Training
+# ---------------------------
+# Trains on CSVs larger than memory: rows are read and cleaned chunk by chunk, hashed into a fixed-size
+# feature space (no vocabulary to fit) and fed to an SGD logistic regression with partial_fit.
+# The saved vectorizer/model pair exposes transform/predict_proba like the TF-IDF/LogisticRegression pair.
+
+STREAM_CHUNK_SIZE = 50000
+STREAM_N_FEATURES = 2 ** 20
+# Every STREAM_HOLDOUT_EVERY-th row is held out for validation, up to STREAM_HOLDOUT_MAX_ROWS rows
+STREAM_HOLDOUT_EVERY = 5
+STREAM_HOLDOUT_MAX_ROWS = 20000
+
+def make_hashing_vectorizer(n_features=STREAM_N_FEATURES, ngram_range=(1,2)):
+    """Stateless vectorizer with L2-normalized term counts, so every chunk maps into the same feature space."""
+    return HashingVectorizer(n_features=n_features, ngram_range=ngram_range, alternate_sign=False, norm='l2')
+
+def make_sgd_model(alpha=1e-5, random_state=42):
+    """Logistic regression trained by SGD; log_loss keeps predict_proba available."""
+    return SGDClassifier(loss='log_loss', alpha=alpha, random_state=random_state)
+
+def iter_training_chunks(csv_file, chunk_size=STREAM_CHUNK_SIZE, skip_chunks=0, n_jobs=None):
+    """Yield (chunk_index, cleaned DataFrame) for each chunk of the CSV, skipping the first skip_chunks unprocessed."""
+    for index, chunk in enumerate(pd.read_csv(csv_file, chunksize=chunk_size)):
+        if index < skip_chunks:
+            continue
+        yield index, apply_preprocessing(clean_data(chunk), n_jobs=n_jobs)
+
+def balanced_sample_weight(y, class_counts):
+    """Per-row weights equivalent to class_weight='balanced' over all rows seen so far (counts updated in place)."""
+    for label in (0, 1):
+        class_counts[label] += int((y == label).sum())
+    total = class_counts[0] + class_counts[1]
+    weights = {label: total / (2.0 * count) if count else 1.0 for label, count in class_counts.items()}
+    return np.array([weights[label] for label in y])
+
+def save_checkpoint(checkpoint, checkpoint_path):
+    """Atomically write the training state, so an interrupted run never leaves a half-written checkpoint."""
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def load_checkpoint(checkpoint_path):
+    with open(checkpoint_path, 'rb') as f:
+        return pickle.load(f)
+
+def train_streaming_pipeline(csv_file, model_path, vectorizer_path, chunk_size=STREAM_CHUNK_SIZE,
+                             n_features=STREAM_N_FEATURES, epochs=1, checkpoint_path=None, resume=False, n_jobs=None):
+    """
+    Out-of-core alternative to train_model_pipeline. The CSV is read in chunks of chunk_size rows and the model
+    is updated with partial_fit after each one; every STREAM_HOLDOUT_EVERY-th row is held out for evaluation.
+    With checkpoint_path, the state (including the holdout rows collected so far) is saved after every chunk;
+    resume=True continues from the saved chunk.
+    Returns (model, vectorizer, metrics).
+    """
+    download_nltk_resources()
+    checkpoint = None
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        print(f"Resuming from epoch {checkpoint['epoch']}, chunk {checkpoint['next_chunk']} ({checkpoint['rows_seen']} rows seen)")
+    else:
+        checkpoint = {
+            'vectorizer': make_hashing_vectorizer(n_features=n_features),
+            'model': make_sgd_model(),
+            'epoch': 0,
+            'next_chunk': 0,
+            'rows_seen': 0,
+            'class_counts': {0: 0, 1: 0},
+            'holdout_texts': [],
+            'holdout_labels': [],
+        }
+    vectorizer, model = checkpoint['vectorizer'], checkpoint['model']
+    # Kept in the checkpoint, so a run resumed within the last epoch still evaluates on the whole holdout
+    holdout_texts, holdout_labels = checkpoint['holdout_texts'], checkpoint['holdout_labels']
+    started = time.perf_counter()
+    for epoch in range(checkpoint['epoch'], epochs):
+        for index, chunk in iter_training_chunks(csv_file, chunk_size, skip_chunks=checkpoint['next_chunk'], n_jobs=n_jobs):
+            # The holdout is chosen by position in the file, so it is the same rows on every epoch and after resuming
+            positions = chunk.index.to_numpy()
+            is_holdout = positions % STREAM_HOLDOUT_EVERY == 0
+            if epoch == epochs - 1 and len(holdout_texts) < STREAM_HOLDOUT_MAX_ROWS:
+                room = STREAM_HOLDOUT_MAX_ROWS - len(holdout_texts)
+                holdout_texts.extend(chunk['cleaned_text'][is_holdout][:room])
+                holdout_labels.extend(chunk['label'][is_holdout][:room])
+            train = chunk[~is_holdout]
+            if len(train):
+                y = train['label'].to_numpy(dtype=int)
+                X = vectorizer.transform(train['cleaned_text'])
+                model.partial_fit(X, y, classes=np.array([0, 1]), sample_weight=balanced_sample_weight(y, checkpoint['class_counts']))
+                checkpoint['rows_seen'] += len(train)
+            checkpoint['next_chunk'] = index + 1
+            if checkpoint_path:
+                save_checkpoint(checkpoint, checkpoint_path)
+        checkpoint['epoch'], checkpoint['next_chunk'] = epoch + 1, 0
+        if checkpoint_path:
+            save_checkpoint(checkpoint, checkpoint_path)
+    elapsed = time.perf_counter() - started
+    print(f"Streamed {checkpoint['rows_seen']} training rows in {elapsed:.2f}s")
+
+    metrics = {}
+    if holdout_texts:
+        metrics = evaluate_model(model, vectorizer.transform(holdout_texts), np.array(holdout_labels, dtype=int))
+    save_artifacts(model, vectorizer, model_path, vectorizer_path)
+    return model, vectorizer, metrics
+
 # ---------------------------
 # Unit Tests
 # ---------------------------
@@ -132,6 +457,72 @@ class TestEmailClassifier(unittest.TestCase):
         df_clean = clean_data(df)
         self.assertEqual(len(df_clean), 1)
     
+    def test_apply_preprocessing_parallel_keeps_order(self):
+        # Multi-process cleaning must give the same rows, in the same order, as the single-process path.
+        df = pd.DataFrame({
+            'text': [f"Order {i} is <i>still</i> delayed!" for i in range(20)] + ["!!!"],
+            'label': [i % 2 for i in range(21)]
+        })
+        serial = apply_preprocessing(df.copy())
+        parallel = apply_preprocessing(df.copy(), n_jobs=2, chunk_size=6)
+        self.assertEqual(list(parallel['cleaned_text']), list(serial['cleaned_text']))
+        self.assertEqual(list(parallel.index), list(range(20)))
+
+    def test_streaming_pipeline_artifacts_and_resume(self):
+        # Streaming training writes a vectorizer/model pair usable like the TF-IDF pair, and a run
+        # interrupted after a chunk resumes from its checkpoint to the same model as an uninterrupted run.
+        folder = tempfile.mkdtemp()
+        csv_file = os.path.join(folder, 'emails.csv')
+        texts = ["I am furious, the refund never arrived", "Thank you, everything works great",
+                 "Still waiting, this is unacceptable", "Lovely service and a quick reply"] * 10
+        pd.DataFrame({'text': texts, 'label': [1, 0, 1, 0] * 10}).to_csv(csv_file, index=False)
+        paths = lambda name: (os.path.join(folder, f'{name}_model.pkl'), os.path.join(folder, f'{name}_vec.pkl'))
+
+        model, vectorizer, metrics = train_streaming_pipeline(csv_file, *paths('full'), chunk_size=8, n_features=2 ** 12, epochs=2)
+        with open(paths('full')[1], 'rb') as f:
+            saved_vectorizer = pickle.load(f)
+        probabilities = model.predict_proba(saved_vectorizer.transform([preprocess_text("I am furious about the refund")]))
+        self.assertEqual(probabilities.shape, (1, 2))
+        self.assertIn('f1', metrics)
+        # The compact export is refreshed alongside the pickles
+        self.assertTrue(os.path.exists(os.path.join(folder, COMPACT_DIR_NAME, 'manifest.json')))
+
+        checkpoint_path = os.path.join(folder, 'checkpoint.pkl')
+        real_save = save_checkpoint
+        calls = []
+        def interrupt_after_three(checkpoint, path):
+            real_save(checkpoint, path)
+            calls.append(1)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+        with patch('__main__.save_checkpoint', side_effect=interrupt_after_three):
+            with self.assertRaises(KeyboardInterrupt):
+                train_streaming_pipeline(csv_file, *paths('resumed'), chunk_size=8, n_features=2 ** 12, epochs=2,
+                                         checkpoint_path=checkpoint_path)
+        self.assertEqual(load_checkpoint(checkpoint_path)['next_chunk'], 3)
+        resumed, _, _ = train_streaming_pipeline(csv_file, *paths('resumed'), chunk_size=8, n_features=2 ** 12, epochs=2,
+                                                 checkpoint_path=checkpoint_path, resume=True)
+        np.testing.assert_allclose(resumed.coef_, model.coef_)
+
+        # Interrupted within the last epoch: the holdout rows of the chunks already done come from the checkpoint
+        calls.clear()
+        def interrupt_after_eight(checkpoint, path):
+            real_save(checkpoint, path)
+            calls.append(1)
+            if len(calls) == 8:
+                raise KeyboardInterrupt
+        with patch('__main__.save_checkpoint', side_effect=interrupt_after_eight):
+            with self.assertRaises(KeyboardInterrupt):
+                train_streaming_pipeline(csv_file, *paths('resumed'), chunk_size=8, n_features=2 ** 12, epochs=2,
+                                         checkpoint_path=checkpoint_path)
+        self.assertEqual((load_checkpoint(checkpoint_path)['epoch'], load_checkpoint(checkpoint_path)['next_chunk']), (1, 2))
+        with patch('__main__.evaluate_model', wraps=evaluate_model) as evaluate:
+            _, _, resumed_metrics = train_streaming_pipeline(csv_file, *paths('resumed'), chunk_size=8, n_features=2 ** 12,
+                                                             epochs=2, checkpoint_path=checkpoint_path, resume=True)
+        # Every 5th of the 40 rows is held out
+        self.assertEqual(len(evaluate.call_args.args[2]), 8)
+        self.assertEqual(resumed_metrics, metrics)
+
     def test_split_data(self):
         # Create a small DataFrame and test the splitting.
         data = {
@@ -152,6 +543,49 @@ class TestEmailClassifier(unittest.TestCase):
         self.assertEqual(X_train_tfidf.shape[0], 2)
         self.assertEqual(X_val_tfidf.shape[0], 1)
 
+    def test_train_model_halving_search_in_parallel(self):
+        # Halving search on two workers sharing a memory-mapped matrix returns an already refit best model
+        # and timings for every candidate run.
+        X_train = pd.Series(["furious refund late", "thank great service", "unacceptable still waiting",
+                             "lovely quick reply"] * 15)
+        y_train = np.array([1, 0, 1, 0] * 15)
+        tfidf = TfidfVectorizer().fit(X_train)
+        X = tfidf.transform(X_train)
+        best_model, best_params, candidates = train_model(X, y_train, search='halving', n_jobs=2,
+                                                          param_grid={'C': [0.1, 1, 10], 'class_weight': ['balanced', None]})
+        self.assertIn(best_params, [c['params'] for c in candidates])
+        self.assertTrue(all(c['mean_fit_time'] > 0 and 'n_resources' in c for c in candidates))
+        expected = LogisticRegression(max_iter=1000, **best_params).fit(X, y_train)
+        np.testing.assert_allclose(best_model.coef_, expected.coef_, rtol=1e-6)
+
+    def test_feature_cache_reuses_stages(self):
+        # A second run reads both stages from the cache; a new vectorizer setting only re-vectorizes,
+        # and an edited CSV invalidates everything.
+        folder = tempfile.mkdtemp()
+        csv_file, cache_dir = os.path.join(folder, 'emails.csv'), os.path.join(folder, 'cache')
+        texts = ["I am furious, the refund never arrived", "Thank you, everything works great",
+                 "Still waiting, this is unacceptable", "Lovely service and a quick réply"] * 5
+        pd.DataFrame({'text': texts, 'label': [1, 0, 1, 0] * 5}).to_csv(csv_file, index=False)
+
+        tfidf, X_train, X_val, y_train, y_val = prepare_features(csv_file, cache_dir=cache_dir)
+        with patch('__main__.apply_preprocessing', side_effect=AssertionError("preprocessing should be cached")), \
+                patch('__main__.vectorize_text', side_effect=AssertionError("features should be cached")):
+            cached_tfidf, cached_train, cached_val, cached_y_train, cached_y_val = prepare_features(csv_file, cache_dir=cache_dir)
+        self.assertEqual((cached_train != X_train).nnz + (cached_val != X_val).nnz, 0)
+        self.assertEqual(list(cached_y_train), list(y_train))
+        self.assertEqual(list(cached_y_val), list(y_val))
+        sample = ["refund still waiting", "great service"]
+        self.assertEqual((cached_tfidf.transform(sample) != tfidf.transform(sample)).nnz, 0)
+
+        with patch('__main__.apply_preprocessing', side_effect=AssertionError("preprocessing should be cached")):
+            smaller, X_small, _, _, _ = prepare_features(csv_file, cache_dir=cache_dir, max_features=5)
+        self.assertEqual(X_small.shape[1], 5)
+
+        with open(csv_file, 'a') as f:
+            f.write("Where is my order,1\n")
+        _, X_train, X_val, _, _ = prepare_features(csv_file, cache_dir=cache_dir)
+        self.assertEqual(X_train.shape[0] + X_val.shape[0], 21)
+
 
 # ---------------------------
 # Main Execution
@@ -164,9 +598,40 @@ if __name__ == '__main__':
         unittest.main()
     else:
         # Run the full training pipeline
-        csv_file = 'emails.csv'
-        model_path = os.path.join(os.path.dirname(__file__), 'model.pkl')
-        vectorizer_path = os.path.join(os.path.dirname(__file__), 'tfidf.pkl')
-        best_model, tfidf, metrics, best_params = train_model_pipeline(csv_file, model_path, vectorizer_path)
-        print("Best Parameters:", best_params)
-        print("Evaluation Metrics:", metrics)
\ No newline at end of file
+        parser = argparse.ArgumentParser(description="Train the frustration model")
+        parser.add_argument('--csv', default='emails.csv', help="Labeled CSV with 'text' and 'label' columns")
+        parser.add_argument('--n-jobs', type=int, default=None, help="Worker processes for preprocessing and the hyperparameter search (-1: all cores)")
+        parser.add_argument('--streaming', action='store_true', help="Out-of-core training: hashed features + SGD partial_fit")
+        parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help="Rows per chunk in streaming mode")
+        parser.add_argument('--epochs', type=int, default=1, help="Passes over the CSV in streaming mode")
+        parser.add_argument('--checkpoint', default=None, help="Checkpoint file written after every chunk in streaming mode")
+        parser.add_argument('--resume', action='store_true', help="Continue streaming training from --checkpoint")
+        parser.add_argument('--search', choices=SEARCH_MODES, default='grid', help="Exhaustive grid, or successive halving over a wider grid")
+        parser.add_argument('--feature-cache-dir', default=FEATURE_CACHE_DIR, help="Where cleaned text and TF-IDF features are cached")
+        parser.add_argument('--no-feature-cache', action='store_true', help="Always re-clean and re-vectorize the dataset")
+        parser.add_argument('--export-only', action='store_true', help="Skip training; export the saved pickles to the compact format")
+        args = parser.parse_args()
+        csv_file = args.csv
+        model_dir = os.path.dirname(os.path.abspath(__file__))
+        model_path = os.path.join(model_dir, 'model.pkl')
+        vectorizer_path = os.path.join(model_dir, 'tfidf.pkl')
+        compact_dir = os.path.join(model_dir, COMPACT_DIR_NAME)
+        if args.export_only:
+            with open(model_path, 'rb') as f:
+                model = pickle.load(f)
+            with open(vectorizer_path, 'rb') as f:
+                vectorizer = pickle.load(f)
+            export_compact_artifacts(model, vectorizer, compact_dir)
+        elif args.streaming:
+            model, vectorizer, metrics = train_streaming_pipeline(
+                csv_file, model_path, vectorizer_path, chunk_size=args.chunk_size, epochs=args.epochs,
+                checkpoint_path=args.checkpoint, resume=args.resume, n_jobs=args.n_jobs
+            )
+            print("Evaluation Metrics:", metrics)
+        else:
+            best_model, tfidf, metrics, best_params = train_model_pipeline(
+                csv_file, model_path, vectorizer_path, n_jobs=args.n_jobs,
+                feature_cache_dir=None if args.no_feature_cache else args.feature_cache_dir, search=args.search
+            )
+            print("Best Parameters:", best_params)
+            print("Evaluation Metrics:", metrics)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import sys
+import json
+import logging
+import unittest
+from unittest.mock import patch
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
+from flask_cors import cross_origin
+from googletrans import Translator
+# Email & summarizer imports
+from email_processor import latest_snapshot
+from email_store import EmailStore, get_email_store
+from email_scheduler import EmailScheduler, get_email_scheduler
+from video_summarizer import generate_summary_pdf
+from gemini_pool import get_gemini_pool, GeminiWorkerError, GeminiTimeoutError
+from gemini_cache import get_gemini_cache
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The server's own routes; server.create_app registers this blueprint next to the feature blueprints
+server_bp = Blueprint('server_bp', __name__)
+
+
+@server_bp.route('/translate_summary', methods=['POST'])
+@cross_origin()
+def translate_summary():
+    """
+    Example route for translating summary text, then generating a PDF.
+    """
+    try:
+        data = request.get_json()
+        original_text = data.get('text', '')
+        target_language = data.get('language', 'en')
+
+        if not original_text:
+            return jsonify({"error": "No text provided"}), 400
+
+        translator = Translator()
+        translated = translator.translate(original_text, dest=target_language)
+        translated_text = translated.text
+
+        # Use the generate_summary_pdf function from video_summarizer
+        pdf_path = generate_summary_pdf(translated_text, f"Video Summary ({target_language.upper()})")
+
+        return send_file(
+            pdf_path,
+            as_attachment=True,
+            download_name=f"video_summary_{target_language}.pdf",
+            mimetype="application/pdf"
+        )
+    except Exception as e:
+        logger.error(f"Error translating summary: {str(e)}")
+        return jsonify({"error": f"Translation failed: {str(e)}"}), 500
+
+
+def format_ndjson(event):
+    return json.dumps(event) + "\n"
+
+
+def format_sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+# Streaming formats for /fetch_predicted_emails, as (formatter, mimetype)
+STREAM_FORMATS = {
+    'ndjson': (format_ndjson, 'application/x-ndjson'),
+    'sse': (format_sse, 'text/event-stream'),
+}
+
+
+def requested_stream_format():
+    """Streaming format from ?stream=ndjson|sse or the Accept header; None for the plain JSON response."""
+    stream = request.args.get('stream')
+    if stream in STREAM_FORMATS:
+        return stream
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+@server_bp.route('/fetch_predicted_emails', methods=['GET'])
+@cross_origin()
+def fetch_predicted_emails():
+    scheduler = get_email_scheduler()
+    stream = requested_stream_format()
+    if stream:
+        # One event per email as soon as it is scored, with the frustration summary as the final event
+        formatter, mimetype = STREAM_FORMATS[stream]
+        events = (formatter(event) for event in scheduler.iter_events())
+        return Response(
+            stream_with_context(events),
+            mimetype=mimetype,
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    try:
+        store = get_email_store()
+        # Results are precomputed by the email scheduler; only the very first request waits for a sync
+        if store.get_state('last_sync') is None:
+            scheduler.run_once(wait=True)
+            if store.get_state('last_sync') is None:
+                # No sync has ever succeeded (e.g. no Gmail token, or Gmail is down): not an empty inbox
+                error = scheduler.status()['last_error'] or "Email sync has not completed"
+                logger.error(f"Initial email sync failed: {error}")
+                return jsonify({"error": error}), 503
+        emails, frustration_summary = latest_snapshot(store)
+        return jsonify({
+            'emails': emails,
+            'frustration_summary': frustration_summary
+        })
+    except Exception as e:
+        logger.error(f"Error processing emails: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@server_bp.route('/fetch_predicted_emails/refresh', methods=['POST'])
+@cross_origin()
+def refresh_predicted_emails():
+    """Start a mailbox sync now instead of waiting for the next scheduled run."""
+    scheduler = get_email_scheduler()
+    started = scheduler.trigger()
+    return jsonify({'started': started, 'status': scheduler.status()}), 202
+
+
+@server_bp.route('/fetch_predicted_emails/status', methods=['GET'])
+@cross_origin()
+def predicted_emails_status():
+    """State of the current or last scheduled email sync."""
+    return jsonify(get_email_scheduler().status())
+
+
+@server_bp.route('/gemini_cache_stats', methods=['GET'])
+@cross_origin()
+def gemini_cache_stats():
+    """Hit/miss counters and size of the Gemini score cache."""
+    return jsonify(get_gemini_cache().stats())
+
+
+@server_bp.route('/api/gemini-chat', methods=['POST'])
+def gemini_chat():
+    data = request.get_json()
+    message = data.get('message', '')
+
+    if not message:
+        return jsonify({'reply': 'No message provided'}), 400
+
+    try:
+        result = get_gemini_pool().request('chat', message, timeout=30)
+        reply = result.get('reply', '').strip()
+        return jsonify({'reply': reply})
+
+    except GeminiTimeoutError:
+        return jsonify({'reply': 'Gemini API call timed out'}), 500
+    except GeminiWorkerError as e:
+        return jsonify({'reply': f'Error calling Gemini worker: {e}'}), 500
+    except Exception as e:
+        return jsonify({'reply': f'Unexpected error: {str(e)}'}), 500
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class FailingScheduler(EmailScheduler):
+    """Scheduler whose sync fails the way a missing Gmail token does."""
+
+    def _job(self):
+        raise RuntimeError("Gmail token missing: run `python gmail_client.py auth`")
+
+
+class TestServerRoutes(unittest.TestCase):
+
+    def setUp(self):
+        from flask import Flask
+        app = Flask(__name__)
+        app.register_blueprint(server_bp)
+        self.client = app.test_client()
+        self.store = EmailStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_fetch_predicted_emails_reports_a_failed_first_sync(self):
+        scheduler = FailingScheduler(self.store, interval_seconds=0)
+        with patch('__main__.get_email_store', return_value=self.store), \
+                patch('__main__.get_email_scheduler', return_value=scheduler):
+            response = self.client.get('/fetch_predicted_emails')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Gmail token missing", response.get_json()['error'])
+
+    def test_fetch_predicted_emails_serves_the_snapshot(self):
+        self.store.set_state('last_sync', 1700000000)
+        scheduler = FailingScheduler(self.store, interval_seconds=0)
+        with patch('__main__.get_email_store', return_value=self.store), \
+                patch('__main__.get_email_scheduler', return_value=scheduler):
+            response = self.client.get('/fetch_predicted_emails')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'emails': [], 'frustration_summary': "No frustrated emails found."})
+        self.assertEqual(scheduler.status()['runs'], 0)
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()
@@ -0,0 +1,35 @@
+import whisper #openAI's whisper for audio transcription
+
+# ---------------------------
+# Transcription Worker Process
+# ---------------------------
+# Initializer and task of the chunked-transcription process pool (see video_summarizer.get_transcription_pool).
+# They live in this small module, rather than in video_summarizer, so a spawned worker unpickles them by
+# importing only Whisper, not Flask, the blueprints or the email model.
+
+# Decoding options shared by the single-call and chunked transcription paths
+WHISPER_TRANSCRIBE_OPTIONS = dict(
+    fp16=False,
+    # Specify the language of the audio (e.g., "en" for English)
+    language='en',
+    initial_prompt="This is a clear speech recording.",
+    word_timestamps=True,
+    condition_on_previous_text=True,
+    temperature=0.0
+)
+
+worker_model = None
+
+
+def load_worker_model(model_size, device, threads):
+    """Pool initializer: load the model once per worker process and keep torch from oversubscribing the cores."""
+    global worker_model
+    import torch
+    torch.set_num_threads(threads)
+    worker_model = whisper.load_model(model_size, device=device)
+
+
+def transcribe_chunk(chunk):
+    """Pool task: transcribe one chunk of 16 kHz mono audio and return its segments (chunk-relative times)."""
+    result = worker_model.transcribe(chunk, verbose=None, **WHISPER_TRANSCRIBE_OPTIONS)
+    return result.get('segments', [])
@@ -1,14 +1,17 @@
 import os
+import sys
 import tempfile
-import json
 import logging
-import librosa #For audio analysis(used in transcription)
-import subprocess
+import threading
+import unittest
+import uuid
+from collections import OrderedDict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 import numpy as np
-import soundfile as sf #for reading and writing audio files
 import whisper #openAI's whisper for audio transcription
-from PyPDF2 import PdfReader
-from pathlib import Path
 from flask import Blueprint, request, jsonify, send_file
 from flask_cors import cross_origin #for cross-origin requests
 from reportlab.lib.pagesizes import letter #for PDF generation
@@ -16,6 +19,9 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from werkzeug.utils import secure_filename #for secure file names
+from gemini_pool import get_gemini_pool, GeminiWorkerError, GeminiTimeoutError
+import transcribe_worker #initializer and task of the transcription worker processes
+from transcribe_worker import WHISPER_TRANSCRIBE_OPTIONS
 
 # Set up logging configuration to see debug/info messages in the terminal
 logger = logging.getLogger(__name__)
@@ -30,102 +36,608 @@ def allowed_file(filename):
     """Check if file has allowed video extension."""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_audio(video_path):
+# Whisper expects 16 kHz mono float32 samples
+WHISPER_SAMPLE_RATE = 16000
+
+
+class AudioBuffer:
+    """Growable float32 sample buffer: capacity doubles when full, so appending frames never re-copies the whole track."""
+
+    def __init__(self, capacity):
+        self._data = np.empty(max(int(capacity), 1), dtype=np.float32)
+        self.size = 0
+
+    def append(self, samples):
+        end = self.size + len(samples)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=np.float32)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:end] = samples
+        self.size = end
+
+    def array(self):
+        """The samples appended so far (a view, not a copy)."""
+        return self._data[:self.size]
+
+
+def resampled_frames(resampler, frame):
+    """Output frames of resampler for frame (None flushes); PyAV < 9 returns a single frame or None instead of a list."""
+    frames = resampler.resample(frame)
+    if frames is None:
+        return []
+    return frames if isinstance(frames, list) else [frames]
+
+
+def extract_audio(video_path, sample_rate=WHISPER_SAMPLE_RATE):
     """
-    Extract the audio stream from the video file
-    and save as a .wav file using PyAV.
+    Decode the first audio stream of the video with PyAV and return it as a mono float32 numpy array at sample_rate,
+    ready for Whisper. Frames are resampled inside the decode loop and written into a buffer sized from the
+    stream duration, so neither the native-rate multichannel track nor a WAV file is ever materialized.
     """
     import av
     try:
         # Open the video file using PyAV
-        container = av.open(video_path)
-        audio_stream = None
-        #Iterate through the streams to find the audio stream
-        for stream in container.streams:
+        with av.open(video_path) as container:
             # Find the first audio stream
-            if stream.type == 'audio':
-                audio_stream = stream
-                break
+            audio_stream = next((stream for stream in container.streams if stream.type == 'audio'), None)
+            if not audio_stream:
+                raise ValueError("No audio stream found in the video.")
 
-        if not audio_stream:
-            raise ValueError("No audio stream found in the video.")
+            # Preallocate for the expected length (plus a second of slack); the buffer grows if that is short
+            if audio_stream.duration and audio_stream.time_base:
+                seconds = float(audio_stream.duration * audio_stream.time_base)
+            elif container.duration:
+                seconds = container.duration / av.time_base
+            else:
+                seconds = 60
+            buffer = AudioBuffer((seconds + 1) * sample_rate)
 
-        sample_rate = audio_stream.codec_context.sample_rate
-        if not sample_rate:
-            raise ValueError("Failed to retrieve sample rate.")
+            resampler = av.AudioResampler(format='flt', layout='mono', rate=sample_rate)
+            for frame in container.decode(audio_stream):
+                for resampled in resampled_frames(resampler, frame):
+                    buffer.append(resampled.to_ndarray().reshape(-1))
+            # Drain the samples still held by the resampler
+            for resampled in resampled_frames(resampler, None):
+                buffer.append(resampled.to_ndarray().reshape(-1))
 
-        samples = []
-        #Decode the audio frames
-        for frame in container.decode(audio=0):
-            #Convert the audio frame to a numpy array
-            arr = frame.to_ndarray()
-            samples.append(arr)
-
-        if not samples:
+        if not buffer.size:
             raise ValueError("No audio frames could be decoded.")
-        
-        #Concatenate the audio frames into a single numpy array
-        audio_array = np.concatenate(samples, axis=0)
-        #Reshape the audio array to have the correct number of channels
-        audio_array = audio_array.reshape(-1, audio_stream.channels)
-
-        temp_dir = tempfile.gettempdir()
-        # Create a temporary audio file path
-        audio_path = os.path.join(temp_dir, "temp_audio.wav")
-        # Write the audio array to a .wav file
-        sf.write(audio_path, audio_array, sample_rate)
-        return audio_path
+        logger.debug(f"Extracted {buffer.size / sample_rate:.1f}s of audio at {sample_rate} Hz")
+        return buffer.array()
     except Exception as e:
         logger.error(f"Audio extraction failed: {str(e)}")
         raise
 
-def transcribe_audio_whisper(audio_path):
+# ---------------------------
+# Whisper Model Registry
+# ---------------------------
+# Whisper sizes a request may choose, and the one used when it does not ("medium" balances speed and accuracy)
+WHISPER_MODEL_SIZES = ('tiny', 'base', 'small', 'medium')
+WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'medium')
+# Comma-separated sizes loaded in the background at server startup; set to an empty string to load on first use
+WHISPER_PRELOAD = os.environ.get('WHISPER_PRELOAD', WHISPER_MODEL_SIZE)
+# Torch device for the models (default: whisper picks CUDA when available, otherwise CPU)
+WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE') or None
+
+
+class WhisperModelRegistry:
+    """
+    Loads each Whisper model size at most once per process and shares it between requests.
+    Concurrent first requests for a size wait for a single load instead of each loading their own copy.
+    Use of a model is serialized by a per-size lock: transcribe() installs temporary hooks on the shared
+    torch modules, so two decodes on one instance would interfere.
+    """
+
+    def __init__(self, default_size=WHISPER_MODEL_SIZE, device=WHISPER_DEVICE, loader=None):
+        self.default_size = self.resolve_size(default_size)
+        self.device = device
+        self._loader = loader or whisper.load_model
+        self._models = {}
+        self._lock = threading.Lock()
+        self._load_locks = {size: threading.Lock() for size in WHISPER_MODEL_SIZES}
+        self._use_locks = {size: threading.Lock() for size in WHISPER_MODEL_SIZES}
+
+    @staticmethod
+    def resolve_size(size):
+        """Validate a requested size (None or '' means the default); raises ValueError for unknown sizes."""
+        size = (size or WHISPER_MODEL_SIZE).strip().lower()
+        if size not in WHISPER_MODEL_SIZES:
+            raise ValueError(f"Unknown Whisper model size {size!r}. Choose one of: {', '.join(WHISPER_MODEL_SIZES)}")
+        return size
+
+    def get(self, size=None):
+        """Return the loaded model for size, loading it on first use."""
+        size = self.resolve_size(size or self.default_size)
+        model = self._models.get(size)
+        if model is not None:
+            return model
+        with self._load_locks[size]:
+            model = self._models.get(size)
+            if model is None:
+                logger.info(f"Loading Whisper model '{size}'...")
+                model = self._loader(size, device=self.device)
+                with self._lock:
+                    self._models[size] = model
+                logger.info(f"Whisper model '{size}' loaded")
+        return model
+
+    @contextmanager
+    def acquire(self, size=None):
+        """Context manager yielding the model for size with exclusive use of it for the duration."""
+        size = self.resolve_size(size or self.default_size)
+        model = self.get(size)
+        with self._use_locks[size]:
+            yield model
+
+    def preload(self, sizes):
+        for size in sizes:
+            try:
+                self.get(size)
+            except Exception as e:
+                logger.error(f"Preloading Whisper model '{size}' failed: {str(e)}")
+
+    def loaded_sizes(self):
+        with self._lock:
+            return sorted(self._models, key=WHISPER_MODEL_SIZES.index)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_whisper_registry():
+    """Return the process-wide WhisperModelRegistry."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = WhisperModelRegistry()
+        return _default_registry
+
+
+def preload_whisper_models(sizes=None, background=True):
+    """
+    Warm up the registry with sizes (default: WHISPER_PRELOAD) so the first upload does not pay for the load.
+    With background=True the load runs on a daemon thread and startup is not delayed; requests arriving
+    meanwhile wait for the load instead of starting a second one.
+    """
+    if sizes is None:
+        sizes = [size for size in WHISPER_PRELOAD.split(',') if size.strip()]
+    if not sizes:
+        return None
+    registry = get_whisper_registry()
+    if not background:
+        registry.preload(sizes)
+        return None
+    thread = threading.Thread(target=registry.preload, args=(sizes,), name='whisper-preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def requested_model_size():
+    """Whisper size chosen by the request ('model_size' form field or query parameter), validated."""
+    return WhisperModelRegistry.resolve_size(request.values.get('model_size'))
+
+
+def normalize_audio(audio):
+    """Peak-normalize samples to [-1, 1] in place (same scaling as librosa.util.normalize)."""
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    if peak > 0:
+        audio *= 1.0 / peak
+    return audio
+
+
+# ---------------------------
+# Voice Activity Detection
+# ---------------------------
+# Before transcription, 30 ms frames are classified as speech when they are loud enough relative to the
+# recording's noise floor and most of their spectral energy lies in the speech band (which rejects hum and
+# much of the background music). Only the speech regions, padded and with short pauses bridged, are passed
+# to Whisper; a SpeechMap translates the resulting timestamps back onto the original recording.
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '1') != '0'
+VAD_FRAME_SECONDS = 0.03
+# Speech must be this many dB above the noise floor (10th percentile of frame energy), clamped to the range below
+VAD_ENERGY_THRESHOLD_DB = 12.0
+VAD_MIN_THRESHOLD_DB = -55.0
+VAD_MAX_THRESHOLD_DB = -30.0
+VAD_SPEECH_BAND_HZ = (300, 3400)
+VAD_SPEECH_BAND_RATIO = 0.4
+VAD_MIN_SPEECH_SECONDS = 0.25
+VAD_MIN_SILENCE_SECONDS = 0.6
+VAD_PAD_SECONDS = 0.2
+# Silence inserted between kept regions, so Whisper still sees a pause where audio was removed
+VAD_JOIN_GAP_SECONDS = 0.25
+# Frames per FFT block, bounding the memory used for spectra
+VAD_BLOCK_FRAMES = 4096
+
+
+def frame_features(audio, sample_rate=WHISPER_SAMPLE_RATE, frame_seconds=VAD_FRAME_SECONDS):
+    """Per-frame energy (dBFS) and the fraction of each frame's spectral energy inside VAD_SPEECH_BAND_HZ."""
+    frame = int(frame_seconds * sample_rate)
+    count = len(audio) // frame
+    frames = audio[:count * frame].reshape(count, frame)
+    energy_db = 10 * np.log10(np.einsum('ij,ij->i', frames, frames) / frame + 1e-12)
+    freqs = np.fft.rfftfreq(frame, 1.0 / sample_rate)
+    band = (freqs >= VAD_SPEECH_BAND_HZ[0]) & (freqs <= VAD_SPEECH_BAND_HZ[1])
+    window = np.hanning(frame).astype(np.float32)
+    band_ratio = np.empty(count)
+    for start in range(0, count, VAD_BLOCK_FRAMES):
+        power = np.abs(np.fft.rfft(frames[start:start + VAD_BLOCK_FRAMES] * window, axis=1)) ** 2
+        band_ratio[start:start + VAD_BLOCK_FRAMES] = power[:, band].sum(axis=1) / np.maximum(power.sum(axis=1), 1e-12)
+    return energy_db, band_ratio
+
+
+def detect_speech(audio, sample_rate=WHISPER_SAMPLE_RATE):
+    """Return the speech regions of audio as a list of (start, end) sample offsets, in order and non-overlapping."""
+    energy_db, band_ratio = frame_features(audio, sample_rate)
+    if not len(energy_db):
+        return []
+    threshold = np.clip(np.percentile(energy_db, 10) + VAD_ENERGY_THRESHOLD_DB, VAD_MIN_THRESHOLD_DB, VAD_MAX_THRESHOLD_DB)
+    is_speech = (energy_db > threshold) & (band_ratio >= VAD_SPEECH_BAND_RATIO)
+    # Start/end frame of each run of speech frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0]))))
+    frame = int(VAD_FRAME_SECONDS * sample_rate)
+    regions = []
+    for start, end in edges.reshape(-1, 2) * frame:
+        if regions and start - regions[-1][1] < VAD_MIN_SILENCE_SECONDS * sample_rate:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    pad = int(VAD_PAD_SECONDS * sample_rate)
+    padded = []
+    for start, end in regions:
+        if end - start < VAD_MIN_SPEECH_SECONDS * sample_rate:
+            continue
+        start, end = max(0, start - pad), min(len(audio), end + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((int(start), int(end)))
+    return padded
+
+
+class SpeechMap:
+    """Maps times in the speech-only audio built by remove_silence back to times in the original recording."""
+
+    def __init__(self, regions, sample_rate=WHISPER_SAMPLE_RATE, gap_samples=0):
+        self.sample_rate = sample_rate
+        self.source_starts = np.array([start for start, _ in regions], dtype=np.int64)
+        self.lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self.speech_starts = np.concatenate(([0], np.cumsum(self.lengths + gap_samples)[:-1])).astype(np.int64)
+        self.speech_seconds = float(self.lengths.sum()) / sample_rate
+
+    def to_source(self, seconds):
+        """Original-recording time for a time in the speech-only audio (times inside an inserted gap map to the region end)."""
+        if not len(self.lengths):
+            return seconds
+        sample = seconds * self.sample_rate
+        index = max(0, int(np.searchsorted(self.speech_starts, sample, side='right')) - 1)
+        offset = min(max(sample - self.speech_starts[index], 0), self.lengths[index])
+        return float(self.source_starts[index] + offset) / self.sample_rate
+
+    def remap_segments(self, segments):
+        remapped = []
+        for segment in segments:
+            moved = dict(segment, start=self.to_source(segment['start']), end=self.to_source(segment['end']))
+            if segment.get('words'):
+                moved['words'] = [
+                    dict(word, start=self.to_source(word['start']), end=self.to_source(word['end']))
+                    for word in segment['words']
+                ]
+            remapped.append(moved)
+        return remapped
+
+
+def remove_silence(audio, sample_rate=WHISPER_SAMPLE_RATE):
+    """Return (speech-only audio, SpeechMap): the detected speech regions joined by short silent gaps."""
+    regions = detect_speech(audio, sample_rate)
+    gap = int(VAD_JOIN_GAP_SECONDS * sample_rate)
+    speech_map = SpeechMap(regions, sample_rate, gap_samples=gap)
+    buffer = AudioBuffer(int(speech_map.lengths.sum()) + gap * len(regions))
+    for i, (start, end) in enumerate(regions):
+        if i:
+            buffer.append(np.zeros(gap, dtype=np.float32))
+        buffer.append(audio[start:end])
+    return buffer.array(), speech_map
+
+
+# ---------------------------
+# Chunked Parallel Transcription
+# ---------------------------
+# Long recordings are cut into chunks of at most TRANSCRIBE_CHUNK_SECONDS, each cut placed at the quietest
+# 20 ms frame in the TRANSCRIBE_SILENCE_SEARCH_SECONDS before the limit, so no word straddles a boundary.
+# Chunks do not overlap, which means every word is transcribed exactly once; they are decoded on a pool of
+# worker processes that each hold their own model, and the segments are shifted back onto the global timeline.
+TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_SECONDS', '300'))
+TRANSCRIBE_SILENCE_SEARCH_SECONDS = float(os.environ.get('TRANSCRIBE_SILENCE_SEARCH_SECONDS', '15'))
+# Audio at least this long is transcribed in chunks when more than one worker is configured
+TRANSCRIBE_PARALLEL_MIN_SECONDS = float(os.environ.get('TRANSCRIBE_PARALLEL_MIN_SECONDS', '600'))
+# Worker processes for chunked transcription; each loads its own copy of the model, so this also bounds memory
+TRANSCRIBE_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', str(min(4, os.cpu_count() or 1))))
+SILENCE_FRAME_SECONDS = 0.02
+
+
+def transcription_workers(device=None):
+    """
+    Worker processes for chunked transcription on device (default WHISPER_DEVICE): TRANSCRIBE_WORKERS on the CPU,
+    but 1 on a GPU, where every worker's model copy would load onto the same device next to the registry's copy.
+    """
+    device = device or WHISPER_DEVICE
+    if device is None:
+        import torch  # Whisper's own default: CUDA when available
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return TRANSCRIBE_WORKERS if device == 'cpu' else 1
+
+
+def find_chunk_boundaries(audio, sample_rate=WHISPER_SAMPLE_RATE, max_seconds=TRANSCRIBE_CHUNK_SECONDS,
+                          search_seconds=TRANSCRIBE_SILENCE_SEARCH_SECONDS):
+    """
+    Return sample offsets [0, ..., len(audio)] splitting audio into chunks of at most max_seconds.
+    Each cut is at the centre of the lowest-energy frame (the latest one, on ties) in the search_seconds before
+    the limit; the search covers at most the second half of the chunk, so every chunk is at least half the maximum.
+    """
+    max_length = int(max_seconds * sample_rate)
+    frame = max(1, int(SILENCE_FRAME_SECONDS * sample_rate))
+    boundaries = [0]
+    start = 0
+    while len(audio) - start > max_length:
+        limit = start + max_length
+        window_start = limit - int(min(search_seconds, max_seconds / 2) * sample_rate)
+        frames = (limit - window_start) // frame
+        if frames:
+            window = audio[window_start:window_start + frames * frame].reshape(frames, frame)
+            energy = np.einsum('ij,ij->i', window, window)
+            quietest = frames - 1 - int(np.argmin(energy[::-1]))
+            cut = window_start + quietest * frame + frame // 2
+        else:
+            cut = limit
+        boundaries.append(cut)
+        start = cut
+    boundaries.append(len(audio))
+    return boundaries
+
+
+def shift_segment(segment, offset_seconds):
+    """Copy of a Whisper segment (and its word timings) moved offset_seconds later."""
+    shifted = dict(segment, start=segment['start'] + offset_seconds, end=segment['end'] + offset_seconds)
+    if segment.get('words'):
+        shifted['words'] = [
+            dict(word, start=word['start'] + offset_seconds, end=word['end'] + offset_seconds)
+            for word in segment['words']
+        ]
+    return shifted
+
+
+def merge_chunk_segments(chunk_segments, offsets_seconds):
+    """Concatenate per-chunk segment lists in order, on the global timeline, with ids renumbered."""
+    merged = []
+    for segments, offset in zip(chunk_segments, offsets_seconds):
+        for segment in segments:
+            merged.append(dict(shift_segment(segment, offset), id=len(merged)))
+    return merged
+
+
+_transcription_pools = {}
+_transcription_pools_lock = threading.Lock()
+
+
+def get_transcription_pool(model_size, workers=None):
+    """
+    Return the process pool for model_size (workers defaults to transcription_workers()), started on first use
+    and kept for the life of the server so workers load their model once. Workers are spawned rather than forked,
+    which torch requires; spawn re-imports the parent's main module in every worker, which is why server.py
+    keeps its imports and app setup out of module level.
+    """
+    with _transcription_pools_lock:
+        pool = _transcription_pools.get(model_size)
+        if pool is None:
+            workers = workers or transcription_workers()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=transcribe_worker.load_worker_model,
+                initargs=(model_size, WHISPER_DEVICE, threads)
+            )
+            _transcription_pools[model_size] = pool
+        return pool
+
+
+def discard_transcription_pool(model_size, pool):
+    """Forget a broken pool (if it is still the cached one for model_size) and shut it down without waiting."""
+    with _transcription_pools_lock:
+        if _transcription_pools.get(model_size) is pool:
+            del _transcription_pools[model_size]
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def transcribe_in_chunks(audio, pool, sample_rate=WHISPER_SAMPLE_RATE, max_seconds=TRANSCRIBE_CHUNK_SECONDS):
+    """Split audio at silences, transcribe the chunks on pool in parallel and return the merged segments."""
+    boundaries = find_chunk_boundaries(audio, sample_rate=sample_rate, max_seconds=max_seconds)
+    chunks = [audio[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
+    logger.debug(f"Transcribing {len(audio) / sample_rate:.0f}s of audio in {len(chunks)} chunks")
+    chunk_segments = list(pool.map(transcribe_worker.transcribe_chunk, chunks))
+    return merge_chunk_segments(chunk_segments, [start / sample_rate for start in boundaries[:-1]])
+
+
+def transcribe_on_pool(audio, model_size, max_seconds=TRANSCRIBE_CHUNK_SECONDS):
+    """
+    Chunked transcription on the shared pool for model_size. A pool that breaks (a worker was killed, or the
+    model failed to load in its initializer) is discarded and the audio retried once on a fresh pool.
+    Returns the merged segments, or None when the fresh pool breaks too.
+    """
+    for attempt in range(2):
+        pool = get_transcription_pool(model_size)
+        try:
+            return transcribe_in_chunks(audio, pool, max_seconds=max_seconds)
+        except BrokenProcessPool as e:
+            logger.warning(f"Transcription pool for '{model_size}' broke (attempt {attempt + 1}): {str(e)}")
+            discard_transcription_pool(model_size, pool)
+    return None
+
+
+def transcribe_audio_segments(audio, model_size=None, parallel=None, vad=VAD_ENABLED):
+    """
+    Transcribe the audio and return {'segments', 'duration_seconds', 'speech_seconds', 'skipped_seconds'}.
+    Segments are Whisper segments with start/end times in seconds on the original recording.
+    With vad, only the detected speech regions are transcribed (see remove_silence).
+    parallel=None chunks speech longer than TRANSCRIBE_PARALLEL_MIN_SECONDS across transcription_workers() processes;
+    True/False force either path.
+    """
+    model_size = WhisperModelRegistry.resolve_size(model_size)
+    duration = len(audio) / WHISPER_SAMPLE_RATE
+    speech_map = None
+    if vad:
+        audio, speech_map = remove_silence(audio)
+        logger.info(f"VAD kept {speech_map.speech_seconds:.1f}s of speech and skipped "
+                    f"{duration - speech_map.speech_seconds:.1f}s of {duration:.1f}s")
+    if parallel is None:
+        parallel = transcription_workers() > 1 and len(audio) >= TRANSCRIBE_PARALLEL_MIN_SECONDS * WHISPER_SAMPLE_RATE
+    segments = [] if not len(audio) else None
+    if segments is None and parallel:
+        segments = transcribe_on_pool(audio, model_size)
+        if segments is None:
+            logger.warning(f"Falling back to single-process transcription with the shared '{model_size}' model")
+    if segments is None:
+        # Transcribe the audio using the shared Whisper model for this size
+        with get_whisper_registry().acquire(model_size) as model_whisper:
+            result = model_whisper.transcribe(audio, verbose=True, **WHISPER_TRANSCRIBE_OPTIONS)
+        segments = result.get('segments') or [
+            {'id': 0, 'start': 0.0, 'end': len(audio) / WHISPER_SAMPLE_RATE, 'text': result.get('text', "")}
+        ]
+    speech_seconds = duration
+    if speech_map is not None:
+        segments = speech_map.remap_segments(segments)
+        speech_seconds = speech_map.speech_seconds
+    return {
+        'segments': segments,
+        'duration_seconds': round(duration, 2),
+        'speech_seconds': round(speech_seconds, 2),
+        'skipped_seconds': round(duration - speech_seconds, 2),
+    }
+
+
+def format_transcript(segments):
+    """Transcript text from Whisper segments."""
+    formatted_text = ""
+    for seg in segments:
+        formatted_text += seg['text'] + " "
+    return formatted_text.strip()
+
+
+def transcribe_audio(audio, model_size=None, parallel=None):
     """
     Transcribe the audio using OpenAI's Whisper model.
     Whisper is a state-of-the-art speech recognition system.
+    audio is the 16 kHz mono float32 array from extract_audio (normalized in place).
+    model_size is one of WHISPER_MODEL_SIZES (default WHISPER_MODEL_SIZE); models come from the shared registry.
+    Silence is skipped and long recordings are transcribed in parallel chunks (see transcribe_audio_segments).
+    Returns the transcribe_audio_segments result with the formatted 'text' added.
     """
     try:
-        logger.debug("Loading audio file...")
-        # Load audio file using librosa
-        audio, sr = librosa.load(audio_path, sr=16000, mono=True)
         logger.debug("Preprocessing audio...")
-        audio = librosa.util.normalize(audio)
-        logger.debug("Loading Whisper model...")
-         # Load the Whisper model ("medium" for a balance of speed and accuracy)
-        model_whisper = whisper.load_model("medium") 
+        audio = normalize_audio(audio)
         logger.debug("Starting transcription...")
-        # Transcribe the audio using Whisper
-        result = model_whisper.transcribe(
-            audio,
-            fp16=False,
-            # Specify the language of the audio (e.g., "en" for English)
-            language='en',
-            initial_prompt="This is a clear speech recording.",
-            word_timestamps=True,
-            verbose=True,
-            condition_on_previous_text=True,
-            temperature=0.0
-        )
+        transcript = transcribe_audio_segments(audio, model_size=model_size, parallel=parallel)
         logger.debug("Formatting transcription...")
-        formatted_text = ""
-        if 'segments' in result:
-            for seg in result['segments']:
-                formatted_text += seg['text'] + " "
-        else:
-            formatted_text = result.get('text', "")
-        logger.debug(f"Transcription completed with {len(formatted_text)} characters")
-        return formatted_text.strip()
+        transcript['text'] = format_transcript(transcript['segments'])
+        logger.debug(f"Transcription completed with {len(transcript['text'])} characters")
+        return transcript
     except Exception as e:
         logger.error(f"Transcription failed: {str(e)}")
         raise RuntimeError(f"Transcription failed: {str(e)}")
+
+
+def transcribe_audio_whisper(audio, model_size=None, parallel=None):
+    """Transcribe the audio and return only the transcript text (see transcribe_audio)."""
+    return transcribe_audio(audio, model_size=model_size, parallel=parallel)['text']
+
+
+# ---------------------------
+# Transcript Registry
+# ---------------------------
+# Transcripts are kept in memory under an id so the summary is made from the exact text Whisper produced,
+# and the transcription PDF is only rendered when a client asks for it (GET /videosummarizer/transcripts/<id>/pdf).
+TRANSCRIPT_MAX_ENTRIES = int(os.environ.get('TRANSCRIPT_MAX_ENTRIES', '100'))
+
+
+class TranscriptRegistry:
+    """Bounded in-memory store of recent transcripts (oldest evicted first), with their lazily rendered PDFs."""
+
+    def __init__(self, max_entries=TRANSCRIPT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes PDF rendering, so concurrent first requests for a PDF do not write the same file twice
+        self._render_lock = threading.Lock()
+
+    def add(self, transcript):
+        """Store a transcript dictionary ('text', 'segments', ...) and return its id."""
+        transcript_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[transcript_id] = dict(transcript, id=transcript_id, pdf_path=None)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._remove_pdf(evicted)
+        return transcript_id
+
+    def get(self, transcript_id):
+        with self._lock:
+            return self._entries.get(transcript_id)
+
+    def pdf_path(self, transcript_id, render=None):
+        """
+        Path of the transcript's PDF, rendering it on first request (render defaults to generate_pdf_transcription).
+        Returns None for an unknown id, including one evicted while its PDF was being rendered.
+        """
+        entry = self.get(transcript_id)
+        if entry is None:
+            return None
+        with self._render_lock:
+            if entry['pdf_path'] is None or not os.path.exists(entry['pdf_path']):
+                path = os.path.join(tempfile.gettempdir(), f"video_transcription_{transcript_id}.pdf")
+                rendered = (render or generate_pdf_transcription)(entry['text'], pdf_path=path)
+                # Rendering runs outside _lock; publish the path only if add() has not evicted the entry meanwhile,
+                # since eviction (which removes the entry's PDF) has then already happened
+                with self._lock:
+                    registered = self._entries.get(transcript_id) is entry
+                    if registered:
+                        entry['pdf_path'] = rendered
+                if not registered:
+                    self._remove_pdf({'pdf_path': rendered})
+                    return None
+            return entry['pdf_path']
+
+    @staticmethod
+    def _remove_pdf(entry):
+        if entry.get('pdf_path') and os.path.exists(entry['pdf_path']):
+            try:
+                os.remove(entry['pdf_path'])
+            except OSError as e:
+                logger.error(f"Error removing transcript PDF {entry['pdf_path']}: {e}")
+
+
+_default_transcripts = None
+_default_transcripts_lock = threading.Lock()
+
+
+def get_transcript_registry():
+    """Return the process-wide TranscriptRegistry."""
+    global _default_transcripts
+    with _default_transcripts_lock:
+        if _default_transcripts is None:
+            _default_transcripts = TranscriptRegistry()
+        return _default_transcripts
+
+
 # Generate a PDF file containing the transcription text
-def generate_pdf_transcription(transcription_text):
+def generate_pdf_transcription(transcription_text, pdf_path=None):
     """
     Takes a transcription text and generates a PDF file with the text.
     Uses ReportLab for PDF generation.
     """
     try:
-        pdf_path = os.path.join(tempfile.gettempdir(), "video_transcription.pdf")
+        pdf_path = pdf_path or os.path.join(tempfile.gettempdir(), "video_transcription.pdf")
         # # Create a SimpleDocTemplate object with margins and page size
         doc = SimpleDocTemplate(
             pdf_path,
@@ -164,23 +676,6 @@ def generate_pdf_transcription(transcription_text):
         logger.error(f"PDF generation error: {e}")
         raise RuntimeError(f"PDF generation error: {e}")
 
-# Read text content from a PDF file
-def read_pdf_content(pdf_path):
-    """Reads text content from a PDF file."""
-    text = ""
-    try:
-        # Open the PDF file in binary mode
-        with open(pdf_path, 'rb') as f:
-            # Create a PdfReader object
-            reader = PdfReader(f)
-            for page in reader.pages:
-                # Extract the text from the page and append it to the text variable
-                text += page.extract_text() or ""
-        return text
-    except Exception as e:
-        logger.error(f"Error reading PDF: {e}")
-        raise
-
 # Generate a summary PDF file
 def generate_summary_pdf(summary_text, title="Video Summary"):
     """Generate a PDF file containing the summary.
@@ -220,46 +715,28 @@ def generate_summary_pdf(summary_text, title="Video Summary"):
         raise
 # Generate a summary of the video content using the Gemini API
 def summarize_video_with_gemini(text):
-    """  Generates a summary using Gemini API via a Node.js script.
-    This function calls an external Node.js script to interact with the Gemini API.
+    """  Generates a summary using Gemini API via the Gemini worker pool.
+    The long-lived worker (gemini_worker.js) avoids starting Node.js for every request.
     """
     try:
-        #Construct the path to the Node.js script
-        script_path = Path(__file__).parent / 'gemini_summarize.js'
-        if not script_path.exists():
-            logger.error(f"gemini_summarize.js not found at {script_path}")
-            return "Summary generation failed - missing script"
-
-        escaped_text = json.dumps(text)
-        result = subprocess.check_output(
-            ["node", str(script_path), escaped_text],
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            timeout=60
-        )
-
-        try:
-            response = json.loads(result)
-            if 'error' in response:
-                logger.error(f"Gemini summary error: {response['error']}")
-                return f"Summary error: {response['error']}"
-            return response.get('summary', 'No summary generated')
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON response: {result}")
-            return "Summary error: Invalid API response"
-    except subprocess.TimeoutExpired:
+        response = get_gemini_pool().request('summarize_video', text, timeout=60)
+        if 'error' in response:
+            logger.error(f"Gemini summary error: {response['error']}")
+            return f"Summary error: {response['error']}"
+        return response.get('summary', 'No summary generated')
+    except GeminiTimeoutError:
         logger.error("Gemini summary API call timed out")
         return "Summary generation timed out"
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error calling gemini_summarize.js: {e.output}")
-        return f"Summary failed: {e.output}"
+    except GeminiWorkerError as e:
+        logger.error(f"Error calling Gemini worker: {e}")
+        return f"Summary failed: {e}"
     except Exception as e:
         logger.error(f"Unexpected error in Gemini summary: {str(e)}")
         return f"Summary error: {str(e)}"
 
 # Route for video summarizer
 @video_summarizer_bp.route('/videosummarizer', methods=["POST"])
-@cross_origin()
+@cross_origin(expose_headers=['X-Transcript-Id'])
 def video_summarizer():
     """Handle video upload and generate summary (PDF) + store text."""
     try:
@@ -273,6 +750,11 @@ def video_summarizer():
         if not allowed_file(file.filename):
             return jsonify({"error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
 
+        try:
+            model_size = requested_model_size()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
         os.makedirs(upload_folder, exist_ok=True)
         filename = secure_filename(file.filename)
@@ -281,37 +763,34 @@ def video_summarizer():
         file.save(uploaded_path)
 
         try:
-            # Extract audio from video
-            audio_path = extract_audio(uploaded_path)
-            # Transcribe the audio using Whisper
-            transcription = transcribe_audio_whisper(audio_path)
-
-            # Generate a PDF file with the transcription text
-            pdf_path = generate_pdf_transcription(transcription)
-            # Read the text content from the PDF
-            pdf_text = read_pdf_content(pdf_path)
-
-            # Generate a summary using the Gemini API
-            gemini_summary = summarize_video_with_gemini(pdf_text)
+            # Extract the audio track from the video (16 kHz mono, in memory)
+            audio = extract_audio(uploaded_path)
+            # Transcribe the audio using Whisper; the transcript PDF is only rendered if it is requested later
+            transcript = transcribe_audio(audio, model_size=model_size)
+            transcript_id = get_transcript_registry().add(transcript)
+
+            # Generate a summary using the Gemini API, straight from the transcript text
+            gemini_summary = summarize_video_with_gemini(transcript['text'])
             logger.debug(f"Generated summary: {gemini_summary}")
 
             # Generate a PDF summary file
             summary_pdf_path = generate_summary_pdf(gemini_summary)
 
             # Clean up
-            for temp_file in [uploaded_path, audio_path, pdf_path]:
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                except Exception as cleanup_e:
-                    logger.error(f"Error cleaning up file {temp_file}: {cleanup_e}")
-
-            return send_file(
+            try:
+                if os.path.exists(uploaded_path):
+                    os.remove(uploaded_path)
+            except Exception as cleanup_e:
+                logger.error(f"Error cleaning up file {uploaded_path}: {cleanup_e}")
+
+            response = send_file(
                 summary_pdf_path,
                 as_attachment=True,
                 download_name="video_summary.pdf",
                 mimetype="application/pdf"
             )
+            response.headers['X-Transcript-Id'] = transcript_id
+            return response
 
         except Exception as process_e:
             logger.error(f"Error processing video: {str(process_e)}")
@@ -337,6 +816,11 @@ def extract_summary_text():
         if not allowed_file(file.filename):
             return jsonify({"error": f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
 
+        try:
+            model_size = requested_model_size()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
         os.makedirs(upload_folder, exist_ok=True)
 
@@ -346,21 +830,23 @@ def extract_summary_text():
         file.save(uploaded_path)
 
         try:
-            audio_path = extract_audio(uploaded_path)
-            transcription = transcribe_audio_whisper(audio_path)
-            pdf_path = generate_pdf_transcription(transcription)
-            pdf_text = read_pdf_content(pdf_path)
-            summary_text = summarize_video_with_gemini(pdf_text)
+            audio = extract_audio(uploaded_path)
+            transcript = transcribe_audio(audio, model_size=model_size)
+            transcript_id = get_transcript_registry().add(transcript)
+            summary_text = summarize_video_with_gemini(transcript['text'])
 
             # Clean up
-            for temp_file in [uploaded_path, audio_path, pdf_path]:
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                except Exception as cleanup_e:
-                    logger.error(f"Cleanup error: {cleanup_e}")
+            try:
+                if os.path.exists(uploaded_path):
+                    os.remove(uploaded_path)
+            except Exception as cleanup_e:
+                logger.error(f"Cleanup error: {cleanup_e}")
 
-            return jsonify({"text": summary_text})
+            return jsonify({
+                "text": summary_text,
+                "transcript_id": transcript_id,
+                "skipped_seconds": transcript['skipped_seconds']
+            })
 
         except Exception as process_e:
             logger.error(f"Error processing video: {str(process_e)}")
@@ -368,4 +854,355 @@ def extract_summary_text():
 
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# Routes for fetching a transcript produced by /videosummarizer or /extract_summary_text
+@video_summarizer_bp.route('/videosummarizer/transcripts/<transcript_id>', methods=['GET'])
+@cross_origin()
+def get_transcript(transcript_id):
+    """Return the transcript text, its timed segments and how much silence was skipped."""
+    transcript = get_transcript_registry().get(transcript_id)
+    if transcript is None:
+        return jsonify({"error": "Transcript not found"}), 404
+    return jsonify({key: value for key, value in transcript.items() if key != 'pdf_path'})
+
+@video_summarizer_bp.route('/videosummarizer/transcripts/<transcript_id>/pdf', methods=['GET'])
+@cross_origin()
+def get_transcript_pdf(transcript_id):
+    """Render (on first request) and return the transcription PDF."""
+    try:
+        pdf_path = get_transcript_registry().pdf_path(transcript_id)
+        if pdf_path is None:
+            return jsonify({"error": "Transcript not found"}), 404
+        # send_file opens the PDF right away, so a later eviction only unlinks it and the download completes
+        return send_file(
+            pdf_path,
+            as_attachment=True,
+            download_name="video_transcription.pdf",
+            mimetype="application/pdf"
+        )
+    except FileNotFoundError:
+        # Evicted between rendering and opening
+        return jsonify({"error": "Transcript not found"}), 404
+    except Exception as e:
+        logger.error(f"Error generating transcript PDF: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Unit Tests
+# ---------------------------
+
+class CountingLoader:
+    """Stand-in for whisper.load_model that records each load and takes a moment like the real one."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.loads = []
+        self._lock = threading.Lock()
+
+    def __call__(self, size, device=None):
+        with self._lock:
+            self.loads.append(size)
+        threading.Event().wait(self.delay)
+        return object()
+
+
+class TestWhisperModelRegistry(unittest.TestCase):
+
+    def test_each_size_loads_once_under_concurrency(self):
+        loader = CountingLoader()
+        registry = WhisperModelRegistry(default_size='base', loader=loader)
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(registry.get())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(loader.loads, ['base'])
+        self.assertEqual(len({id(model) for model in models}), 1)
+        registry.get('tiny')
+        self.assertEqual(registry.loaded_sizes(), ['tiny', 'base'])
+
+    def test_resolve_size(self):
+        self.assertEqual(WhisperModelRegistry.resolve_size(' Small '), 'small')
+        self.assertEqual(WhisperModelRegistry.resolve_size(None), WHISPER_MODEL_SIZE)
+        with self.assertRaises(ValueError):
+            WhisperModelRegistry.resolve_size('large-v3')
+
+    def test_acquire_serializes_use_of_a_model(self):
+        registry = WhisperModelRegistry(loader=CountingLoader(delay=0))
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def use():
+            with registry.acquire('tiny'):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                threading.Event().wait(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=use) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(peak[0], 1)
+
+    def test_preload_continues_after_a_failed_size(self):
+        loads = []
+
+        def loader(size, device=None):
+            if size == 'small':
+                raise RuntimeError("out of memory")
+            loads.append(size)
+            return object()
+
+        registry = WhisperModelRegistry(loader=loader)
+        registry.preload(['small', 'tiny'])
+        self.assertEqual(registry.loaded_sizes(), ['tiny'])
+
+
+class TestAudioBuffer(unittest.TestCase):
+
+    def test_append_grows_and_keeps_order(self):
+        buffer = AudioBuffer(4)
+        chunks = [np.arange(start, start + 3, dtype=np.float32) for start in range(0, 30, 3)]
+        for chunk in chunks:
+            buffer.append(chunk)
+        np.testing.assert_array_equal(buffer.array(), np.arange(30, dtype=np.float32))
+        self.assertEqual(buffer.array().dtype, np.float32)
+
+    def test_normalize_audio(self):
+        audio = np.array([0.1, -0.5, 0.25], dtype=np.float32)
+        np.testing.assert_allclose(normalize_audio(audio), [0.2, -1.0, 0.5])
+        self.assertEqual(len(normalize_audio(np.zeros(0, dtype=np.float32))), 0)
+
+
+class FakeChunkModel:
+    """Returns one segment per chunk spanning the whole chunk, with one word per second."""
+
+    def transcribe(self, audio, **options):
+        seconds = len(audio) / WHISPER_SAMPLE_RATE
+        words = [{'word': f"w{i}", 'start': float(i), 'end': i + 0.5} for i in range(int(seconds))]
+        return {'segments': [{'id': 0, 'start': 0.0, 'end': seconds, 'text': f"{seconds:.2f}s", 'words': words}]}
+
+
+class BrokenPool:
+    """Process pool stand-in whose workers have died."""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def map(self, fn, *iterables):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+class TestChunkedTranscription(unittest.TestCase):
+
+    def speech_with_pauses(self, seconds, pauses):
+        """A loud tone with silent gaps at the given (start, end) second ranges."""
+        audio = np.sin(np.arange(int(seconds * WHISPER_SAMPLE_RATE)) * 0.3).astype(np.float32)
+        for start, end in pauses:
+            audio[int(start * WHISPER_SAMPLE_RATE):int(end * WHISPER_SAMPLE_RATE)] = 0
+        return audio
+
+    def test_boundaries_fall_in_silences_and_bound_chunk_length(self):
+        audio = self.speech_with_pauses(40, [(8.0, 8.3), (17.0, 17.2), (26.5, 26.8)])
+        boundaries = find_chunk_boundaries(audio, max_seconds=10, search_seconds=5)
+        self.assertEqual(boundaries[0], 0)
+        self.assertEqual(boundaries[-1], len(audio))
+        cuts = [b / WHISPER_SAMPLE_RATE for b in boundaries[1:-1]]
+        for cut, (start, end) in zip(cuts, [(8.0, 8.3), (17.0, 17.2), (26.5, 26.8)]):
+            self.assertTrue(start <= cut <= end, cut)
+        self.assertTrue(all(b - a <= 10 * WHISPER_SAMPLE_RATE for a, b in zip(boundaries, boundaries[1:])))
+        self.assertEqual(find_chunk_boundaries(audio[:WHISPER_SAMPLE_RATE], max_seconds=10), [0, WHISPER_SAMPLE_RATE])
+
+    def test_chunks_are_stitched_on_the_global_timeline(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import patch
+        audio = self.speech_with_pauses(25, [(9.0, 9.5), (18.0, 18.5)])
+        with patch.object(transcribe_worker, 'worker_model', FakeChunkModel()):
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                segments = transcribe_in_chunks(audio, pool, max_seconds=10)
+        boundaries = find_chunk_boundaries(audio, max_seconds=10)
+        self.assertEqual([seg['id'] for seg in segments], [0, 1, 2])
+        self.assertEqual([seg['start'] for seg in segments], [b / WHISPER_SAMPLE_RATE for b in boundaries[:-1]])
+        # Consecutive chunks meet exactly: nothing is transcribed twice or skipped
+        self.assertEqual([seg['end'] for seg in segments[:-1]], [seg['start'] for seg in segments[1:]])
+        self.assertEqual(segments[1]['words'][0]['start'], segments[1]['start'])
+
+    def test_one_worker_on_a_gpu(self):
+        self.assertEqual(transcription_workers('cuda'), 1)
+        self.assertEqual(transcription_workers('cuda:1'), 1)
+        self.assertEqual(transcription_workers('cpu'), TRANSCRIBE_WORKERS)
+
+    def test_broken_pool_is_replaced_once_then_falls_back(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import patch
+        global _default_registry
+        audio = self.speech_with_pauses(25, [(9.0, 9.5), (18.0, 18.5)])
+        broken = BrokenPool()
+        _transcription_pools['tiny'] = broken
+        try:
+            # The cached pool broke: it is shut down and the audio is retried on a fresh pool
+            with patch('__main__.WHISPER_DEVICE', 'cpu'), \
+                    patch('__main__.ProcessPoolExecutor', side_effect=lambda **kwargs: ThreadPoolExecutor(max_workers=2)), \
+                    patch.object(transcribe_worker, 'worker_model', FakeChunkModel()):
+                segments = transcribe_on_pool(audio, 'tiny', max_seconds=10)
+            self.assertEqual(len(segments), 3)
+            self.assertTrue(broken.shut_down)
+            self.assertIsNot(_transcription_pools['tiny'], broken)
+            _transcription_pools.pop('tiny').shutdown()
+
+            # Fresh pools keep breaking: the shared registry model transcribes the audio in one call
+            previous, _default_registry = _default_registry, WhisperModelRegistry(loader=lambda size, device=None: FakeChunkModel())
+            try:
+                with patch('__main__.WHISPER_DEVICE', 'cpu'), \
+                        patch('__main__.ProcessPoolExecutor', side_effect=lambda **kwargs: BrokenPool()):
+                    result = transcribe_audio_segments(audio, model_size='tiny', parallel=True, vad=False)
+            finally:
+                _default_registry = previous
+            self.assertEqual([(seg['start'], seg['end']) for seg in result['segments']], [(0.0, 25.0)])
+            self.assertNotIn('tiny', _transcription_pools)
+        finally:
+            _transcription_pools.pop('tiny', None)
+
+
+class TestVoiceActivityDetection(unittest.TestCase):
+
+    def recording(self):
+        """1.5 s and 1 s of speech-band tones between near-silence, then 2 s of loud 60 Hz hum."""
+        rate = WHISPER_SAMPLE_RATE
+        t = np.arange(int(10.5 * rate)) / rate
+        audio = (np.random.RandomState(0).randn(len(t)) * 1e-4).astype(np.float32)
+        for start, end in [(2.0, 3.5), (6.5, 7.5)]:
+            span = (t >= start) & (t < end)
+            audio[span] += (0.5 * np.sin(2 * np.pi * 500 * t[span]) + 0.3 * np.sin(2 * np.pi * 1200 * t[span])).astype(np.float32)
+        hum = t >= 8.5
+        audio[hum] += (0.8 * np.sin(2 * np.pi * 60 * t[hum])).astype(np.float32)
+        return audio
+
+    def test_detects_speech_and_rejects_silence_and_hum(self):
+        regions = [(start / WHISPER_SAMPLE_RATE, end / WHISPER_SAMPLE_RATE) for start, end in detect_speech(self.recording())]
+        self.assertEqual(len(regions), 2)
+        for (start, end), (speech_start, speech_end) in zip(regions, [(2.0, 3.5), (6.5, 7.5)]):
+            self.assertTrue(speech_start - VAD_PAD_SECONDS - 0.05 <= start <= speech_start)
+            self.assertTrue(speech_end <= end <= speech_end + VAD_PAD_SECONDS + 0.05)
+
+    def test_speech_map_restores_original_timestamps(self):
+        rate = WHISPER_SAMPLE_RATE
+        speech_map = SpeechMap([(2 * rate, 3 * rate), (6 * rate, 8 * rate)], rate, gap_samples=rate // 2)
+        self.assertEqual(speech_map.to_source(0.5), 2.5)
+        # Inside the inserted gap: clamped to the end of the first region
+        self.assertEqual(speech_map.to_source(1.2), 3.0)
+        self.assertEqual(speech_map.to_source(1.5), 6.0)
+        self.assertEqual(speech_map.to_source(3.0), 7.5)
+        self.assertEqual(speech_map.speech_seconds, 3.0)
+
+    def test_transcription_skips_silence_and_reports_it(self):
+        global _default_registry
+        previous, _default_registry = _default_registry, WhisperModelRegistry(loader=lambda size, device=None: FakeChunkModel())
+        try:
+            result = transcribe_audio_segments(self.recording(), model_size='tiny', parallel=False)
+        finally:
+            _default_registry = previous
+        self.assertGreater(result['skipped_seconds'], 6)
+        self.assertAlmostEqual(result['speech_seconds'] + result['skipped_seconds'], result['duration_seconds'], places=1)
+        segment = result['segments'][0]
+        # The fake segment spans all the speech it was given, from the first region to the end of the last
+        self.assertAlmostEqual(segment['start'], 2.0 - VAD_PAD_SECONDS, delta=0.05)
+        self.assertAlmostEqual(segment['end'], 7.5 + VAD_PAD_SECONDS, delta=0.05)
+        # Word 1 is inside the first region; word 2 (2.0 s into the speech-only audio) falls in the inserted gap
+        self.assertAlmostEqual(segment['words'][1]['start'], 3.0 - VAD_PAD_SECONDS, delta=0.05)
+        self.assertAlmostEqual(segment['words'][2]['start'], 3.5 + VAD_PAD_SECONDS, delta=0.05)
+
+
+class TestTranscriptPipeline(unittest.TestCase):
+
+    def setUp(self):
+        global _default_transcripts
+        self.previous, _default_transcripts = _default_transcripts, TranscriptRegistry(max_entries=2)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        global _default_transcripts
+        _default_transcripts = self.previous
+
+    def render(self, text, pdf_path=None):
+        self.renders = getattr(self, 'renders', 0) + 1
+        with open(pdf_path, 'w') as f:
+            f.write(text)
+        return pdf_path
+
+    def test_registry_renders_pdf_lazily_and_evicts_oldest(self):
+        registry = get_transcript_registry()
+        first = registry.add({'text': "hello there", 'segments': []})
+        path = registry.pdf_path(first, render=self.render)
+        self.assertEqual(registry.pdf_path(first, render=self.render), path)
+        self.assertEqual(self.renders, 1)
+        registry.add({'text': "two", 'segments': []})
+        registry.add({'text': "three", 'segments': []})
+        self.assertIsNone(registry.get(first))
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(registry.pdf_path(first))
+
+    def test_pdf_rendered_for_an_evicted_transcript_is_removed(self):
+        registry = get_transcript_registry()
+        first = registry.add({'text': "hello there", 'segments': []})
+        rendered = []
+
+        def render_while_evicted(text, pdf_path=None):
+            # Two uploads arrive while the PDF renders and evict the transcript
+            registry.add({'text': "two", 'segments': []})
+            registry.add({'text': "three", 'segments': []})
+            rendered.append(self.render(text, pdf_path=pdf_path))
+            return rendered[-1]
+
+        self.assertIsNone(registry.pdf_path(first, render=render_while_evicted))
+        self.assertFalse(os.path.exists(rendered[0]))
+
+    def test_summary_uses_transcript_text_without_rendering_a_pdf(self):
+        from io import BytesIO
+        from unittest.mock import patch
+        from flask import Flask
+        app = Flask(__name__)
+        app.register_blueprint(video_summarizer_bp)
+        transcript = {'text': "We ship on Friday & review on Monday.", 'segments': [{'id': 0, 'start': 1.0, 'end': 3.0, 'text': " We ship"}],
+                      'duration_seconds': 10.0, 'speech_seconds': 4.0, 'skipped_seconds': 6.0}
+        with patch(__name__ + '.extract_audio', return_value=np.zeros(16, dtype=np.float32)), \
+                patch(__name__ + '.transcribe_audio', return_value=dict(transcript)), \
+                patch(__name__ + '.summarize_video_with_gemini', return_value="Shipping Friday.") as summarize, \
+                patch(__name__ + '.generate_pdf_transcription', side_effect=self.render):
+            client = app.test_client()
+            response = client.post('/extract_summary_text', data={'file': (BytesIO(b"video"), 'talk.mp4')},
+                                   content_type='multipart/form-data')
+            body = response.get_json()
+            self.assertEqual(body['text'], "Shipping Friday.")
+            self.assertEqual(body['skipped_seconds'], 6.0)
+            summarize.assert_called_once_with(transcript['text'])
+            self.assertEqual(getattr(self, 'renders', 0), 0)
+
+            fetched = client.get(f"/videosummarizer/transcripts/{body['transcript_id']}").get_json()
+            self.assertEqual(fetched['text'], transcript['text'])
+            self.assertEqual(fetched['segments'], transcript['segments'])
+            pdf = client.get(f"/videosummarizer/transcripts/{body['transcript_id']}/pdf")
+            self.assertEqual(pdf.status_code, 200)
+            self.assertEqual(pdf.get_data(as_text=True), transcript['text'])
+            pdf.close()
+            self.assertEqual(self.renders, 1)
+            self.assertEqual(client.get('/videosummarizer/transcripts/missing').status_code, 404)
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        sys.argv.pop(1)
+        unittest.main()